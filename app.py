@@ -1,13 +1,43 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, request, jsonify, send_from_directory, make_response, g, has_request_context
 import sqlite3
 import mysql.connector
-from time import time  # cache timestamps
+from time import time, monotonic, perf_counter  # cache timestamps / pool timings / metrics
+from datetime import datetime
+import hashlib
+import math
 import os
+import pickle
+import queue
+from collections import OrderedDict
+from functools import wraps
+import threading
+import json
+import zlib
+import struct
+import sys
+from array import array
+from concurrent.futures import ThreadPoolExecutor, wait
 from flask_cors import CORS
+from rollups import ROLLUPS, rollup_name
+from columnar import ColumnarEngine, HAVE_NUMPY
+from customers import CustomerIndex, in_list
+from geo import SpatialIndex, parse_bbox
+from dimensions import DimensionIndex
+from metrics import Registry, fingerprint, bind_sql
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson               # optional: faster JSON for the streamed endpoints
+except ImportError:
+    orjson = None
+try:
+    import brotli               # optional: Content-Encoding: br
+except ImportError:
+    brotli = None
 
 USE_SQLITE = os.environ.get("USE_SQLITE") == "1"
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-SQLITE_PATH = os.path.join(BASE_DIR, "snapshot.db")
+SQLITE_PATH = os.getenv("SQLITE_PATH") or os.path.join(BASE_DIR, "snapshot.db")
 
 class SQLiteCursorWrapper:
     def __init__(self, cursor):
@@ -44,8 +74,9 @@ class SQLiteCursorWrapper:
 
 
 class SQLiteConnectionWrapper:
-    def __init__(self, conn):
+    def __init__(self, conn, reusable=False):
         self._conn = conn
+        self._reusable = reusable
 
     def cursor(self, *args, **kwargs):
         # ignore dictionary=True from mysql style
@@ -53,26 +84,614 @@ class SQLiteConnectionWrapper:
         cur = self._conn.cursor(*args, **kwargs)
         return SQLiteCursorWrapper(cur)
 
+    def close(self):
+        # per-thread snapshot connections stay open for the next request
+        if not self._reusable:
+            self._conn.close()
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+# --------------------------- connection pool ---------------------------------
+# Every gunicorn worker is its own process, so each one owns a pool of this size.
+POOL_SIZE         = int(os.getenv("DB_POOL_SIZE", "5"))
+POOL_MAX_OVERFLOW = int(os.getenv("DB_POOL_MAX_OVERFLOW", "5"))
+POOL_TIMEOUT      = float(os.getenv("DB_POOL_TIMEOUT", "10"))     # seconds to wait for a free conn
+POOL_RECYCLE      = float(os.getenv("DB_POOL_RECYCLE", "1800"))   # reconnect conns older than this
+POOL_PING_AFTER   = float(os.getenv("DB_POOL_PING_AFTER", "30"))  # ping conns idle longer than this
+
+class PoolTimeout(Exception):
+    pass
+
+class PooledConnection:
+    """Checked-out connection; close() hands it back to the pool instead of closing it."""
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+
+    def close(self):
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._pool.release(conn)
+
+    def discard(self):
+        """Close for good instead of pooling it (e.g. an abandoned unbuffered result)."""
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._pool._discard(conn)
+
     def __getattr__(self, name):
         return getattr(self._conn, name)
 
-# --------------------------- tiny cache (unchanged) ---------------------------
-_KPI_CACHE = {}
+class ConnectionPool:
+    """
+    Small thread-safe pool:
+      - keeps up to `size` idle connections, allows `max_overflow` extra ones under load
+      - pings connections that sat idle, recycles ones older than `recycle`
+      - waits up to `timeout` for a free connection, then raises PoolTimeout
+    """
+    def __init__(self, connect, ping, size, max_overflow, timeout, recycle, ping_after):
+        self._connect = connect
+        self._ping = ping
+        self._size = size
+        self._max_overflow = max_overflow
+        self._timeout = timeout
+        self._recycle = recycle
+        self._ping_after = ping_after
+        self._idle = queue.LifoQueue()       # (conn, created_at, released_at)
+        self._created = {}                   # id(conn) -> created_at
+        self._lock = threading.Lock()
+        self._total = 0
+        self.stats = {
+            "checkouts": 0, "hits": 0, "misses": 0, "waits": 0, "wait_seconds": 0.0,
+            "timeouts": 0, "health_check_failures": 0, "recycled": 0, "overflow_closed": 0,
+        }
+
+    def _count(self, key, n=1):
+        with self._lock:
+            self.stats[key] += n
+
+    def _discard(self, conn):
+        with self._lock:
+            self._total -= 1
+            self._created.pop(id(conn), None)
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _new(self):
+        conn = self._connect()
+        with self._lock:
+            self._created[id(conn)] = monotonic()
+        return conn
+
+    def _healthy(self, conn, created_at, released_at):
+        now = monotonic()
+        if now - created_at > self._recycle:
+            self._count("recycled")
+            return False
+        if now - released_at > self._ping_after and not self._ping(conn):
+            self._count("health_check_failures")
+            return False
+        return True
+
+    def acquire(self):
+        self._count("checkouts")
+        deadline = None
+        while True:
+            try:
+                item = self._idle.get_nowait()
+            except queue.Empty:
+                item = None
+
+            if item is None:
+                with self._lock:
+                    can_grow = self._total < self._size + self._max_overflow
+                    if can_grow:
+                        self._total += 1
+                if can_grow:
+                    try:
+                        conn = self._new()
+                    except Exception:
+                        with self._lock:
+                            self._total -= 1
+                        raise
+                    self._count("misses")
+                    return PooledConnection(self, conn)
+
+                # pool exhausted: block until someone releases a connection
+                if deadline is None:
+                    deadline = monotonic() + self._timeout
+                    self._count("waits")
+                started = monotonic()
+                try:
+                    item = self._idle.get(timeout=max(0.0, deadline - started))
+                except queue.Empty:
+                    self._count("wait_seconds", monotonic() - started)
+                    self._count("timeouts")
+                    raise PoolTimeout(f"no DB connection free after {self._timeout:.1f}s")
+                self._count("wait_seconds", monotonic() - started)
+
+            conn, created_at, released_at = item
+            if self._healthy(conn, created_at, released_at):
+                self._count("hits")
+                return PooledConnection(self, conn)
+            self._discard(conn)
+
+    def release(self, conn):
+        # overflow connections are closed instead of being kept idle
+        if self._idle.qsize() >= self._size:
+            self._count("overflow_closed")
+            self._discard(conn)
+            return
+        with self._lock:
+            created_at = self._created.get(id(conn), monotonic())
+        self._idle.put((conn, created_at, monotonic()))
+
+    def snapshot(self):
+        with self._lock:
+            out = dict(self.stats)
+            out["in_use"] = self._total - self._idle.qsize()
+            out["idle"] = self._idle.qsize()
+        out.update(size=self._size, max_overflow=self._max_overflow)
+        return out
+
+# --------------------------- result cache (LRU + TTL) ------------------------
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "2048"))
+CACHE_DEFAULT_TTL = int(os.getenv("CACHE_TTL", "300"))
+
+# per-endpoint TTLs (seconds): current-month data moves, history and targets don't
+CACHE_TTLS = {
+    "daily_sales":       60,
+    "daily_breakdown":   60,
+    "daily_target":      3600,
+    "monthly_sales":     300,
+    "monthly_breakdown": 300,
+    "monthly_target":    3600,
+    "kpi_by_region":     300,
+    "yearly_sales":      3600,
+    "yearly_breakdown":  3600,
+    "profit_monthly":    900,
+    "sales_map":         300,
+}
+
+# CACHE_BACKEND=memory (per worker, default) or sqlite (one file shared by all
+# gunicorn workers on the node, survives restarts).
+CACHE_MAX_BODY = int(os.getenv("CACHE_MAX_BODY", str(8 * 1024 * 1024)))   # bytes; bigger streams aren't cached
+
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory").lower()
+CACHE_PATH    = os.getenv("CACHE_PATH", os.path.join(BASE_DIR, "kpi_cache.db"))
+
+class MemoryCache:
+    """In-process LRU: (namespace, key) -> (payload, ts), least recently used first."""
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "expired": 0}
+
+    def get(self, namespace, key, ttl):
+        with self._lock:
+            entry = self._data.get((namespace, key))
+            if not entry:
+                self.stats["misses"] += 1
+                return None
+            payload, ts = entry
+            if time() - ts > ttl:
+                del self._data[(namespace, key)]
+                self.stats["expired"] += 1
+                self.stats["misses"] += 1
+                return None
+            self._data.move_to_end((namespace, key))
+            self.stats["hits"] += 1
+            return payload
+
+    def peek(self, namespace, key, ttl):
+        """get()'s payload if it would hit, else None; the LRU order and the stats stay as they are."""
+        with self._lock:
+            entry = self._data.get((namespace, key))
+            return entry[0] if entry is not None and time() - entry[1] <= ttl else None
+
+    def set(self, namespace, key, payload):
+        with self._lock:
+            self._data[(namespace, key)] = (payload, time())
+            self._data.move_to_end((namespace, key))
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def snapshot(self):
+        with self._lock:
+            return {"backend": "memory", **self.stats,
+                    "entries": len(self._data), "max_entries": self.max_entries}
+
+class SQLiteCache:
+    """
+    Node-wide cache in a WAL-mode SQLite file. Every worker process opens its own
+    connection; writes are single INSERT OR REPLACE statements, so readers never see
+    a half-written entry. Expired rows are dropped on read and swept on write,
+    and the oldest rows go once the table grows past max_entries.
+    """
+    SWEEP_EVERY = 64   # sets between sweeps
+
+    def __init__(self, path, max_entries, max_ttl):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_ttl = max_ttl
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._sets = 0
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "expired": 0}
+        with self._conn() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS kpi_cache (
+                    namespace TEXT NOT NULL,
+                    key       TEXT NOT NULL,
+                    payload   BLOB NOT NULL,
+                    ts        REAL NOT NULL,
+                    PRIMARY KEY (namespace, key)
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS kpi_cache_ts ON kpi_cache(ts)")
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _count(self, key, n=1):
+        with self._lock:
+            self.stats[key] += n
+
+    def get(self, namespace, key, ttl):
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT payload, ts FROM kpi_cache WHERE namespace = ? AND key = ?",
+            (namespace, key),
+        ).fetchone()
+        if row is None:
+            self._count("misses")
+            return None
+        if time() - row[1] > ttl:
+            conn.execute(
+                "DELETE FROM kpi_cache WHERE namespace = ? AND key = ? AND ts = ?",
+                (namespace, key, row[1]),
+            )
+            self._count("expired")
+            self._count("misses")
+            return None
+        self._count("hits")
+        return pickle.loads(row[0])
+
+    def set(self, namespace, key, payload):
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO kpi_cache (namespace, key, payload, ts) VALUES (?, ?, ?, ?)",
+            (namespace, key, pickle.dumps(payload, protocol=pickle.HIGHEST_PROTOCOL), time()),
+        )
+        with self._lock:
+            self._sets += 1
+            sweep = self._sets % self.SWEEP_EVERY == 0
+        if sweep:
+            self.sweep()
+
+    def sweep(self):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            cur = conn.execute("DELETE FROM kpi_cache WHERE ts < ?", (time() - self.max_ttl,))
+            expired = cur.rowcount
+            cur = conn.execute("""
+                DELETE FROM kpi_cache WHERE rowid IN (
+                    SELECT rowid FROM kpi_cache ORDER BY ts DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.max_entries,))
+            evicted = cur.rowcount
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        self._count("expired", max(expired, 0))
+        self._count("evictions", max(evicted, 0))
+
+    def clear(self):
+        self._conn().execute("DELETE FROM kpi_cache")
+
+    def snapshot(self):
+        entries = self._conn().execute("SELECT COUNT(*) FROM kpi_cache").fetchone()[0]
+        with self._lock:
+            return {"backend": "sqlite", "path": self.path, **self.stats,
+                    "entries": entries, "max_entries": self.max_entries}
+
+def make_cache_backend(kind=CACHE_BACKEND):
+    if kind == "sqlite":
+        max_ttl = max([CACHE_DEFAULT_TTL, *CACHE_TTLS.values()])
+        return SQLiteCache(CACHE_PATH, CACHE_MAX_ENTRIES, max_ttl)
+    if kind == "memory":
+        return MemoryCache(CACHE_MAX_ENTRIES)
+    raise ValueError(f"unknown CACHE_BACKEND {kind!r} (expected 'memory' or 'sqlite')")
+
+_KPI_CACHE = make_cache_backend()
+
 def cache_get(namespace: str, key: str, ttl: int = 60):
-    entry = _KPI_CACHE.get((namespace, key))
-    if not entry:
+    try:
+        return _KPI_CACHE.get(namespace, key, ttl)
+    except sqlite3.Error as e:
+        # a busy/corrupt shared cache must never take the endpoint down
+        print("cache read failed:", e)
+        return None
+
+def cache_set(namespace: str, key: str, payload):
+    try:
+        _KPI_CACHE.set(namespace, key, payload)
+    except sqlite3.Error as e:
+        print("cache write failed:", e)
+
+def cache_stats():
+    return _KPI_CACHE.snapshot()
+
+# asgi.py answers cache hits on the event loop. It pins the entry it peeked at in the
+# request's environ, and the view serves that instead of looking the key up again, so
+# an entry expiring (or evicted) in between can't turn into queries on the loop.
+PINNED_CACHE = "dashboard.cache_hit"
+
+def cache_peek(view, req):
+    """(namespace, key, payload) if the @cached `view` would answer `req` from the in-process cache, else None."""
+    namespace = getattr(view, "cache_namespace", None)
+    if namespace is None or not isinstance(_KPI_CACHE, MemoryCache):
         return None
-    payload, ts = entry
-    if time() - ts > ttl:
+    ttl = CACHE_TTLS.get(namespace, CACHE_DEFAULT_TTL)
+    key = cache_key(req)
+    payload = _KPI_CACHE.peek(namespace, key, ttl)
+    return None if payload is None else (namespace, key, payload)
+
+def cache_key(req):
+    """
+    Normalized parse_filters() output + any endpoint-specific args (group_by, top_n, ...)
+    + the data version, so a reload never serves (or ETags) a body of the old data.
+    """
+    f = parse_filters(req)
+    extra = sorted((k, v.strip()) for k, v in req.args.items(multi=True) if k not in f)
+    return repr((sorted(f.items()), extra, request_data_version(req)))
+
+def cached(namespace: str):
+    """Serve identical filter combinations from the result cache (200 responses only)."""
+    def deco(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            ttl = CACHE_TTLS.get(namespace, CACHE_DEFAULT_TTL)
+            key = cache_key(request)
+            pinned = request.environ.get(PINNED_CACHE)
+            if pinned is not None and pinned[:2] == (namespace, key):
+                hit = pinned[2]
+            else:
+                hit = cache_get(namespace, key, ttl)
+            if hit is not None:
+                body, mimetype = hit
+                return app.response_class(body, mimetype=mimetype)
+            resp = make_response(view(*args, **kwargs))
+            if resp.status_code == 200:
+                if resp.is_streamed:
+                    resp.response = _tee_to_cache(resp.response, namespace, key, resp.mimetype)
+                else:
+                    cache_set(namespace, key, (resp.get_data(), resp.mimetype))
+            return resp
+        wrapper.cache_namespace = namespace
+        return wrapper
+    return deco
+
+def _tee_to_cache(chunks, namespace, key, mimetype):
+    """Pass a streamed body through, caching it once complete (unless it's too big)."""
+    body, size = [], 0
+    for chunk in chunks:
+        if body is not None:
+            size += len(chunk)
+            if size <= CACHE_MAX_BODY:
+                body.append(chunk)
+            else:
+                body = None
+        yield chunk
+    if body is not None:
+        cache_set(namespace, key, (b"".join(body), mimetype))
+
+# ------------------------ streamed / compressed JSON --------------------------
+# Large row sets (sales_map, *_breakdown) are written straight from the cursor as
+# a JSON array (or NDJSON with ?format=ndjson) instead of fetchall() + jsonify(),
+# and JSON responses are gzip/brotli compressed when the client accepts it.
+STREAM_CHUNK_ROWS = int(os.getenv("STREAM_CHUNK_ROWS", "1000"))
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", "1024"))   # bytes
+COMPRESS_LEVEL    = int(os.getenv("COMPRESS_LEVEL", "6"))
+_JSON_MIMETYPES = ("application/json", "application/x-ndjson")
+
+def dumps_json(obj) -> bytes:
+    """jsonify()'s encoding (sorted keys, Decimal/date handling), via orjson when installed."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=app.json.default, option=orjson.OPT_SORT_KEYS)
+    return json.dumps(obj, default=app.json.default, sort_keys=True,
+                      separators=(",", ":")).encode()
+
+def json_rows_response(rows, close=None):
+    """Stream an iterable of dict rows; `close` runs once the body is written (or aborted)."""
+    ndjson = request.args.get("format") == "ndjson"
+    timings = current_timings()
+
+    def generate():
+        encoding = 0.0
         try:
-            del _KPI_CACHE[(namespace, key)]
+            batch = [b"["] if not ndjson else []
+            first = True
+            for row in rows:
+                started = perf_counter()
+                if ndjson:
+                    batch.append(dumps_json(row) + b"\n")
+                else:
+                    batch.append(dumps_json(row) if first else b"," + dumps_json(row))
+                encoding += perf_counter() - started
+                first = False
+                if len(batch) >= STREAM_CHUNK_ROWS:
+                    yield b"".join(batch)
+                    batch = []
+            if not ndjson:
+                batch.append(b"]")
+            if batch:
+                yield b"".join(batch)
         finally:
-            return None
-    return payload
+            if timings is not None:
+                timings.add("serialize", encoding)
+            if close is not None:
+                close()
+
+    mimetype = "application/x-ndjson" if ndjson else "application/json"
+    return app.response_class(generate(), mimetype=mimetype)
+
+def stream_query(sql, params, respond=json_rows_response):
+    """Run `sql` now (so errors still become a 500) and hand its rows to `respond` as they're fetched."""
+    conn = get_connection(); cur = conn.cursor(dictionary=True)
+    try:
+        cur.execute(sql, tuple(params))
+    except Exception:
+        cur.close(); conn.close()
+        raise
+
+    done = False
+
+    def rows():
+        nonlocal done
+        while True:
+            chunk = cur.fetchmany(STREAM_CHUNK_ROWS)
+            if not chunk:
+                done = True
+                return
+            for r in chunk:
+                yield dict(r)
+
+    def close():
+        # a client that hangs up mid-stream leaves unread rows on a MySQL connection
+        if not done and hasattr(conn, "discard"):
+            conn.discard()
+            return
+        cur.close(); conn.close()
+
+    return respond(rows(), close)
+
+# ----------------------------- chart formats ---------------------------------
+# Chart endpoints answer in row form by default ([{"month": 1, "value": ..}, ..]).
+#   ?format=columnar -> {"period", "labels", "values"}            (series)
+#                       {"period", "labels", "groups", "series"}  (breakdowns)
+#   ?format=binary   -> uint32 LE header length, JSON header (labels/groups/shape),
+#                       zero padding to 8 bytes, then little-endian float64 values
+#                       (one row of len(labels) per group) for a JS Float64Array.
+CHART_FORMATS = ("rows", "columnar", "binary")
+
+def chart_format():
+    fmt = (request.args.get("format") or "rows").lower()
+    return fmt if fmt in CHART_FORMATS else "rows"
+
+def _binary_response(header, rows_of_values):
+    values = array("d")
+    for row in rows_of_values:
+        values.extend(row)
+    if sys.byteorder == "big":
+        values.byteswap()
+    head = dumps_json({**header, "dtype": "float64",
+                       "shape": [len(rows_of_values), len(header["labels"])]})
+    pad = -(4 + len(head)) % 8
+    body = struct.pack("<I", len(head) + pad) + head + b" " * pad + values.tobytes()
+    return app.response_class(body, mimetype="application/octet-stream")
+
+def series_response(period, labels, values):
+    """One value per period label, in the requested chart format."""
+    fmt = chart_format()
+    if fmt == "columnar":
+        return jsonify({"period": period, "labels": list(labels), "values": list(values)})
+    if fmt == "binary":
+        return _binary_response({"period": period, "labels": list(labels)}, [list(values)])
+    return jsonify([{period: p, "value": v} for p, v in zip(labels, values)])
+
+def breakdown_response(period, rows, close=None):
+    """Rows with <period>/group_label/value; streamed as-is or pivoted to one series per group."""
+    fmt = chart_format()
+    if fmt == "rows":
+        return json_rows_response(rows, close)
+    try:
+        cells = {}
+        for r in rows:
+            key = (r[period], r["group_label"])
+            cells[key] = cells.get(key, 0.0) + float(r["value"] or 0)
+    finally:
+        if close is not None:
+            close()
+    labels = sorted({p for p, _ in cells})
+    groups = list(dict.fromkeys(grp for _, grp in cells))   # first-seen order, like the row form
+    index = {p: i for i, p in enumerate(labels)}
+    series = {grp: [0.0] * len(labels) for grp in groups}
+    for (p, grp), v in cells.items():
+        series[grp][index[p]] = v
+    if fmt == "binary":
+        return _binary_response({"period": period, "labels": labels, "groups": groups},
+                                [series[grp] for grp in groups])
+    return jsonify({"period": period, "labels": labels, "groups": groups,
+                    "series": [series[grp] for grp in groups]})
+
+def _compress_stream(chunks, encoding):
+    if encoding == "br":
+        comp = brotli.Compressor(quality=min(COMPRESS_LEVEL, 11))
+        for chunk in chunks:
+            out = comp.process(chunk) + comp.flush()
+            if out:
+                yield out
+        yield comp.finish()
+    else:
+        comp = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, 31)   # 31 = gzip container
+        for chunk in chunks:
+            out = comp.compress(chunk) + comp.flush(zlib.Z_SYNC_FLUSH)
+            if out:
+                yield out
+        yield comp.flush()
+
+def response_encoding(req):
+    """The Content-Encoding compress_response() picks for `req`, or None."""
+    offered = ["br", "gzip"] if brotli is not None else ["gzip"]
+    return req.accept_encodings.best_match(offered)
+
+def would_compress(req, mimetype, size):
+    """Whether compress_response() would encode a `size`-byte 200 body of `mimetype` for `req`."""
+    return (mimetype in _JSON_MIMETYPES and size >= COMPRESS_MIN_SIZE
+            and response_encoding(req) is not None)
+
+def compress_response(resp):
+    if (resp.status_code != 200 or resp.mimetype not in _JSON_MIMETYPES
+            or "Content-Encoding" in resp.headers):
+        return resp
+    encoding = response_encoding(request)
+    if encoding is None:
+        return resp
+    resp.vary.add("Accept-Encoding")
+    if resp.is_streamed:
+        resp.response = _compress_stream(resp.response, encoding)
+        resp.headers.pop("Content-Length", None)
+    else:
+        data = resp.get_data()
+        if len(data) < COMPRESS_MIN_SIZE:
+            return resp
+        if encoding == "br":
+            data = brotli.compress(data, quality=min(COMPRESS_LEVEL, 11))
+        else:
+            data = zlib.compress(data, COMPRESS_LEVEL, wbits=31)   # wbits 31 = gzip
+        resp.set_data(data)
+    resp.headers["Content-Encoding"] = encoding
+    return resp
 
-def cache_set(namespace: str, key: str, payload):
-    _KPI_CACHE[(namespace, key)] = (payload, time())
-    
 def parse_filters(req):
     """Uniform filter extraction."""
     return {
@@ -87,30 +706,40 @@ def parse_filters(req):
         "pattern":       (req.args.get("pattern") or "ALL").strip(),
     }
 
-def build_customer_filters(alias_fact: str, f, *, use_sold_to_name: bool=False):
+def build_customer_filters(alias_fact: str, f, *, use_sold_to_name: bool=False, keep_join: bool=False):
     """
     Returns (joins, wheres, params) to apply Region/Salesman/Group/Sold_to on a fact table
     by joining customer once on equality:
         JOIN customer cus ON cus.ship_to = <fact>.ship_to
     If use_sold_to_name=True, 'sold_to' will match customer.Sold_to_Name instead of id.
+    With the customer resolver on, the customer-side filters become an indexed
+        <fact>.ship_to IN (...)
+    instead, and the join is only kept when keep_join=True (caller reads cus.*).
     """
-    joins = [f"left JOIN customer cus ON cus.ship_to = {alias_fact}.ship_to"]
     wh, p = [], []
-
-    if f["region"] != "ALL":
-        wh.append("cus.bde_state = %s"); p.append(f["region"])
-    if f["salesman"] != "ALL":
-        wh.append("UPPER(TRIM(cus.salesman_name)) = UPPER(TRIM(%s))"); p.append(f["salesman"])
-    if f["sold_to_group"] != "ALL":
-        wh.append("cus.sold_to_group = %s"); p.append(f["sold_to_group"])
-
-    # sold_to: id (A.. / digits) or match by name via customer
+    index = customer_index()
+    if index is not None:
+        joins = [f"left JOIN customer cus ON cus.ship_to = {alias_fact}.ship_to"] if keep_join else []
+        ship_tos = index.resolve(f, use_sold_to_name=use_sold_to_name)
+        if ship_tos is not None:
+            cond, vals = in_list(f"{alias_fact}.ship_to", ship_tos)
+            wh.append(cond); p.extend(vals)
+    else:
+        joins = [f"left JOIN customer cus ON cus.ship_to = {alias_fact}.ship_to"]
+        if f["region"] != "ALL":
+            wh.append("cus.bde_state = %s"); p.append(f["region"])
+        if f["salesman"] != "ALL":
+            wh.append("UPPER(TRIM(cus.salesman_name)) = UPPER(TRIM(%s))"); p.append(f["salesman"])
+        if f["sold_to_group"] != "ALL":
+            wh.append("cus.sold_to_group = %s"); p.append(f["sold_to_group"])
+        if f["sold_to"] != "ALL" and (use_sold_to_name or not (f["sold_to"].isdigit() or f["sold_to"].upper().startswith("A"))):
+            wh.append("cus.sold_to_name = %s"); p.append(f["sold_to"])
+
+    # sold_to given as an id (A.. / digits) is matched on the fact itself
     if f["sold_to"] != "ALL":
         sv = f["sold_to"]
         if not use_sold_to_name and (sv.isdigit() or sv.upper().startswith("A")):
             wh.append(f"{alias_fact}.ship_to = %s"); p.append(sv)
-        else:
-            wh.append("cus.sold_to_name = %s"); p.append(sv)
 
     # explicit ship_to id filter if given
     if f["ship_to"] != "ALL":
@@ -195,6 +824,67 @@ def category_filters(alias: str, category: str):
 
     return joins, wh
 
+# dashboard "group_by" -> column, on the raw fact (joined to customer) and on its rollup
+RAW_GROUP_COLS = {
+    "product_group": "s.product_group",
+    "region":        "cus.bde_state",
+    "salesman":      "cus.salesman_name",
+    "sold_to_group": "cus.sold_to_group",
+    "sold_to":       "cus.sold_to_name",
+    "pattern":       "s.pattern",
+}
+ROLLUP_GROUP_COLS = {
+    "product_group": "s.product_group",
+    "region":        "s.cus_bde_state",
+    "salesman":      "s.cus_salesman_name",
+    "sold_to_group": "s.cus_sold_to_group",
+    "sold_to":       "s.cus_sold_to_name",
+    "pattern":       "s.pattern",
+}
+
+def rollup_filters(f):
+    """
+    Return (wheres, params, weight) with the same meaning as build_customer_filters +
+    category_filters + product/pattern equality, against a rollup_<fact> table.
+    weight is the match-count column to multiply by for join-based categories.
+    """
+    wh, p = [], []
+    weight = None
+
+    if f["region"] != "ALL":
+        wh.append("s.cus_bde_state = %s"); p.append(f["region"])
+    if f["salesman"] != "ALL":
+        wh.append("s.cus_salesman_key = UPPER(TRIM(%s))"); p.append(f["salesman"])
+    if f["sold_to_group"] != "ALL":
+        wh.append("s.cus_sold_to_group = %s"); p.append(f["sold_to_group"])
+    if f["sold_to"] != "ALL":
+        sv = f["sold_to"]
+        if sv.isdigit() or sv.upper().startswith("A"):
+            wh.append("s.ship_to = %s"); p.append(sv)
+        else:
+            wh.append("s.cus_sold_to_name = %s"); p.append(sv)
+    if f["ship_to"] != "ALL":
+        wh.append("s.ship_to = %s"); p.append(f["ship_to"])
+
+    cat = (f["category"] or "ALL").upper()
+    if cat == "PCLT":
+        wh.append("s.line = 'PCLT'")
+    elif cat == "TBR":
+        wh.append("s.line = 'TBR'")
+    elif cat == "18PLUS":
+        wh.append("s.line = 'PCLT'")
+        wh.append("s.inch18 = 1")
+    elif cat in ("ISEG", "SUV", "LOWPROFILE", "HM"):
+        weight = f"{cat.lower()}_n"
+        wh.append(f"s.{weight} > 0")
+
+    if f["product_group"] != "ALL":
+        wh.append("s.product_group = %s"); p.append(f["product_group"])
+    if f["pattern"] != "ALL":
+        wh.append("s.pattern = %s"); p.append(f["pattern"])
+
+    return wh, p, weight
+
 def category_target_filters(alias: str, category: str):
     """
     Return (joins, wheres) for monthly-schema facts (sales2025, profit).
@@ -240,18 +930,343 @@ def category_target_filters(alias: str, category: str):
 
     return joins, wh
 
-app = Flask(__name__, static_folder="static")
-CORS(app, resources={r"/api/*": {"origins": "*"}})
+# ----------------------------- metrics ---------------------------------------
+# Connections from get_connection() come wrapped so their cursors time execute and
+# fetch; connect and JSON encoding are timed as well. Per request the stages add up
+# into the Server-Timing header and the /api/_metrics histograms. Per statement,
+# calls/rows/seconds are counted by SQL fingerprint, and statements slower than
+# SLOW_QUERY_MS are logged with their parameters bound.
+METRICS_ENABLED = os.getenv("METRICS", "1") == "1"
+SLOW_QUERY_MS   = float(os.getenv("SLOW_QUERY_MS", "500"))   # negative turns the log off
+SLOW_QUERY_LOG  = os.getenv("SLOW_QUERY_LOG", "")             # file to append to; empty = stderr
+STAGES = ("connect", "execute", "fetch", "serialize")
+
+METRICS = Registry()
+REQUEST_SECONDS = METRICS.histogram(
+    "dashboard_request_duration_seconds", "Request latency, streamed bodies included.",
+    ("route", "method", "status"))
+STAGE_SECONDS = METRICS.histogram(
+    "dashboard_request_stage_seconds", "Time one request spent in each stage.", ("route", "stage"))
+QUERY_CALLS = METRICS.counter(
+    "dashboard_query_calls_total", "Statements run, by route and SQL fingerprint id.", ("route", "query"))
+QUERY_SECONDS = METRICS.counter(
+    "dashboard_query_seconds_total", "Execute + fetch seconds, by route and SQL fingerprint id.",
+    ("route", "query"))
+QUERY_ROWS = METRICS.counter(
+    "dashboard_query_rows_total", "Rows fetched, by route and SQL fingerprint id.", ("route", "query"))
+SLOW_QUERIES = METRICS.counter(
+    "dashboard_slow_queries_total", "Statements over SLOW_QUERY_MS.", ("route",))
+QUERY_INFO = METRICS.gauge(
+    "dashboard_query_info", "The SQL fingerprint behind each query id.", ("query", "fingerprint"))
+POOL_GAUGE = METRICS.gauge("dashboard_pool", "Connection pool counters (/api/_pool).", ("stat",))
+CACHE_GAUGE = METRICS.gauge("dashboard_cache", "Result cache counters (/api/_cache).", ("stat",))
+
+_QUERY_IDS = {}                      # fingerprint -> short id
+_SLOW_LOG_LOCK = threading.Lock()
+_METRICS_LOCAL = threading.local()   # run_queries() threads borrow the request's timings
+
+class RequestTimings:
+    """Stage seconds of one request (shared with the query threads it fans out to)."""
+    def __init__(self, route):
+        self.route = route
+        self.started = perf_counter()
+        self.stages = dict.fromkeys(STAGES, 0.0)
+        self._lock = threading.Lock()
+
+    def add(self, stage, seconds):
+        with self._lock:
+            self.stages[stage] += seconds
+
+def current_timings():
+    if has_request_context() and "timings" in g:
+        return g.timings
+    return getattr(_METRICS_LOCAL, "timings", None)
+
+def _query_id(fp):
+    qid = _QUERY_IDS.get(fp)
+    if qid is None:
+        qid = _QUERY_IDS[fp] = hashlib.sha1(fp.encode()).hexdigest()[:10]
+        QUERY_INFO.set(1, query=qid, fingerprint=fp[:300])
+    return qid
+
+def record_query(timings, sql, params, execute_s, fetch_s, rows):
+    route = timings.route if timings is not None else "background"
+    qid = _query_id(fingerprint(sql))
+    QUERY_CALLS.inc(route=route, query=qid)
+    QUERY_SECONDS.inc(execute_s + fetch_s, route=route, query=qid)
+    QUERY_ROWS.inc(rows, route=route, query=qid)
+    total_ms = (execute_s + fetch_s) * 1000
+    if 0 <= SLOW_QUERY_MS <= total_ms:
+        SLOW_QUERIES.inc(route=route)
+        line = (f"{datetime.now().isoformat(timespec='seconds')} slow query {total_ms:.1f}ms "
+                f"(execute {execute_s * 1000:.1f}ms, fetch {fetch_s * 1000:.1f}ms, {rows} rows) "
+                f"{route} [{qid}]: {bind_sql(sql, params)}")
+        with _SLOW_LOG_LOCK:
+            if SLOW_QUERY_LOG:
+                with open(SLOW_QUERY_LOG, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+            else:
+                print(line, file=sys.stderr)
 
-def get_connection():
-    # If USE_SQLITE=1 (on Render), use the local snapshot.db file
+class InstrumentedCursor:
+    """Times execute/fetch; a statement is recorded when the next one starts or the cursor closes."""
+    def __init__(self, cursor, timings):
+        self._cursor = cursor
+        self._timings = timings
+        self._sql = None
+
+    def _finish(self):
+        if self._sql is not None:
+            sql, self._sql = self._sql, None
+            record_query(self._timings, sql, self._params, self._execute_s, self._fetch_s, self._rows)
+
+    def _timed(self, stage, started, rows=0):
+        seconds = perf_counter() - started
+        if self._timings is not None:
+            self._timings.add(stage, seconds)
+        if stage == "fetch":
+            self._fetch_s += seconds
+            self._rows += rows
+        return seconds
+
+    def execute(self, sql, params=None):
+        self._finish()
+        started = perf_counter()
+        try:
+            return self._cursor.execute(sql, params)
+        finally:
+            self._sql, self._params = sql, params
+            self._fetch_s, self._rows = 0.0, 0
+            self._execute_s = self._timed("execute", started)
+
+    def fetchall(self):
+        started = perf_counter()
+        rows = self._cursor.fetchall()
+        self._timed("fetch", started, len(rows))
+        return rows
+
+    def fetchone(self):
+        started = perf_counter()
+        row = self._cursor.fetchone()
+        self._timed("fetch", started, row is not None)
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        started = perf_counter()
+        rows = self._cursor.fetchmany(*args, **kwargs)
+        self._timed("fetch", started, len(rows))
+        return rows
+
+    def __iter__(self):
+        it = iter(self._cursor)
+        while True:
+            started = perf_counter()
+            try:
+                row = next(it)
+            except StopIteration:
+                self._timed("fetch", started)
+                return
+            self._timed("fetch", started, 1)
+            yield row
+
+    def close(self):
+        self._finish()
+        return self._cursor.close()
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+class InstrumentedConnection:
+    """A get_connection() connection whose cursors report to the current request's timings."""
+    def __init__(self, conn, timings):
+        self._conn = conn
+        self._timings = timings
+        self._cursors = []
+
+    def cursor(self, *args, **kwargs):
+        cur = InstrumentedCursor(self._conn.cursor(*args, **kwargs), self._timings)
+        self._cursors.append(cur)
+        return cur
+
+    def close(self):
+        # record statements whose cursor was never closed
+        for cur in self._cursors:
+            cur._finish()
+        self._cursors = []
+        return self._conn.close()
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+def instrument(conn, started):
+    if not METRICS_ENABLED:
+        return conn
+    timings = current_timings()
+    if timings is not None:
+        timings.add("connect", perf_counter() - started)
+    return InstrumentedConnection(conn, timings)
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """jsonify() with its encoding time counted as the request's serialize stage."""
+    def dumps(self, obj, **kwargs):
+        started = perf_counter()
+        try:
+            return super().dumps(obj, **kwargs)
+        finally:
+            timings = current_timings()
+            if timings is not None:
+                timings.add("serialize", perf_counter() - started)
+
+def start_timings():
+    if METRICS_ENABLED:
+        g.timings = RequestTimings(request.url_rule.rule if request.url_rule else "other")
+
+def _observe(timings, method, status):
+    REQUEST_SECONDS.observe(perf_counter() - timings.started,
+                            route=timings.route, method=method, status=status)
+    for stage, seconds in timings.stages.items():
+        STAGE_SECONDS.observe(seconds, route=timings.route, stage=stage)
+
+def finish_timings(resp):
+    timings = g.get("timings")
+    if timings is None:
+        return resp
+    g.timings_observed = True
+    # streamed bodies are still being fetched/encoded: the header has what's done so far
+    parts = [f"{stage};dur={sec * 1000:.1f}" for stage, sec in timings.stages.items() if sec]
+    parts.append(f"app;dur={(perf_counter() - timings.started) * 1000:.1f}")
+    existing = resp.headers.get("Server-Timing")
+    resp.headers["Server-Timing"] = ", ".join(([existing] if existing else []) + parts)
+    method, status = request.method, str(resp.status_code)
+    resp.call_on_close(lambda: _observe(timings, method, status))
+    return resp
+
+def teardown_timings(exc):
+    # an unhandled exception skips after_request; still count the request as a 500
+    timings = g.get("timings")
+    if timings is not None and exc is not None and not g.get("timings_observed"):
+        _observe(timings, request.method, "500")
+
+# ---------------------------- conditional GET --------------------------------
+# Responses only change when the data does, so GET /api/* responses carry an ETag
+# made of the data version, the code version and the request (path + args), and a
+# matching If-None-Match gets a 304 before the view, or the database, is touched.
+# Data version: snapshot.db's (and its WAL's) stat on SQLite; on MySQL the latest
+# load_batches id (loads.record_load) and rollup build, re-read every
+# DATA_VERSION_TTL seconds.
+ETAGS_ENABLED    = os.getenv("ETAGS", "1") == "1"
+HTTP_MAX_AGE     = int(os.getenv("HTTP_MAX_AGE", "0"))   # 0 = clients revalidate every time
+DATA_VERSION_TTL = float(os.getenv("DATA_VERSION_TTL", "5"))
+CODE_VERSION = os.getenv("APP_VERSION") or str(os.stat(__file__).st_mtime_ns)
+NO_ETAG_PATHS = {"/api/ping", "/api/_pool", "/api/_cache", "/api/_metrics"}
+DATA_VERSION_SQL = [
+    "SELECT MAX(batch_id) AS v FROM load_batches",
+    "SELECT MAX(built_at) AS v FROM rollup_meta",
+]
+_DATA_VERSION = (None, 0.0)      # (version, read at)
+_DATA_VERSION_LOCK = threading.Lock()
+PINNED_VERSION = "dashboard.data_version"    # environ key: this request's data version
+
+def _file_version(path):
+    try:
+        st = os.stat(path)
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+    except OSError:
+        return None
+
+def _mysql_data_version():
+    conn = get_connection()
+    if conn is None:
+        return None
+    parts = []
+    try:
+        for sql in DATA_VERSION_SQL:
+            cur = conn.cursor(dictionary=True)
+            try:
+                cur.execute(sql)
+                parts.append(cur.fetchall()[0]["v"])
+            except mysql.connector.Error:
+                parts.append(None)     # table not created yet
+            finally:
+                cur.close()
+    finally:
+        conn.close()
+    return tuple(parts) if any(v is not None for v in parts) else None
+
+def data_version():
+    """Something that changes whenever the data behind the API does; None if unknown."""
+    global _DATA_VERSION
+    if USE_SQLITE:
+        main = _file_version(SQLITE_PATH)
+        wal = _file_version(SQLITE_PATH + "-wal")
+        # readers create an empty WAL; only one holding frames is data
+        return None if main is None else (main, wal if wal and wal[2] else None)
+    version, read_at = _DATA_VERSION
+    if monotonic() - read_at > DATA_VERSION_TTL:
+        with _DATA_VERSION_LOCK:
+            version, read_at = _DATA_VERSION
+            if monotonic() - read_at > DATA_VERSION_TTL:
+                version = _mysql_data_version()
+                _DATA_VERSION = (version, monotonic())
+    return version
+
+def peek_data_version():
+    """(True, data_version()) if that needs no database round trip, else (False, None)."""
     if USE_SQLITE:
-        conn = sqlite3.connect(SQLITE_PATH)
-        conn.row_factory = sqlite3.Row  # rows behave like dicts
-        return SQLiteConnectionWrapper(conn)
+        return True, data_version()      # a stat() of the snapshot file
+    version, read_at = _DATA_VERSION
+    if monotonic() - read_at > DATA_VERSION_TTL:
+        return False, None
+    return True, version
+
+def request_data_version(req):
+    """data_version() as of `req`'s start: read once per request, or pinned by asgi.py."""
+    if PINNED_VERSION not in req.environ:
+        req.environ[PINNED_VERSION] = data_version()
+    return req.environ[PINNED_VERSION]
+
+def request_etag():
+    """The ETag for this GET /api/* request, or None when it doesn't get one."""
+    if (not ETAGS_ENABLED or request.method not in ("GET", "HEAD")
+            or not request.path.startswith("/api/") or request.path in NO_ETAG_PATHS):
+        return None
+    version = request_data_version(request)
+    if version is None:
+        return None
+    key = repr((version, CODE_VERSION, request.path, sorted(request.args.items(multi=True))))
+    return hashlib.sha1(key.encode()).hexdigest()[:24]
+
+def _cache_headers(resp, etag):
+    resp.set_etag(etag, weak=True)    # weak: the gzip/br encodings share it
+    resp.headers["Cache-Control"] = f"public, max-age={HTTP_MAX_AGE}" if HTTP_MAX_AGE > 0 else "no-cache"
+    resp.vary.add("Accept-Encoding")
+    return resp
+
+def check_not_modified():
+    etag = request_etag()
+    g.etag = etag
+    if etag is not None and request.if_none_match.contains_weak(etag):
+        return _cache_headers(app.response_class(status=304), etag)
+    return None
+
+def add_etag(resp):
+    etag = g.get("etag")
+    if etag is not None and resp.status_code == 200:
+        _cache_headers(resp, etag)
+    return resp
 
-    # Otherwise use MySQL (your current local setup)
-    cfg = {
+app = Flask(__name__, static_folder="static")
+app.json = TimedJSONProvider(app)
+CORS(app, resources={r"/api/*": {"origins": "*"}})
+app.after_request(compress_response)
+app.before_request(start_timings)
+app.after_request(finish_timings)
+app.teardown_request(teardown_timings)
+app.before_request(check_not_modified)
+app.after_request(add_etag)
+
+def _mysql_config():
+    return {
         "host": os.getenv("DB_HOST", "127.0.0.1"),
         "port": int(os.getenv("DB_PORT", "3306")),
         "user": os.getenv("DB_USER", "root"),
@@ -259,16 +1274,414 @@ def get_connection():
         "database": os.getenv("DB_NAME", "my_new_database"),  # change to your real db
         "autocommit": True,
     }
+
+def _mysql_ping(conn):
     try:
-        return mysql.connector.connect(**cfg)
+        return conn.is_connected()
+    except Exception:
+        return False
+
+_POOL = None
+_POOL_PID = None
+_POOL_LOCK = threading.Lock()
+
+def get_pool():
+    """Per-process MySQL pool (re-created after fork so workers never share sockets)."""
+    global _POOL, _POOL_PID
+    if _POOL is None or _POOL_PID != os.getpid():
+        with _POOL_LOCK:
+            if _POOL is None or _POOL_PID != os.getpid():
+                _POOL = ConnectionPool(
+                    lambda: mysql.connector.connect(**_mysql_config()),
+                    _mysql_ping,
+                    size=POOL_SIZE,
+                    max_overflow=POOL_MAX_OVERFLOW,
+                    timeout=POOL_TIMEOUT,
+                    recycle=POOL_RECYCLE,
+                    ping_after=POOL_PING_AFTER,
+                )
+                _POOL_PID = os.getpid()
+    return _POOL
+
+# SQLite: one read-only connection per thread, reopened when snapshot.db is replaced
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_CACHE_KB  = int(os.getenv("SQLITE_CACHE_KB", "16384"))   # page cache per connection
+_SQLITE_LOCAL = threading.local()
+_SQLITE_STATS = {"checkouts": 0, "hits": 0, "misses": 0, "reopened": 0}
+
+def _sqlite_file_id():
+    try:
+        st = os.stat(SQLITE_PATH)
+        return (st.st_ino, st.st_mtime_ns)
+    except OSError:
+        return None
+
+def snapshot_key(ttl):
+    """
+    Changes when in-memory state built from the data must be rebuilt. SQLite: when
+    snapshot.db is replaced. MySQL: on a new load batch (data_version()), and at the
+    latest every `ttl` seconds for changes made without one.
+    """
+    if USE_SQLITE:
+        return _sqlite_file_id()
+    return (data_version(), int(time() // ttl))
+
+def _sqlite_connection():
+    _SQLITE_STATS["checkouts"] += 1
+    file_id = _sqlite_file_id()
+    conn = getattr(_SQLITE_LOCAL, "conn", None)
+    if conn is not None and _SQLITE_LOCAL.file_id == file_id:
+        _SQLITE_STATS["hits"] += 1
+        return conn
+    if conn is not None:
+        _SQLITE_STATS["reopened"] += 1
+        conn.close()
+    _SQLITE_STATS["misses"] += 1
+    conn = sqlite3.connect(f"file:{SQLITE_PATH}?mode=ro", uri=True)
+    conn.row_factory = sqlite3.Row  # rows behave like dicts
+    conn.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    conn.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_KB}")
+    _SQLITE_LOCAL.conn = conn
+    _SQLITE_LOCAL.file_id = file_id
+    return conn
+
+def pool_stats():
+    if USE_SQLITE:
+        return {"backend": "sqlite", **_SQLITE_STATS}
+    return {"backend": "mysql", **get_pool().snapshot()}
+
+def get_connection():
+    # /api/dashboard runs every panel over one checked-out connection
+    shared = g.get("shared_conn") if has_request_context() else None
+    if shared is not None:
+        return shared
+
+    started = perf_counter()
+    # If USE_SQLITE=1 (on Render), use the local snapshot.db file
+    if USE_SQLITE:
+        return instrument(SQLiteConnectionWrapper(_sqlite_connection(), reusable=True), started)
+
+    # Otherwise use MySQL (your current local setup)
+    try:
+        return instrument(get_pool().acquire(), started)
     except mysql.connector.Error as e:
         # temporary: don't kill the app, just log
         print("DB connection failed:", e)
         return None
+
+# ----------------------------- parallel queries ------------------------------
+# Independent queries of one endpoint run side by side, each on its own pooled
+# connection, so the response waits for the slowest query instead of their sum.
+QUERY_WORKERS = int(os.getenv("QUERY_WORKERS", "4"))
+QUERY_TIMEOUT = float(os.getenv("QUERY_TIMEOUT", "30"))   # seconds, per query
+_EXECUTORS = {}   # pid -> ThreadPoolExecutor (threads don't survive a gunicorn fork)
+
+class QueryTimeout(Exception):
+    def __init__(self, names):
+        super().__init__("query timed out: " + ", ".join(names))
+        self.names = names
+
+def get_executor():
+    pid = os.getpid()
+    ex = _EXECUTORS.get(pid)
+    if ex is None:
+        ex = _EXECUTORS[pid] = ThreadPoolExecutor(QUERY_WORKERS, thread_name_prefix="query")
+    return ex
+
+def _timed_query(sql, params, timeout, timings=None):
+    _METRICS_LOCAL.timings = timings
+    try:
+        return _run_timed_query(sql, params, timeout)
+    finally:
+        _METRICS_LOCAL.timings = None
+
+def _run_timed_query(sql, params, timeout):
+    started = monotonic()
+    conn = get_connection()
+    if conn is None:
+        raise RuntimeError("database unavailable")
+    cur = conn.cursor(dictionary=True)
+    try:
+        if USE_SQLITE:
+            # abort the statement itself once it runs past the deadline
+            deadline = started + timeout
+            conn.set_progress_handler(lambda: monotonic() > deadline, 10000)
+        else:
+            cur.execute("SET SESSION max_execution_time = %s", (int(timeout * 1000),))
+        try:
+            cur.execute(sql, tuple(params))
+            rows = cur.fetchall()
+        finally:
+            if USE_SQLITE:
+                conn.set_progress_handler(None, 0)
+            else:
+                cur.execute("SET SESSION max_execution_time = 0")
+    finally:
+        cur.close(); conn.close()
+    return rows, monotonic() - started
+
+def run_queries(queries, timeout=QUERY_TIMEOUT):
+    """
+    Run {name: (sql, params)} concurrently. Returns ({name: rows}, {name: seconds});
+    raises QueryTimeout listing the queries still running after `timeout`.
+    """
+    ex = get_executor()
+    timings = current_timings()
+    futures = {name: ex.submit(_timed_query, sql, params, timeout, timings)
+               for name, (sql, params) in queries.items()}
+    wait(futures.values(), timeout=timeout)
+    late = [name for name, fut in futures.items() if not fut.done()]
+    if late:
+        raise QueryTimeout(late)
+    results, timings = {}, {}
+    for name, fut in futures.items():
+        try:
+            results[name], timings[name] = fut.result()
+        except sqlite3.OperationalError as e:
+            if "interrupted" in str(e):
+                raise QueryTimeout([name])
+            raise
+        except mysql.connector.Error as e:
+            if e.errno == 3024:   # ER_QUERY_TIMEOUT (max_execution_time exceeded)
+                raise QueryTimeout([name])
+            raise
+    return results, timings
+
+def server_timing(timings, total=None):
+    """Server-Timing header value: name;dur=<ms> per query (+ total)."""
+    parts = [f"{name};dur={sec * 1000:.1f}" for name, sec in timings.items()]
+    if total is not None:
+        parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
+
+# ----------------------------- rollups ---------------------------------------
+# rollups.py materialises rollup_<fact> at snapshot/ingest time. Set USE_ROLLUPS=0
+# to force every chart back onto the raw fact tables.
+USE_ROLLUPS = os.environ.get("USE_ROLLUPS", "1") == "1"
+ROLLUP_CHECK_TTL = 60   # seconds between "does the rollup exist?" probes on MySQL
+_ROLLUP_SEEN = {}       # rollup table -> (probe key, available)
+
+def rollup_available(fact: str) -> bool:
+    if not USE_ROLLUPS or fact not in ROLLUPS:
+        return False
+    name = rollup_name(fact)
+    # re-probed when the data changes (snapshot_key)
+    probe = snapshot_key(ROLLUP_CHECK_TTL)
+    seen = _ROLLUP_SEEN.get(name)
+    if seen and seen[0] == probe:
+        return seen[1]
+
+    available = False
+    conn = get_connection()
+    if conn is not None:
+        cur = conn.cursor()
+        try:
+            cur.execute(f"SELECT 1 FROM {name} LIMIT 1")
+            cur.fetchall()
+            available = True
+        except Exception:
+            available = False
+        finally:
+            cur.close(); conn.close()
+    _ROLLUP_SEEN[name] = (probe, available)
+    return available
+
+def fact_source(fact: str, f, value: str, group_by: str = None):
+    """
+    Return (table, joins, wheres, params, measure, group_cols) for a sales fact under
+    the dashboard filters. Uses rollup_<fact> when it exists (every parse_filters()
+    combination maps onto its columns), otherwise the raw fact joined to customer.
+    Callers select SUM({measure}) FROM {table} s {joins} WHERE {wheres}; pass the
+    group_by the caller will use so the raw path keeps the customer join for it.
+    """
+    # within one /api/dashboard batch each (fact, filters, metric) is resolved once
+    memo = g.get("fact_sources") if has_request_context() else None
+    if memo is not None:
+        key = (fact, tuple(sorted(f.items())), value, group_by)
+        if key not in memo:
+            memo[key] = _fact_source(fact, f, value, group_by)
+        table, joins, wh, params, measure, group_cols = memo[key]
+        return table, list(joins), list(wh), list(params), measure, group_cols
+    return _fact_source(fact, f, value, group_by)
+
+def _fact_source(fact: str, f, value: str, group_by: str = None):
+    if rollup_available(fact):
+        wh, params, weight = rollup_filters(f)
+        measure = f"s.{value} * s.{weight}" if weight else f"s.{value}"
+        return rollup_name(fact), [], wh, params, measure, ROLLUP_GROUP_COLS
+
+    keep_join = RAW_GROUP_COLS.get(group_by, "").startswith("cus.")
+    joins, wh, params = build_customer_filters("s", f, use_sold_to_name=False, keep_join=keep_join)
+    cat_joins, cat_where = category_filters("s", f["category"])
+    joins += cat_joins
+    wh    += cat_where
+
+    # direct fields (indexable)
+    if f["product_group"] != "ALL":
+        wh.append("s.product_group = %s"); params.append(f["product_group"])
+    if f["pattern"] != "ALL":
+        wh.append("s.pattern = %s"); params.append(f["pattern"])
+
+    return fact, joins, wh, params, f"s.{value}", RAW_GROUP_COLS
+
+# ----------------------------- customer dimension ----------------------------
+# customers.py keeps the customer table in memory and turns the customer-side
+# filters into a ship_to set. CUSTOMER_RESOLVER=0 goes back to joining customer.
+CUSTOMER_RESOLVER = os.environ.get("CUSTOMER_RESOLVER", "1") == "1"
+CUSTOMER_RELOAD_TTL = int(os.getenv("CUSTOMER_RELOAD_TTL", "300"))   # mysql: reload period
+_CUSTOMERS = None
+_CUSTOMERS_KEY = None
+_CUSTOMERS_LOCK = threading.Lock()
+
+def customer_index():
+    """The loaded CustomerIndex, or None when the resolver is off or can't stand in for the join."""
+    global _CUSTOMERS, _CUSTOMERS_KEY
+    if not CUSTOMER_RESOLVER:
+        return None
+    # reloads with the data (snapshot_key)
+    key = snapshot_key(CUSTOMER_RELOAD_TTL)
+    if _CUSTOMERS_KEY != key:
+        with _CUSTOMERS_LOCK:
+            if _CUSTOMERS_KEY != key:
+                conn = get_connection()
+                try:
+                    _CUSTOMERS = CustomerIndex.load(conn, fold=not USE_SQLITE)
+                except Exception as e:
+                    print("customer index load failed:", e)
+                    _CUSTOMERS = None
+                finally:
+                    if conn is not None:
+                        conn.close()
+                _CUSTOMERS_KEY = key
+    return _CUSTOMERS if _CUSTOMERS is not None and _CUSTOMERS.unique else None
+
+# ----------------------------- spatial index ---------------------------------
+# geo.py's grid over customer latitude/longitude, rebuilt when the snapshot changes.
+GEO_RELOAD_TTL = int(os.getenv("GEO_RELOAD_TTL", "300"))   # mysql: reload period
+_GEO = None
+_GEO_KEY = None
+_GEO_LOCK = threading.Lock()
+
+def spatial_index():
+    """The loaded SpatialIndex (empty if the customer coordinates can't be read)."""
+    global _GEO, _GEO_KEY
+    # reloads with the data (snapshot_key)
+    key = snapshot_key(GEO_RELOAD_TTL)
+    if _GEO_KEY != key:
+        with _GEO_LOCK:
+            if _GEO_KEY != key:
+                conn = get_connection()
+                try:
+                    _GEO = SpatialIndex.load(conn)
+                except Exception as e:
+                    print("spatial index load failed:", e)
+                    _GEO = SpatialIndex([])
+                finally:
+                    if conn is not None:
+                        conn.close()
+                _GEO_KEY = key
+    return _GEO
+
+# ----------------------------- dropdown lists --------------------------------
+# dimensions.py's sorted lookup lists, rebuilt when the snapshot changes.
+DIMENSIONS_RELOAD_TTL = int(os.getenv("DIMENSIONS_RELOAD_TTL", "300"))   # mysql: reload period
+_DIMENSIONS = None
+_DIMENSIONS_KEY = None
+_DIMENSIONS_LOCK = threading.Lock()
+
+def dimension_index():
+    """The loaded DimensionIndex, or None if it couldn't be read."""
+    global _DIMENSIONS, _DIMENSIONS_KEY
+    # reloads with the data (snapshot_key)
+    key = snapshot_key(DIMENSIONS_RELOAD_TTL)
+    if _DIMENSIONS_KEY != key:
+        with _DIMENSIONS_LOCK:
+            if _DIMENSIONS_KEY != key:
+                conn = get_connection()
+                try:
+                    _DIMENSIONS = DimensionIndex.load(conn, fold=not USE_SQLITE)
+                except Exception as e:
+                    print("dimension index load failed:", e)
+                    _DIMENSIONS = None
+                finally:
+                    if conn is not None:
+                        conn.close()
+                _DIMENSIONS_KEY = key
+    return _DIMENSIONS
+
+# ----------------------------- columnar engine -------------------------------
+# ANALYTICS_BACKEND=columnar serves the chart endpoints from columnar.py's in-memory
+# NumPy engine instead of SQL (needs numpy; anything it can't load stays on SQL).
+# Reloads run on a background thread and replace the engine in one assignment, so no
+# request waits for whole fact tables to be read. Meanwhile requests keep the old
+# engine if the data it was built from is still current (MySQL's periodic reload),
+# and go to SQL otherwise.
+ANALYTICS_BACKEND = os.getenv("ANALYTICS_BACKEND", "sql").lower()
+ENGINE_RELOAD_TTL = int(os.getenv("ENGINE_RELOAD_TTL", "3600"))   # mysql: reload period
+_ENGINE = (None, None)     # (engine, snapshot_key it was built at), swapped as a pair
+_ENGINE_LOADING = None     # (pid, key) of the load in progress; threads don't survive a fork
+_ENGINE_LOCK = threading.Lock()
+
+def load_columnar_engine(key=None):
+    """Build the engine for `key` (default: now) on this thread and swap it in."""
+    global _ENGINE, _ENGINE_LOADING
+    key = snapshot_key(ENGINE_RELOAD_TTL) if key is None else key
+    try:
+        engine = ColumnarEngine.load(get_connection)
+    except Exception as e:
+        print("columnar engine load failed:", e)
+        engine = None       # SQL until the data changes again
+    with _ENGINE_LOCK:
+        _ENGINE = (engine, key)
+        if _ENGINE_LOADING == (os.getpid(), key):
+            _ENGINE_LOADING = None
+    return engine
+
+def _reload_columnar_engine(key):
+    global _ENGINE_LOADING
+    with _ENGINE_LOCK:
+        if _ENGINE[1] == key or _ENGINE_LOADING == (os.getpid(), key):
+            return
+        _ENGINE_LOADING = (os.getpid(), key)
+    threading.Thread(target=load_columnar_engine, args=(key,), name="columnar-load", daemon=True).start()
+
+def columnar_engine(table: str):
+    """The loaded engine if the columnar backend is on and can serve `table`, else None."""
+    if ANALYTICS_BACKEND != "columnar" or not HAVE_NUMPY:
+        return None
+    # reloads with the data (snapshot_key)
+    key = snapshot_key(ENGINE_RELOAD_TTL)
+    engine, built_at = _ENGINE
+    if built_at != key:
+        _reload_columnar_engine(key)
+        # MySQL keys are (data version, period): same version, same data
+        current = not USE_SQLITE and built_at is not None and built_at[0] == key[0]
+        if not current:
+            return None
+    return engine if engine is not None and engine.has(table) else None
+
 @app.get("/api/ping")
 def ping():
     return {"ok": True}
 
+@app.get("/api/_pool")
+def pool_status():
+    return jsonify(pool_stats())
+
+@app.get("/api/_cache")
+def cache_status():
+    return jsonify(cache_stats())
+
+@app.get("/api/_metrics")
+def metrics_status():
+    """Prometheus text exposition of the request/query metrics (this worker only)."""
+    for gauge, stats in ((POOL_GAUGE, pool_stats()), (CACHE_GAUGE, cache_stats())):
+        for stat, value in stats.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                gauge.set(value, stat=stat)
+    return app.response_class(METRICS.render(),
+                              content_type="text/plain; version=0.0.4; charset=utf-8")
+
 # ------------------------------------------------------------------------------
 
 @app.route("/")
@@ -366,11 +1779,17 @@ def kpi_snapshot():
         if sold_to and sold_to != "ALL":
             sv = sold_to.strip()
             if sv.isdigit() or sv.upper().startswith("A"):
-                where.append(
-                    f"REGEXP_REPLACE(UPPER(TRIM(CAST({alias_s}.Sold_To AS CHAR))), '[^A-Z0-9]', '') = "
-                    f"REGEXP_REPLACE(UPPER(TRIM(%s)), '[^A-Z0-9]', '')"
-                )
-                params.append(sv)
+                index = customer_index()
+                if index is not None:
+                    # spellings of that id known to customer, as an indexable IN list
+                    cond, vals = in_list(f"{alias_s}.Sold_To", index.sold_to_variants(sv))
+                    where.append(cond); params.extend(vals)
+                else:
+                    where.append(
+                        f"REGEXP_REPLACE(UPPER(TRIM(CAST({alias_s}.Sold_To AS CHAR))), '[^A-Z0-9]', '') = "
+                        f"REGEXP_REPLACE(UPPER(TRIM(%s)), '[^A-Z0-9]', '')"
+                    )
+                    params.append(sv)
             else:
                 col = "Sold_To_Name" if alias_s == "s" else "sold_to_name"
                 where.append(f"{alias_s}.{col} = %s"); params.append(sv)
@@ -394,6 +1813,10 @@ def kpi_snapshot():
     actual = {}  # (region, salesman) -> month array
     target = {}
 
+    cat_join_m, cat_where_m = category_filters("s", category)
+    cat_join_d, cat_where_d = category_filters("j", category)
+    cat_join_t, cat_where_t = category_target_filters("t", category)
+
     # -------- Q1/Q2 actuals from sales2025
     wh_m, prm_m = [], []
     wh_m.append("s.Month BETWEEN 1 AND 10")
@@ -409,54 +1832,12 @@ def kpi_snapshot():
                SUM(s.{value_year})                      AS v
           FROM sales2025 s
           {bm_join_yr}
-          {cat_join_m}
+          {' '.join(cat_join_m)}
          WHERE {" AND ".join(wh_m)}
          GROUP BY cus.bde_state, UPPER(TRIM(cus.salesman_name)), s.Month
     """
-    @app.get("/api/top_customers")
-    def top_customers():
-        f = parse_filters(request)   # you already use this
-        value = "qty" if f["metric"] == "qty" else "amt"
-        limit = int(request.args.get("limit", 10))
-
-        joins, wh, params = build_customer_filters("s", f, use_sold_to_name=False)
-        cat_joins, cat_where = category_filters("s", f["category"])
-        joins += cat_joins
-        wh    += cat_where
-
-        where_sql = ("WHERE " + " AND ".join(wh)) if wh else ""
 
-        sql = f"""
-        SELECT
-            s.ship_to,
-            s.ship_to_name,
-            SUM(s.{value}) AS total_metric
-        FROM sales2025 s
-        {' '.join(joins)}
-        {where_sql}
-        GROUP BY s.ship_to, s.ship_to_name
-        ORDER BY total_metric DESC
-        LIMIT %s
-        """
-        params.append(limit)
-
-        conn = get_connection(); cur = conn.cursor(dictionary=True)
-        try:
-            cur.execute(sql, tuple(params))
-            rows = cur.fetchall()
-        finally:
-            cur.close(); conn.close()
-
-        return jsonify([
-            {
-                "ship_to": r["ship_to"],
-                "name": r["ship_to_name"],
-                "value": float(r["total_metric"] or 0)
-            }
-            for r in rows
-        ])
-
-    # -------- July actuals from julysales
+    # -------- July actuals (month to date) from the daily table
     wh_j, prm_j = [], []
     add_common_mapping_filters(wh_j, prm_j, "cus")
     add_sold_to_filters(wh_j, prm_j, "j", is_num_table=False)
@@ -466,16 +1847,56 @@ def kpi_snapshot():
     sql_j = f"""
         SELECT cus.bde_state              AS region,
                UPPER(TRIM(cus.salesman_name)) AS salesman,
-               SUM(s10.{value})              AS v
-          FROM sales2510 s10
+               SUM(j.{value_day})              AS v
+          FROM sales2510 j
           {bm_join_js}
-          {cat_join_d}
+          {' '.join(cat_join_d)}
          {"WHERE " + " AND ".join(wh_j) if wh_j else ""}
          GROUP BY cus.bde_state, UPPER(TRIM(cus.salesman_name))
     """
 
-    # -------- Targets helper (by region) using customer table
-    
+    # -------- Targets by region / salesman / month, mapped through customer
+    wh_t, prm_t = [], []
+    add_common_mapping_filters(wh_t, prm_t, "cus")
+    add_sold_to_filters(wh_t, prm_t, "cus", is_num_table=False)
+    add_other_filters(wh_t, prm_t, "cus", has_product=False, has_pattern=False)
+    wh_t.extend(cat_where_t)
+
+    sql_t = f"""
+        SELECT cus.bde_state              AS region,
+               UPPER(TRIM(cus.salesman_name)) AS salesman,
+               t.month                        AS mth,
+               SUM(t.{value_month})           AS v
+          FROM target2025 t
+          JOIN customer cus
+            ON cus.ship_to = t.ship_to
+          {' '.join(cat_join_t)}
+         {"WHERE " + " AND ".join(wh_t) if wh_t else ""}
+         GROUP BY cus.bde_state, UPPER(TRIM(cus.salesman_name)), t.month
+    """
+
+    # the three queries are independent: run them side by side
+    started = monotonic()
+    try:
+        results, timings = run_queries({
+            "sales2025":  (sql_m, prm_m),
+            "sales2510":  (sql_j, prm_j),
+            "target2025": (sql_t, prm_t),
+        })
+    except QueryTimeout as e:
+        return jsonify({"error": str(e), "timed_out": e.names}), 504
+
+    for r in results["sales2025"]:
+        m = int(r["mth"] or 0)
+        if 1 <= m <= 12:
+            actual.setdefault((r["region"], r["salesman"]), months12())[m] += float(r["v"] or 0)
+    for r in results["sales2510"]:
+        # the daily table is fresher than the monthly one for the current month
+        actual.setdefault((r["region"], r["salesman"]), months12())[7] = float(r["v"] or 0)
+    for r in results["target2025"]:
+        m = int(r["mth"] or 0)
+        if 1 <= m <= 12:
+            target.setdefault((r["region"], r["salesman"]), months12())[m] += float(r["v"] or 0)
 
     # -------- packers
     def pack(arr_a, arr_t):
@@ -516,10 +1937,57 @@ def kpi_snapshot():
 
         out_regions.append({"region": reg, "kpi": pack(region_a, region_t), "salesmen": salesmen_rows})
 
-    return jsonify({"overall": pack(overall_a, overall_t), "regions": out_regions})
+    resp = jsonify({"overall": pack(overall_a, overall_t), "regions": out_regions})
+    resp.headers["Server-Timing"] = server_timing(timings, monotonic() - started)
+    return resp
+
+# ----------------------------- Top customers ---------------------------------
+@app.get("/api/top_customers")
+def top_customers():
+    f = parse_filters(request)   # you already use this
+    value = "qty" if f["metric"] == "qty" else "amt"
+    limit = int(request.args.get("limit", 10))
+
+    joins, wh, params = build_customer_filters("s", f, use_sold_to_name=False)
+    cat_joins, cat_where = category_filters("s", f["category"])
+    joins += cat_joins
+    wh    += cat_where
+
+    where_sql = ("WHERE " + " AND ".join(wh)) if wh else ""
+
+    sql = f"""
+    SELECT
+        s.ship_to,
+        s.ship_to_name,
+        SUM(s.{value}) AS total_metric
+    FROM sales2025 s
+    {' '.join(joins)}
+    {where_sql}
+    GROUP BY s.ship_to, s.ship_to_name
+    ORDER BY total_metric DESC
+    LIMIT %s
+    """
+    params.append(limit)
+
+    conn = get_connection(); cur = conn.cursor(dictionary=True)
+    try:
+        cur.execute(sql, tuple(params))
+        rows = cur.fetchall()
+    finally:
+        cur.close(); conn.close()
+
+    return jsonify([
+        {
+            "ship_to": r["ship_to"],
+            "name": r["ship_to_name"],
+            "value": float(r["total_metric"] or 0)
+        }
+        for r in rows
+    ])
 
 # ----------------------------- Daily Sales ---------------------------------
 @app.get("/api/daily_sales")
+@cached("daily_sales")
 def daily_sales():
     f = parse_filters(request)
     value = "qty" if f["metric"] == "qty" else "amt"
@@ -527,20 +1995,13 @@ def daily_sales():
     # 0 or missing = no top filter
     top_limit = int(request.args.get("top_limit", 0) or 0)
 
-    joins, wh, params = build_customer_filters("s", f, use_sold_to_name=False)
+    engine = columnar_engine("sales2510")
+    if engine is not None:
+        totals = engine.series("sales2510", f, value, top_limit=top_limit)
+        return series_response("day", range(1, 31), [totals.get(p, 0) for p in range(1, 31)])
 
-    # category
-    cat_joins, cat_where = category_filters("s", f["category"])
-    joins += cat_joins
-    wh    += cat_where
-
-    # direct fields (indexable)
-    if f["product_group"] != "ALL":
-        wh.append("s.product_group = %s")
-        params.append(f["product_group"])
-    if f["pattern"] != "ALL":
-        wh.append("s.pattern = %s")
-        params.append(f["pattern"])
+    # customer / category / product filters, on the rollup when it can serve them
+    table, joins, wh, params, measure, _ = fact_source("sales2510", f, value)
 
     base_where_sql = ("WHERE " + " AND ".join(wh)) if wh else ""
 
@@ -553,11 +2014,11 @@ def daily_sales():
         if top_limit > 0:
             top_sql = f"""
               SELECT s.sold_to AS sold_to
-                FROM sales2510 s
+                FROM {table} s
                 {' '.join(joins)}
                 {base_where_sql}
                GROUP BY s.sold_to
-               ORDER BY SUM(s.{value}) DESC
+               ORDER BY SUM({measure}) DESC
                LIMIT %s
             """
             cur.execute(top_sql, tuple(params) + (top_limit,))
@@ -566,7 +2027,7 @@ def daily_sales():
 
             if not top_sold_to:
                 # no matching customers – all days = 0
-                return jsonify([{"day": d, "value": 0} for d in range(1, 31)])
+                return series_response("day", range(1, 31), [0] * 30)
 
         # 2) Daily totals, optionally restricted to top N sold_to
         wh2 = list(wh)
@@ -580,8 +2041,8 @@ def daily_sales():
         where_sql2 = ("WHERE " + " AND ".join(wh2)) if wh2 else ""
 
         daily_sql = f"""
-          SELECT s.day AS day_num, SUM(s.{value}) AS daily_total
-            FROM sales2510 s
+          SELECT s.day AS day_num, SUM({measure}) AS daily_total
+            FROM {table} s
             {' '.join(joins)}
             {where_sql2}
            GROUP BY s.day
@@ -595,10 +2056,11 @@ def daily_sales():
         conn.close()
 
     day_map = {int(r["day_num"]): float(r["daily_total"] or 0) for r in rows}
-    return jsonify([{"day": d, "value": day_map.get(d, 0)} for d in range(1, 31)])
+    return series_response("day", range(1, 31), [day_map.get(d, 0) for d in range(1, 31)])
 
 # -------------------- Daily breakdown (stacked by group) -------------------
 @app.get("/api/daily_breakdown")
+@cached("daily_breakdown")
 def daily_breakdown():
 
     f = parse_filters(request)
@@ -606,17 +2068,8 @@ def daily_breakdown():
 
     # Which dimension to group by?
     group_by = (request.args.get("group_by") or "region").strip()
-    group_cols = {
-        "product_group": "s.product_group",
-        "region":        "cus.bde_state",
-        "salesman":      "cus.salesman_Name",
-        "sold_to_group": "cus.sold_to_group",
-        "sold_to":       "cus.Sold_to_Name",
-        "pattern":       "s.pattern",
-    }
-    if group_by not in group_cols:
+    if group_by not in RAW_GROUP_COLS:
         return jsonify({"error": "invalid group_by"}), 400
-    group_col = group_cols[group_by]
 
     # Optional Top-N on sold_to (only if not already filtering a single sold_to)
     top_only = str(request.args.get("top_only", "0")).lower() in ("1", "true", "yes")
@@ -626,17 +2079,14 @@ def daily_breakdown():
         top_n = 10
     apply_top = top_only and group_by == "sold_to" and (f["sold_to"] in ("", "ALL"))
 
-    # ---- Build base JOINs / WHEREs (consistent helpers) ----
-    joins, wh, params = build_customer_filters("s", f, use_sold_to_name=False)
-    cat_joins, cat_where = category_filters("s", f["category"])
-    joins += cat_joins
-    wh    += cat_where
+    engine = columnar_engine("sales2510")
+    if engine is not None:
+        rows = engine.breakdown("sales2510", f, value, group_by, top_n=top_n if apply_top else 0)
+        return breakdown_response("day", ({"day": p, "group_label": g, "value": v} for p, g, v in rows))
 
-    # Direct, index-friendly filters that live on sales2025
-    if f["product_group"] != "ALL":
-        wh.append("s.product_group = %s"); params.append(f["product_group"])
-    if f["pattern"] != "ALL":
-        wh.append("s.pattern = %s");       params.append(f["pattern"])
+    # ---- Build base JOINs / WHEREs (rollup when the filters allow it) ----
+    table, joins, wh, params, measure, group_cols = fact_source("sales2510", f, value, group_by)
+    group_col = group_cols[group_by]
 
     where_sql = ("WHERE " + " AND ".join(wh)) if wh else ""
 
@@ -648,8 +2098,8 @@ def daily_breakdown():
         # Reuse the same joins/where for a ranking by total 2025 value
         top_cte = f"""
           WITH top_sold AS (
-            SELECT {group_col} AS sold_nm, SUM(s.{value}) AS tot
-              FROM sales2510 s
+            SELECT {group_col} AS sold_nm, SUM({measure}) AS tot
+              FROM {table} s
               {' '.join(joins)}
               {where_sql}
              GROUP BY {group_col}
@@ -665,8 +2115,8 @@ def daily_breakdown():
       {top_cte}
       SELECT s.day AS day,
              {group_col} AS group_label,
-             SUM(s.{value}) AS value
-        FROM sales2510 s
+             SUM({measure}) AS value
+        FROM {table} s
         {' '.join(joins)}
         {top_join}
         {where_sql}
@@ -674,20 +2124,15 @@ def daily_breakdown():
        ORDER BY s.day
     """
 
-    try:
-        conn = get_connection(); cur = conn.cursor(dictionary=True)
-        cur.execute(sql, tuple(top_params + params))
-        rows = cur.fetchall()
-    finally:
-        try: cur.close(); conn.close()
-        except: pass
-
-    return jsonify(rows)
+    # the top_sold CTE repeats the filters before its LIMIT, ahead of the main query's
+    return stream_query(sql, (params + top_params if top_params else []) + params,
+                        lambda rows, close: breakdown_response("day", rows, close))
 
 # ----------------------------- Daily Target (Oct) ---------------------------------
 import calendar
 
 @app.get("/api/daily_target")
+@cached("daily_target")
 def daily_target():
     f = parse_filters(request)
     value = "qty" if f["metric"] == "qty" else "amt"
@@ -695,35 +2140,39 @@ def daily_target():
     # which month? default to October (10) if nothing is passed
     month = int(request.args.get("month", 10))
 
-    joins, wh, params = build_customer_filters("t", f, use_sold_to_name=False)
+    engine = columnar_engine("target2025")
+    if engine is not None:
+        monthly_total = engine.target_series(f, value).get(month, 0)
+    else:
+        joins, wh, params = build_customer_filters("t", f, use_sold_to_name=False)
 
-    # category
-    cat_joins, cat_where = category_target_filters("t", f["category"])
-    joins += cat_joins
-    wh    += cat_where
+        # category
+        cat_joins, cat_where = category_target_filters("t", f["category"])
+        joins += cat_joins
+        wh    += cat_where
 
-    # restrict to the chosen month only
-    wh.append("t.month = %s")
-    params.append(month)
+        # restrict to the chosen month only
+        wh.append("t.month = %s")
+        params.append(month)
 
-    where_sql = ("WHERE " + " AND ".join(wh)) if wh else ""
-    sql = f"""
-      SELECT t.month AS month_num, SUM(t.{value}) AS monthly_total
-        FROM target2025 t
-        {' '.join(joins)}
-        {where_sql}
-        GROUP BY t.month
-        ORDER BY t.month
-    """
+        where_sql = ("WHERE " + " AND ".join(wh)) if wh else ""
+        sql = f"""
+          SELECT t.month AS month_num, SUM(t.{value}) AS monthly_total
+            FROM target2025 t
+            {' '.join(joins)}
+            {where_sql}
+            GROUP BY t.month
+            ORDER BY t.month
+        """
 
-    conn = get_connection(); cur = conn.cursor(dictionary=True)
-    try:
-        cur.execute(sql, tuple(params))
-        row = cur.fetchone()
-    finally:
-        cur.close(); conn.close()
+        conn = get_connection(); cur = conn.cursor(dictionary=True)
+        try:
+            cur.execute(sql, tuple(params))
+            row = cur.fetchone()
+        finally:
+            cur.close(); conn.close()
 
-    monthly_total = float(row["monthly_total"] or 0) if row else 0
+        monthly_total = float(row["monthly_total"] or 0) if row else 0
 
     # how many days in that month? (2025 used as the year for target2025)
     days_in_month = calendar.monthrange(2025, month)[1]
@@ -731,13 +2180,11 @@ def daily_target():
     daily_value = monthly_total / days_in_month if days_in_month else 0
 
     # return one entry per day: 1..N
-    return jsonify([
-        {"day": d, "value": daily_value}
-        for d in range(1, days_in_month + 1)
-    ])
+    return series_response("day", range(1, days_in_month + 1), [daily_value] * days_in_month)
 
 # ----------------------------- Monthly Sales ---------------------------------
 @app.get("/api/monthly_sales")
+@cached("monthly_sales")
 def monthly_sales():
     f = parse_filters(request)
     value = "qty" if f["metric"] == "qty" else "amt"
@@ -745,20 +2192,13 @@ def monthly_sales():
     # 0 or missing = no top filter, same behaviour as before
     top_limit = int(request.args.get("top_limit", 0) or 0)
 
-    joins, wh, params = build_customer_filters("s", f, use_sold_to_name=False)
+    engine = columnar_engine("sales2025")
+    if engine is not None:
+        totals = engine.series("sales2025", f, value, top_limit=top_limit)
+        return series_response("month", range(1, 13), [totals.get(p, 0) for p in range(1, 13)])
 
-    # category
-    cat_joins, cat_where = category_filters("s", f["category"])
-    joins += cat_joins
-    wh    += cat_where
-
-    # direct fields (indexable)
-    if f["product_group"] != "ALL":
-        wh.append("s.product_group = %s")
-        params.append(f["product_group"])
-    if f["pattern"] != "ALL":
-        wh.append("s.pattern = %s")
-        params.append(f["pattern"])
+    # customer / category / product filters, on the rollup when it can serve them
+    table, joins, wh, params, measure, _ = fact_source("sales2025", f, value)
 
     base_where_sql = ("WHERE " + " AND ".join(wh)) if wh else ""
 
@@ -771,11 +2211,11 @@ def monthly_sales():
         if top_limit > 0:
             top_sql = f"""
               SELECT s.sold_to AS sold_to
-                FROM sales2025 s
+                FROM {table} s
                 {' '.join(joins)}
                 {base_where_sql}
                GROUP BY s.sold_to
-               ORDER BY SUM(s.{value}) DESC
+               ORDER BY SUM({measure}) DESC
                LIMIT %s
             """
             cur.execute(top_sql, tuple(params) + (top_limit,))
@@ -784,7 +2224,7 @@ def monthly_sales():
 
             # If nothing found, just return zeros for all 12 months
             if not top_sold_to:
-                return jsonify([{"month": m, "value": 0} for m in range(1, 13)])
+                return series_response("month", range(1, 13), [0] * 12)
 
         # 2) Monthly totals, optionally restricted to the top N sold_to
         wh2 = list(wh)
@@ -798,8 +2238,8 @@ def monthly_sales():
         where_sql2 = ("WHERE " + " AND ".join(wh2)) if wh2 else ""
 
         monthly_sql = f"""
-          SELECT s.month AS month_num, SUM(s.{value}) AS monthly_total
-            FROM sales2025 s
+          SELECT s.month AS month_num, SUM({measure}) AS monthly_total
+            FROM {table} s
             {' '.join(joins)}
             {where_sql2}
            GROUP BY s.month
@@ -813,10 +2253,11 @@ def monthly_sales():
         conn.close()
 
     month_map = {int(r["month_num"]): float(r["monthly_total"] or 0) for r in rows}
-    return jsonify([{"month": m, "value": month_map.get(m, 0)} for m in range(1, 13)])
+    return series_response("month", range(1, 13), [month_map.get(m, 0) for m in range(1, 13)])
 
 # -------------------- Monthly breakdown (stacked by group) -------------------
 @app.get("/api/monthly_breakdown")
+@cached("monthly_breakdown")
 def monthly_breakdown():
 
     f = parse_filters(request)
@@ -824,17 +2265,8 @@ def monthly_breakdown():
 
     # Which dimension to group by?
     group_by = (request.args.get("group_by") or "region").strip()
-    group_cols = {
-        "product_group": "s.product_group",
-        "region":        "cus.bde_state",
-        "salesman":      "cus.salesman_Name",
-        "sold_to_group": "cus.sold_to_group",
-        "sold_to":       "cus.sold_to_Name",
-        "pattern":       "s.pattern",
-    }
-    if group_by not in group_cols:
+    if group_by not in RAW_GROUP_COLS:
         return jsonify({"error": "invalid group_by"}), 400
-    group_col = group_cols[group_by]
 
     # Optional Top-N on sold_to (only if not already filtering a single sold_to)
     top_only = str(request.args.get("top_only", "0")).lower() in ("1", "true", "yes")
@@ -844,17 +2276,14 @@ def monthly_breakdown():
         top_n = 10
     apply_top = top_only and group_by == "sold_to" and (f["sold_to"] in ("", "ALL"))
 
-    # ---- Build base JOINs / WHEREs (consistent helpers) ----
-    joins, wh, params = build_customer_filters("s", f, use_sold_to_name=False)
-    cat_joins, cat_where = category_filters("s", f["category"])
-    joins += cat_joins
-    wh    += cat_where
+    engine = columnar_engine("sales2025")
+    if engine is not None:
+        rows = engine.breakdown("sales2025", f, value, group_by, top_n=top_n if apply_top else 0)
+        return breakdown_response("month", ({"month": p, "group_label": g, "value": v} for p, g, v in rows))
 
-    # Direct, index-friendly filters that live on sales2025
-    if f["product_group"] != "ALL":
-        wh.append("s.product_group = %s"); params.append(f["product_group"])
-    if f["pattern"] != "ALL":
-        wh.append("s.pattern = %s");       params.append(f["pattern"])
+    # ---- Build base JOINs / WHEREs (rollup when the filters allow it) ----
+    table, joins, wh, params, measure, group_cols = fact_source("sales2025", f, value, group_by)
+    group_col = group_cols[group_by]
 
     where_sql = ("WHERE " + " AND ".join(wh)) if wh else ""
 
@@ -866,8 +2295,8 @@ def monthly_breakdown():
         # Reuse the same joins/where for a ranking by total 2025 value
         top_cte = f"""
           WITH top_sold AS (
-            SELECT {group_col} AS sold_nm, SUM(s.{value}) AS tot
-              FROM sales2025 s
+            SELECT {group_col} AS sold_nm, SUM({measure}) AS tot
+              FROM {table} s
               {' '.join(joins)}
               {where_sql}
              GROUP BY {group_col}
@@ -883,8 +2312,8 @@ def monthly_breakdown():
       {top_cte}
       SELECT s.Month AS month,
              {group_col} AS group_label,
-             SUM(s.{value}) AS value
-        FROM sales2025 s
+             SUM({measure}) AS value
+        FROM {table} s
         {' '.join(joins)}
         {top_join}
         {where_sql}
@@ -892,55 +2321,160 @@ def monthly_breakdown():
        ORDER BY s.Month
     """
 
-    try:
-        conn = get_connection(); cur = conn.cursor(dictionary=True)
-        cur.execute(sql, tuple(top_params + params))
-        rows = cur.fetchall()
-    finally:
-        try: cur.close(); conn.close()
-        except: pass
-
-    return jsonify(rows)
+    # the top_sold CTE repeats the filters before its LIMIT, ahead of the main query's
+    return stream_query(sql, (params + top_params if top_params else []) + params,
+                        lambda rows, close: breakdown_response("month", rows, close))
 
 
 
 # ----------------------------- Monthly Target ---------------------------------
 @app.get("/api/monthly_target")
+@cached("monthly_target")
 def monthly_target():
     f = parse_filters(request)
     value = "qty" if f["metric"] == "qty" else "amt"
 
-    joins, wh, params = build_customer_filters("t", f, use_sold_to_name=False)
+    engine = columnar_engine("target2025")
+    if engine is not None:
+        month_map = engine.target_series(f, value)
+    else:
+        joins, wh, params = build_customer_filters("t", f, use_sold_to_name=False)
 
-    # category
-    cat_joins, cat_where = category_target_filters("t", f["category"])
-    joins += cat_joins
-    wh    += cat_where
+        # category
+        cat_joins, cat_where = category_target_filters("t", f["category"])
+        joins += cat_joins
+        wh    += cat_where
 
 
-    where_sql = ("WHERE " + " AND ".join(wh)) if wh else ""
-    sql = f"""
-      SELECT t.month AS month_num, SUM(t.{value}) AS monthly_total
-        FROM target2025 t
+        where_sql = ("WHERE " + " AND ".join(wh)) if wh else ""
+        sql = f"""
+          SELECT t.month AS month_num, SUM(t.{value}) AS monthly_total
+            FROM target2025 t
+            {' '.join(joins)}
+            {where_sql}
+           GROUP BY t.month
+           ORDER BY t.month
+        """
+
+        conn = get_connection(); cur = conn.cursor(dictionary=True)
+        try:
+            cur.execute(sql, tuple(params))
+            rows = cur.fetchall()
+        finally:
+            cur.close(); conn.close()
+
+        month_map = {int(r["month_num"]): float(r["monthly_total"] or 0) for r in rows}
+    return series_response("month", range(1, 13), [month_map.get(m, 0) for m in range(1, 13)])
+
+
+# ----------------------------- KPI by region / BDE ---------------------------
+def _quarters(sales, targets):
+    """Quarterly achievement % (1 dp) from 1..12 month maps, None where there's no target."""
+    out = {}
+    for q in range(4):
+        months = range(q * 3 + 1, q * 3 + 4)
+        s_ = sum(sales.get(m, 0) for m in months)
+        t_ = sum(targets.get(m, 0) for m in months)
+        out[f"Q{q + 1}"] = round(s_ / t_ * 100, 1) if t_ > 0 else None
+    return out
+
+def _top_months(rows, top_limit):
+    """{month: value} over all rows, or over the top_limit sold_tos like monthly_sales."""
+    if top_limit > 0:
+        totals = {}
+        for r in rows:
+            if r["sold_to"] is not None:   # SQL's IN (...) never matches a NULL sold_to
+                totals[r["sold_to"]] = totals.get(r["sold_to"], 0) + float(r["v"] or 0)
+        keep = set(sorted(totals, key=totals.get, reverse=True)[:top_limit])
+        rows = [r for r in rows if r["sold_to"] in keep]
+    months = {}
+    for r in rows:
+        m = int(r["mth"])
+        months[m] = months.get(m, 0) + float(r["v"] or 0)
+    return months
+
+@app.get("/api/kpi_by_region")
+@cached("kpi_by_region")
+def kpi_by_region():
+    """
+    Quarterly achievement for the "All" row and every (region, BDE) at once: one
+    grouped sales2025 query and one grouped target2025 query, instead of a
+    monthly_sales + monthly_target pair per salesman. Same filters as those
+    endpoints except region/salesman, which become the grouping; BDE keys are
+    UPPER(TRIM(salesman_name)).
+    """
+    f = parse_filters(request)
+    f.update(region="ALL", salesman="ALL")
+    value = "qty" if f["metric"] == "qty" else "amt"
+    top_limit = int(request.args.get("top_limit", 0) or 0)
+
+    table, joins, wh, params, measure, group_cols = fact_source("sales2025", f, value, "salesman")
+    region_col = group_cols["region"]
+    bde_col = f"UPPER(TRIM({group_cols['salesman']}))"
+    # per-sold_to rows only when a top-N has to be picked within each row
+    sold_to = "s.sold_to" if top_limit > 0 else "NULL"
+    group_extra = ", s.sold_to" if top_limit > 0 else ""
+    sales_sql = f"""
+      SELECT {region_col} AS region, {bde_col} AS bde, {sold_to} AS sold_to,
+             s.month AS mth, SUM({measure}) AS v
+        FROM {table} s
         {' '.join(joins)}
-        {where_sql}
-       GROUP BY t.month
-       ORDER BY t.month
+        {("WHERE " + " AND ".join(wh)) if wh else ""}
+       GROUP BY {region_col}, {bde_col}{group_extra}, s.month
     """
 
-    conn = get_connection(); cur = conn.cursor(dictionary=True)
-    try:
-        cur.execute(sql, tuple(params))
-        rows = cur.fetchall()
-    finally:
-        cur.close(); conn.close()
+    t_joins, t_wh, t_params = build_customer_filters("t", f, use_sold_to_name=False, keep_join=True)
+    cat_joins, cat_where = category_target_filters("t", f["category"])
+    t_joins += cat_joins
+    t_wh    += cat_where
+    target_sql = f"""
+      SELECT cus.bde_state AS region, UPPER(TRIM(cus.salesman_name)) AS bde,
+             t.month AS mth, SUM(t.{value}) AS v
+        FROM target2025 t
+        {' '.join(t_joins)}
+        {("WHERE " + " AND ".join(t_wh)) if t_wh else ""}
+       GROUP BY cus.bde_state, UPPER(TRIM(cus.salesman_name)), t.month
+    """
 
-    month_map = {int(r["month_num"]): float(r["monthly_total"] or 0) for r in rows}
-    return jsonify([{"month": m, "value": month_map.get(m, 0)} for m in range(1, 13)])
+    started = monotonic()
+    try:
+        results, timings = run_queries({
+            "sales2025":  (sales_sql, params),
+            "target2025": (target_sql, t_params),
+        })
+    except QueryTimeout as e:
+        return jsonify({"error": str(e), "timed_out": e.names}), 504
+
+    sales_by, target_by = {}, {}
+    for r in results["sales2025"]:
+        sales_by.setdefault((r["region"], r["bde"]), []).append(r)
+    for r in results["target2025"]:
+        m = target_by.setdefault((r["region"], r["bde"]), {})
+        m[int(r["mth"])] = m.get(int(r["mth"]), 0) + float(r["v"] or 0)
+
+    all_targets = {}
+    for m in target_by.values():
+        for k, v in m.items():
+            all_targets[k] = all_targets.get(k, 0) + v
+
+    regions = {}
+    for key in set(sales_by) | set(target_by):
+        region, bde = key
+        if region is None or bde is None:
+            continue
+        regions.setdefault(region, {})[bde] = _quarters(
+            _top_months(sales_by.get(key, []), top_limit), target_by.get(key, {}))
 
+    resp = jsonify({
+        "all": _quarters(_top_months(results["sales2025"], top_limit), all_targets),
+        "regions": regions,
+    })
+    resp.headers["Server-Timing"] = server_timing(timings, monotonic() - started)
+    return resp
 
 # ----------------------------- Yearly Sales ---------------------------------
 @app.get("/api/yearly_sales")
+@cached("yearly_sales")
 def yearly_sales():
     f = parse_filters(request)
     value = "qty" if f["metric"] == "qty" else "amt"
@@ -948,20 +2482,13 @@ def yearly_sales():
     # 0 or missing = no top filter
     top_limit = int(request.args.get("top_limit", 0) or 0)
 
-    joins, wh, params = build_customer_filters("s", f, use_sold_to_name=False)
+    engine = columnar_engine("sales2124")
+    if engine is not None:
+        totals = engine.series("sales2124", f, value, top_limit=top_limit)
+        return series_response("year", range(2021, 2025), [totals.get(p, 0) for p in range(2021, 2025)])
 
-    # category
-    cat_joins, cat_where = category_filters("s", f["category"])
-    joins += cat_joins
-    wh    += cat_where
-
-    # direct fields (indexable)
-    if f["product_group"] != "ALL":
-        wh.append("s.product_group = %s")
-        params.append(f["product_group"])
-    if f["pattern"] != "ALL":
-        wh.append("s.pattern = %s")
-        params.append(f["pattern"])
+    # customer / category / product filters, on the rollup when it can serve them
+    table, joins, wh, params, measure, _ = fact_source("sales2124", f, value)
 
     base_where_sql = ("WHERE " + " AND ".join(wh)) if wh else ""
 
@@ -974,11 +2501,11 @@ def yearly_sales():
         if top_limit > 0:
             top_sql = f"""
               SELECT s.sold_to AS sold_to
-                FROM sales2124 s
+                FROM {table} s
                 {' '.join(joins)}
                 {base_where_sql}
                GROUP BY s.sold_to
-               ORDER BY SUM(s.{value}) DESC
+               ORDER BY SUM({measure}) DESC
                LIMIT %s
             """
             cur.execute(top_sql, tuple(params) + (top_limit,))
@@ -987,7 +2514,7 @@ def yearly_sales():
 
             if not top_sold_to:
                 # no data – return zeros for all years in range
-                return jsonify([{"year": y, "value": 0} for y in range(2021, 2025)])
+                return series_response("year", range(2021, 2025), [0] * 4)
 
         # 2) Yearly totals, optionally restricted to those sold_to
         wh2 = list(wh)
@@ -1001,8 +2528,8 @@ def yearly_sales():
         where_sql2 = ("WHERE " + " AND ".join(wh2)) if wh2 else ""
 
         yearly_sql = f"""
-          SELECT s.year AS year_num, SUM(s.{value}) AS yearly_total
-            FROM sales2124 s
+          SELECT s.year AS year_num, SUM({measure}) AS yearly_total
+            FROM {table} s
             {' '.join(joins)}
             {where_sql2}
            GROUP BY s.year
@@ -1016,10 +2543,11 @@ def yearly_sales():
         conn.close()
 
     year_map = {int(r["year_num"]): float(r["yearly_total"] or 0) for r in rows}
-    return jsonify([{"year": y, "value": year_map.get(y, 0)} for y in range(2021, 2025)])
+    return series_response("year", range(2021, 2025), [year_map.get(y, 0) for y in range(2021, 2025)])
 
 # -------------------- yearly breakdown (stacked by group) -------------------
 @app.get("/api/yearly_breakdown")
+@cached("yearly_breakdown")
 def yearly_breakdown():
 
     f = parse_filters(request)
@@ -1027,17 +2555,8 @@ def yearly_breakdown():
 
     # Which dimension to group by?
     group_by = (request.args.get("group_by") or "region").strip()
-    group_cols = {
-        "product_group": "s.product_group",
-        "region":        "cus.bde_state",
-        "salesman":      "cus.salesman_name",
-        "sold_to_group": "cus.sold_to_group",
-        "sold_to":       "cus.sold_to_name",
-        "pattern":       "s.pattern",
-    }
-    if group_by not in group_cols:
+    if group_by not in RAW_GROUP_COLS:
         return jsonify({"error": "invalid group_by"}), 400
-    group_col = group_cols[group_by]
 
     # Optional Top-N on sold_to (only if not already filtering a single sold_to)
     top_only = str(request.args.get("top_only", "0")).lower() in ("1", "true", "yes")
@@ -1047,17 +2566,14 @@ def yearly_breakdown():
         top_n = 10
     apply_top = top_only and group_by == "sold_to" and (f["sold_to"] in ("", "ALL"))
 
-    # ---- Build base JOINs / WHEREs (consistent helpers) ----
-    joins, wh, params = build_customer_filters("s", f, use_sold_to_name=False)
-    cat_joins, cat_where = category_filters("s", f["category"])
-    joins += cat_joins
-    wh    += cat_where
+    engine = columnar_engine("sales2124")
+    if engine is not None:
+        rows = engine.breakdown("sales2124", f, value, group_by, top_n=top_n if apply_top else 0)
+        return breakdown_response("year", ({"year": p, "group_label": g, "value": v} for p, g, v in rows))
 
-    # Direct, index-friendly filters that live on sales2025
-    if f["product_group"] != "ALL":
-        wh.append("s.product_group = %s"); params.append(f["product_group"])
-    if f["pattern"] != "ALL":
-        wh.append("s.pattern = %s");       params.append(f["pattern"])
+    # ---- Build base JOINs / WHEREs (rollup when the filters allow it) ----
+    table, joins, wh, params, measure, group_cols = fact_source("sales2124", f, value, group_by)
+    group_col = group_cols[group_by]
 
     where_sql = ("WHERE " + " AND ".join(wh)) if wh else ""
 
@@ -1069,8 +2585,8 @@ def yearly_breakdown():
         # Reuse the same joins/where for a ranking by total 2025 value
         top_cte = f"""
           WITH top_sold AS (
-            SELECT {group_col} AS sold_nm, SUM(s.{value}) AS tot
-              FROM sales2124 s
+            SELECT {group_col} AS sold_nm, SUM({measure}) AS tot
+              FROM {table} s
               {' '.join(joins)}
               {where_sql}
              GROUP BY {group_col}
@@ -1086,8 +2602,8 @@ def yearly_breakdown():
       {top_cte}
       SELECT s.year AS year,
              {group_col} AS group_label,
-             SUM(s.{value}) AS value
-        FROM sales2124 s
+             SUM({measure}) AS value
+        FROM {table} s
         {' '.join(joins)}
         {top_join}
         {where_sql}
@@ -1095,64 +2611,49 @@ def yearly_breakdown():
        ORDER BY s.year
     """
 
+    # the top_sold CTE repeats the filters before its LIMIT, ahead of the main query's
+    return stream_query(sql, (params + top_params if top_params else []) + params,
+                        lambda rows, close: breakdown_response("year", rows, close))
+
+# ---------------------- lookups used by the UI (optional) --------------------
+# Served from dimension_index(). Every list takes ?q=<prefix> (case-insensitive) and
+# ?limit=<n> for typeahead.
+def _lookup_args():
+    """(q, limit) of a lookup request; limit None means the whole list."""
+    q = (request.args.get("q") or "").strip()
+    limit = request.args.get("limit")
+    if limit is None or limit == "":
+        return q, None
     try:
-        conn = get_connection(); cur = conn.cursor(dictionary=True)
-        cur.execute(sql, tuple(top_params + params))
-        rows = cur.fetchall()
-    finally:
-        try: cur.close(); conn.close()
-        except: pass
+        return q, max(0, int(limit))
+    except ValueError:
+        raise ValueError("limit must be an integer")
 
-    return jsonify(rows)
+def _lookup(pick):
+    """jsonify(pick(index).search(q, limit)); 400 on bad args, 500 without an index."""
+    try:
+        q, limit = _lookup_args()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    index = dimension_index()
+    if index is None:
+        return jsonify({"error": "lookup lists unavailable"}), 500
+    return jsonify(pick(index).search(q, limit))
 
-# ---------------------- lookups used by the UI (optional) --------------------
 @app.get("/api/sold_to_groups")
 def sold_to_groups():
-    try:
-        conn = get_connection(); cur = conn.cursor()
-        cur.execute("""
-            SELECT DISTINCT TRIM(sold_to_group)
-            FROM customer
-            WHERE sold_to_group IS NOT NULL AND TRIM(sold_to_group) <> ''
-            ORDER BY TRIM(sold_to_group)
-        """)
-        groups = [r[0] for r in cur.fetchall()]
-        cur.close(); conn.close()
-        return jsonify(groups)
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+    return _lookup(lambda d: d.sold_to_groups)
 
 @app.get("/api/sold_to_names")
 def sold_to_names():
     parent = request.args.get("sold_to_group", "ALL")
     top_limit = int(request.args.get("top_limit", 0) or 0)
 
-    # If no top_limit -> old behaviour using customer table
+    # If no top_limit -> the customer-table list
     if top_limit <= 0:
-        try:
-            conn = get_connection(); cur = conn.cursor()
-            if parent != "ALL":
-                cur.execute("""
-                    SELECT DISTINCT TRIM(sold_to_name)
-                    FROM customer
-                    WHERE sold_to_group = %s
-                      AND sold_to_name IS NOT NULL
-                      AND TRIM(sold_to_name) <> ''
-                    ORDER BY TRIM(sold_to_name)
-                """, (parent,))
-            else:
-                cur.execute("""
-                    SELECT DISTINCT TRIM(sold_to_name)
-                    FROM customer
-                    WHERE sold_to_name IS NOT NULL
-                      AND TRIM(sold_to_name) <> ''
-                    ORDER BY TRIM(sold_to_name)
-                """)
-            names = [r[0] for r in cur.fetchall()]
-            cur.close(); conn.close()
-            return jsonify(names)
-        except Exception as e:
-            return jsonify({"error": str(e)}), 500
+        if parent != "ALL":
+            return _lookup(lambda d: d.names_in_group(parent))
+        return _lookup(lambda d: d.sold_to_names)
 
     # top_limit > 0 -> use sales2025 and filters to get top N sold-to by sales
     try:
@@ -1213,109 +2714,65 @@ def ship_to_names():
     # child (sold-to name that user picked)
     sold_to = (request.args.get("sold_to") or "ALL").strip()
 
-    try:
-        conn = get_connection(); cur = conn.cursor()
-
-        where = ["ship_to_name IS NOT NULL", "TRIM(ship_to_name) <> ''"]
-        params = []
-
-        # 1) if user picked a specific sold_to_name → use that
-        if sold_to.upper() != "ALL":
-            where.append("TRIM(sold_to_name) = %s")
-            params.append(sold_to)
-        # 2) otherwise, if user picked a group → use that
-        elif stg3.upper() != "ALL":
-            where.append("TRIM(sold_to_group) = %s")
-            params.append(stg3)
-
-        where_sql = "WHERE " + " AND ".join(where)
-
-        cur.execute(f"""
-            SELECT DISTINCT TRIM(ship_to_name)
-            FROM customer
-            {where_sql}
-            ORDER BY TRIM(ship_to_name)
-        """, tuple(params))
-
-        names = [r[0] for r in cur.fetchall()]
-        cur.close(); conn.close()
-        return jsonify(names)
-
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+    # 1) if user picked a specific sold_to_name → use that
+    if sold_to.upper() != "ALL":
+        return _lookup(lambda d: d.ship_tos_of_sold_to(sold_to))
+    # 2) otherwise, if user picked a group → use that
+    if stg3.upper() != "ALL":
+        return _lookup(lambda d: d.ship_tos_in_group(stg3))
+    return _lookup(lambda d: d.ship_to_names)
 
 @app.get("/api/product_group")
 def product_group():
-    try:
-        conn = get_connection(); cur = conn.cursor()
-        cur.execute("SELECT DISTINCT product_group FROM carrying_july")
-        groups = sorted(r[0] for r in cur.fetchall())
-        cur.close(); conn.close()
-        return jsonify(groups)
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+    return _lookup(lambda d: d.product_groups)
 
-    
 @app.get("/api/patterns")
 def patterns():
     product_group = request.args.get("product_group", "ALL")
-    try:
-        conn = get_connection(); cur = conn.cursor()
-        if product_group and product_group != "ALL":
-            cur.execute("""
-                SELECT DISTINCT TRIM(pattern)
-                FROM sales2025
-                WHERE product_group = %s
-                ORDER BY TRIM(pattern)
-            """, (product_group,))
-        else:
-            cur.execute("""
-                SELECT DISTINCT TRIM(pattern)
-                FROM sales2025
-                ORDER BY TRIM(pattern)
-            """)
-        names = [r[0] for r in cur.fetchall()]
-        cur.close(); conn.close()
-        return jsonify(names)
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
-
-
-    
+    if product_group and product_group != "ALL":
+        return _lookup(lambda d: d.patterns_in_group(product_group))
+    return _lookup(lambda d: d.patterns)
 
 @app.get("/api/profit_monthly")
+@cached("profit_monthly")
 def profit_monthly():
     f = parse_filters(request)
 
-    joins, wh, params = build_customer_filters("p", f, use_sold_to_name=False)
-    cat_joins, cat_where = category_filters("p", f["category"])
-    joins += cat_joins
-    wh    += cat_where
+    engine = columnar_engine("profit")
+    if engine is not None:
+        rows = engine.profit_monthly(f)
+    else:
+        joins, wh, params = build_customer_filters("p", f, use_sold_to_name=False)
+        cat_joins, cat_where = category_filters("p", f["category"])
+        joins += cat_joins
+        wh    += cat_where
 
-    # optional Product_Group / Pattern via EXISTS on carrying only if set
-    exists_sql, exists_params = build_product_filters("p", f)
+        # optional Product_Group / Pattern via EXISTS on carrying only if set
+        exists_sql, exists_params = build_product_filters("p", f)
 
-    where_sql = ("WHERE " + " AND ".join(wh)) if wh else ""
-    sql = f"""
-      SELECT CAST(p.Month AS UNSIGNED) AS month,
-             SUM(p.Gross)           AS gross,
-             SUM(p.Sales_Deduction) AS sd,
-             SUM(p.COGS)            AS cogs,
-             SUM(p.Op_Cost)         AS op_cost
-        FROM profit p
-        {' '.join(joins)}
-        {where_sql}
-        {exists_sql}
-       GROUP BY CAST(p.Month AS UNSIGNED)
-       ORDER BY CAST(p.Month AS UNSIGNED)
-    """
+        # exists_sql starts with AND, so it needs a WHERE to attach to (otherwise it
+        # silently lands in the customer LEFT JOIN's ON clause and filters nothing)
+        where_sql = "WHERE " + (" AND ".join(wh) if wh else "1=1")
+        sql = f"""
+          SELECT CAST(p.Month AS UNSIGNED) AS month,
+                 SUM(p.Gross)           AS gross,
+                 SUM(p.Sales_Deduction) AS sd,
+                 SUM(p.COGS)            AS cogs,
+                 SUM(p.Op_Cost)         AS op_cost
+            FROM profit p
+            {' '.join(joins)}
+            {where_sql}
+            {exists_sql}
+           GROUP BY CAST(p.Month AS UNSIGNED)
+           ORDER BY CAST(p.Month AS UNSIGNED)
+        """
 
-    conn = get_connection(); cur = conn.cursor(dictionary=True)
-    try:
-        cur.execute(sql, tuple(params + exists_params))
-        rows = cur.fetchall()
-    finally:
-        cur.close(); conn.close()
+        conn = get_connection(); cur = conn.cursor(dictionary=True)
+        try:
+            cur.execute(sql, tuple(params + exists_params))
+            rows = cur.fetchall()
+        finally:
+            cur.close(); conn.close()
 
     out = [dict(month=m, gross=0, sd=0, cogs=0, op_cost=0) for m in range(1,13)]
     for r in rows:
@@ -1328,12 +2785,59 @@ def profit_monthly():
         })
     return jsonify(out)
 
+def ship_to_totals(f):
+    """{ship_to: SUM(metric)} over sales2025 under the filters (cached per filter set and data version)."""
+    key = repr((sorted(f.items()), request_data_version(request)))
+    hit = cache_get("ship_to_totals", key, CACHE_TTLS["sales_map"])
+    if hit is not None:
+        return hit
+    value = "qty" if f["metric"] == "qty" else "amt"
+    table, joins, wh, params, measure, _ = fact_source("sales2025", f, value)
+    sql = f"""
+      SELECT s.ship_to AS ship_to, SUM({measure}) AS v
+        FROM {table} s
+        {' '.join(joins)}
+        {("WHERE " + " AND ".join(wh)) if wh else ""}
+       GROUP BY s.ship_to
+    """
+    conn = get_connection(); cur = conn.cursor(dictionary=True)
+    try:
+        cur.execute(sql, tuple(params))
+        totals = {r["ship_to"]: float(r["v"] or 0) for r in cur.fetchall()}
+    finally:
+        cur.close(); conn.close()
+    cache_set("ship_to_totals", key, totals)
+    return totals
+
 @app.get("/api/sales_map")
+@cached("sales_map")
 def sales_map():
     # 1) Same filter parsing as other APIs
     f = parse_filters(request)
     value = "Qty" if f["metric"] == "qty" else "amt"
 
+    # ?zoom=<z>[&bbox=west,south,east,north]: clusters for that viewport instead of
+    # one row per customer, so the payload stays bounded at every zoom level
+    if request.args.get("zoom") is not None:
+        try:
+            zoom = max(0, min(22, int(_float_arg("zoom"))))
+            bbox = parse_bbox(request.args.get("bbox"))
+            cell_px = max(10, min(256, int(request.args.get("cell_px", 60))))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        index = spatial_index()
+        totals = ship_to_totals(f)
+        points = index.in_bbox(bbox)
+        clusters = index.cluster(points, totals, zoom, cell_px)
+        matched = [i for i in range(len(index)) if index.ship_to[i] in totals]
+        return jsonify({
+            "zoom": zoom,
+            "bbox": bbox,
+            "bounds": index.bounds(matched),   # extent of every match, for the first fit
+            "points": sum(c["count"] for c in clusters),
+            "clusters": clusters,
+        })
+
     # 2) Customer / region / salesman / product filters
     joins, wh, params = build_customer_filters("s", f, use_sold_to_name=False)
 
@@ -1380,15 +2884,215 @@ def sales_map():
        ORDER BY total_value DESC
     """
 
-    conn = get_connection(); cur = conn.cursor(dictionary=True)
+    # 7) For the map we just stream the rows directly (no day_map)
+    return stream_query(sql, params)
+
+# ----------------------------- Radius / territory ----------------------------
+# Answered from spatial_index() + ship_to_totals(): the filters (same semantics as
+# every other endpoint) pick the ship_tos and their totals, the index does the
+# geometry, so no distance math runs in SQL.
+def _float_arg(name, default=None):
+    v = request.args.get(name)
+    if v is None or v == "":
+        if default is None:
+            raise ValueError(f"{name} is required")
+        return default
     try:
-        cur.execute(sql, tuple(params))
-        rows = cur.fetchall()
+        v = float(v)
+    except ValueError:
+        raise ValueError(f"{name} must be a number")
+    if not math.isfinite(v):      # inf/nan would overflow int() or poison the geometry
+        raise ValueError(f"{name} must be a finite number")
+    return v
+
+def _point_arg():
+    lat, lng = _float_arg("lat"), _float_arg("lng")
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        raise ValueError("lat/lng out of range")
+    return lat, lng
+
+def _geo_customer(index, i, totals, distance=None):
+    row = {
+        "ship_to":      index.ship_to[i],
+        "ship_to_name": index.name[i],
+        "latitude":     index.lat[i],
+        "longitude":    index.lng[i],
+        "region":       index.region[i],
+        "bde":          index.bde[i],
+        "total_value":  totals[index.ship_to[i]],
+    }
+    if distance is not None:
+        row["distance_km"] = round(distance, 3)
+    return row
+
+@app.get("/api/sales_nearby")
+def sales_nearby():
+    """?lat=&lng=&km=[&limit=]: customers with sales within km of the point, nearest first."""
+    f = parse_filters(request)
+    try:
+        lat, lng = _point_arg()
+        km = _float_arg("km")
+        limit = int(_float_arg("limit", 0))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if km <= 0:
+        return jsonify({"error": "km must be positive"}), 400
+
+    index = spatial_index()
+    totals = ship_to_totals(f)
+    hits = index.within(lat, lng, km, keep=totals)
+    return jsonify({
+        "center": [lat, lng],
+        "km": km,
+        "count": len(hits),
+        "total_value": sum(totals[index.ship_to[i]] for _, i in hits),
+        "customers": [_geo_customer(index, i, totals, d)
+                      for d, i in (hits[:limit] if limit > 0 else hits)],
+    })
+
+@app.get("/api/nearest_customers")
+def nearest_customers():
+    """?lat=&lng=[&k=10]: the k customers with sales under the filters nearest the point."""
+    f = parse_filters(request)
+    try:
+        lat, lng = _point_arg()
+        k = max(1, min(1000, int(_float_arg("k", 10))))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    index = spatial_index()
+    totals = ship_to_totals(f)
+    return jsonify([_geo_customer(index, i, totals, d)
+                    for d, i in index.nearest(lat, lng, k, keep=totals)])
+
+@app.post("/api/territory_totals")
+def territory_totals():
+    """
+    POST {"territories": [{"name": ..., "polygon": [[lat, lng], ...]}, ...]} with the
+    usual filters in the query string: count and total of the customers in each one.
+    """
+    f = parse_filters(request)
+    body = request.get_json(silent=True) or {}
+    territories = body.get("territories")
+    if not isinstance(territories, list) or not territories:
+        return jsonify({"error": "territories must be a non-empty list"}), 400
+    try:
+        polygons = []
+        for t in territories:
+            polygon = [(float(p[0]), float(p[1])) for p in t["polygon"]]
+            if len(polygon) < 3:
+                raise ValueError
+            polygons.append((str(t.get("name", len(polygons))), polygon))
+    except (KeyError, TypeError, ValueError, IndexError):
+        return jsonify({"error": "each territory needs a polygon of at least 3 [lat, lng] points"}), 400
+
+    index = spatial_index()
+    totals = ship_to_totals(f)
+    out = []
+    for name, polygon in polygons:
+        inside = [i for i in index.in_polygon(polygon) if index.ship_to[i] in totals]
+        out.append({
+            "name": name,
+            "count": len(inside),
+            "total_value": sum(totals[index.ship_to[i]] for i in inside),
+            "ship_tos": [index.ship_to[i] for i in inside],
+        })
+    return jsonify(out)
+
+# ----------------------------- Dashboard batch -------------------------------
+# One round trip for every chart panel under one filter set:
+#   /api/dashboard?<filters>&group_by=region&top_limit=0&panels=daily_sales,monthly_target
+# Each panel is the same view as its own endpoint (so it shares that endpoint's cache
+# entries), run over one connection with the fact/filter resolution memoised in `g`.
+# panel -> (view, endpoint-specific args it reads besides parse_filters())
+DASHBOARD_PANELS = {
+    "daily_sales":       (daily_sales,       ("top_limit",)),
+    "daily_target":      (daily_target,      ("month",)),
+    "daily_breakdown":   (daily_breakdown,   ("group_by", "top_only", "top_n")),
+    "monthly_sales":     (monthly_sales,     ("top_limit",)),
+    "monthly_target":    (monthly_target,    ()),
+    "monthly_breakdown": (monthly_breakdown, ("group_by", "top_only", "top_n")),
+    "yearly_sales":      (yearly_sales,      ("top_limit",)),
+    "yearly_breakdown":  (yearly_breakdown,  ("group_by", "top_only", "top_n")),
+    "profit_monthly":    (profit_monthly,    ()),
+}
+
+class BorrowedConnection:
+    """The batch's connection as seen by a panel; close() is a no-op until the batch ends."""
+    def __init__(self, conn):
+        self._conn = conn
+        self.discarded = False
+        if hasattr(conn, "discard"):      # only where the real connection has one (MySQL)
+            self.discard = self._discard
+
+    def close(self):
+        pass
+
+    def _discard(self):
+        # a panel abandoned a streamed result: the connection is gone for the whole batch
+        self.discarded = True
+        self._conn.discard()
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+def _run_panel(name, f):
+    view, extra = DASHBOARD_PANELS[name]
+    args = dict(f)
+    args.update((k, request.args[k]) for k in extra if k in request.args)
+    timings = current_timings()
+    with app.test_request_context(f"/api/{name}", query_string=args):
+        if timings is not None:
+            g.timings = timings      # panel queries count towards /api/dashboard
+        try:
+            resp = make_response(view())
+            if resp.status_code != 200:
+                return None, {"status": resp.status_code, "error": resp.get_json(silent=True)}
+            return resp.get_json(), None    # streamed panels run their queries here
+        except Exception as e:
+            return None, {"status": 500, "error": str(e)}
+
+@app.get("/api/dashboard")
+def dashboard():
+    f = parse_filters(request)
+    wanted = [p.strip() for p in (request.args.get("panels") or "").split(",") if p.strip()]
+    wanted = wanted or list(DASHBOARD_PANELS)
+    unknown = [p for p in wanted if p not in DASHBOARD_PANELS]
+    if unknown:
+        return jsonify({"error": "unknown panels", "panels": unknown}), 400
+
+    conn = get_connection()
+    if conn is None:
+        return jsonify({"error": "database unavailable"}), 503
+    g.shared_conn = BorrowedConnection(conn)
+    g.fact_sources = {}
+    panels, errors = {}, {}
+    try:
+        for name in dict.fromkeys(wanted):
+            if conn is None:
+                panels[name], errors[name] = None, {"status": 503, "error": "database unavailable"}
+                continue
+            panels[name], err = _run_panel(name, f)
+            if err:
+                errors[name] = err
+            if g.shared_conn.discarded:
+                # the failed panel's stream took the connection with it; the rest of
+                # the batch gets a fresh one
+                g.pop("shared_conn")
+                conn = get_connection()
+                if conn is not None:
+                    g.shared_conn = BorrowedConnection(conn)
     finally:
-        cur.close(); conn.close()
+        g.pop("shared_conn", None)
+        g.pop("fact_sources", None)
+        if conn is not None:
+            conn.close()
+
+    return jsonify({"filters": f, "panels": panels, "errors": errors})
 
-    # 7) For the map we just return the rows directly (no day_map)
-    return jsonify(rows)
+# load the columnar engine at worker start rather than on the first request
+if ANALYTICS_BACKEND == "columnar" and HAVE_NUMPY:
+    load_columnar_engine()
 
 # ------------------------------------------------------------------------------
 if __name__ == "__main__":
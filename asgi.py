@@ -0,0 +1,405 @@
+# asgi.py
+# ASGI entry point for the dashboard (cloudtype.yml: uvicorn asgi:app). gunicorn
+# keeps serving the same Flask app through app:app.
+#
+# The handlers and their drivers (mysql.connector, sqlite3) block, so a plain
+# WSGI-in-ASGI adapter parks one thread per in-flight request for its whole DB round
+# trip. Here requests wait on the event loop instead, and only the work that needs a
+# database runs on a small executor sized like the connection pool:
+#
+#   * result-cache hits are answered on the event loop, without a thread, from the
+#     entry and data version pinned when the hit was found (nothing on that path may
+#     wait on a database); only a big one the client takes compressed goes to the
+#     executor, to be encoded there;
+#   * identical GETs in flight at the same time share one execution (single flight):
+#     a burst of dashboards opening on the same filters costs one set of queries;
+#   * at most ASGI_WORKERS handlers run at once; everything else is a coroutine
+#     waiting its turn, so hundreds of concurrent requests cost no more threads or
+#     connections than ASGI_WORKERS.
+#
+# Response bodies, streamed ones included, are relayed to every waiting client as
+# they are produced, through a buffer of at most ASGI_FLIGHT_BUFFER chunks: the
+# handler's thread waits while the slowest client catches up, and stops once every
+# client has disconnected.
+import os
+import sys
+import json
+import asyncio
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.exceptions import HTTPException
+from werkzeug.wrappers import Request
+
+import app as dashboard
+
+flask_app = dashboard.app
+
+ASGI_WORKERS = int(os.getenv("ASGI_WORKERS", str(dashboard.POOL_SIZE + dashboard.POOL_MAX_OVERFLOW)))
+SINGLE_FLIGHT = os.getenv("ASGI_SINGLE_FLIGHT", "1") == "1"
+# request headers a response depends on; requests differing in these don't share one
+VARY_HEADERS = (b"accept-encoding", b"if-none-match", b"if-modified-since", b"origin")
+ASGI_FLIGHT_BUFFER = int(os.getenv("ASGI_FLIGHT_BUFFER", "16"))    # chunks held per flight
+# cache hits bigger than this that the client takes gzip/br-encoded are encoded on a
+# worker thread instead of the event loop
+ASGI_INLINE_COMPRESS_MAX = int(os.getenv("ASGI_INLINE_COMPRESS_MAX", "16384"))   # bytes
+
+_EXECUTOR = None
+_SLOTS = None          # asyncio.Semaphore(ASGI_WORKERS), made on the running loop
+_FLIGHTS = {}          # single-flight key -> Flight
+_RUNS = set()          # Flight.run tasks still going
+_STATS = {"requests": 0, "inline": 0, "executed": 0, "shared": 0, "abandoned": 0,
+          "waiting": 0, "running": 0}
+
+def _executor():
+    global _EXECUTOR
+    if _EXECUTOR is None:
+        _EXECUTOR = ThreadPoolExecutor(max_workers=ASGI_WORKERS, thread_name_prefix="asgi")
+    return _EXECUTOR
+
+def _slots():
+    global _SLOTS
+    if _SLOTS is None:
+        _SLOTS = asyncio.Semaphore(ASGI_WORKERS)
+    return _SLOTS
+
+def asgi_stats():
+    return dict(_STATS, workers=ASGI_WORKERS, flights=len(_FLIGHTS))
+
+async def _send_json(send, status, payload):
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", b"application/json")]})
+    await send({"type": "http.response.body", "body": json.dumps(payload).encode()})
+
+# ------------------------------- WSGI bridge ---------------------------------
+def wsgi_environ(scope, body):
+    """The WSGI environ for an ASGI http scope (PEP 3333 over the ASGI spec)."""
+    path, root = scope["path"], scope.get("root_path", "")
+    if root and path.startswith(root):
+        path = path[len(root):]
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": root.encode("utf-8").decode("latin-1"),
+        "PATH_INFO": path.encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": str(server[0]),
+        "SERVER_PORT": str(server[1]),
+        "REMOTE_ADDR": client[0],
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": _BodyStream(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope.get("headers", ()):
+        name = name.decode("latin-1")
+        if name == "content-type":
+            environ["CONTENT_TYPE"] = value.decode("latin-1")
+            continue
+        if name == "content-length":
+            continue
+        key = "HTTP_" + name.upper().replace("-", "_")
+        value = value.decode("latin-1")
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+class _BodyStream:
+    def __init__(self, body):
+        self._body = body
+        self._pos = 0
+
+    def read(self, size=-1):
+        end = len(self._body) if size is None or size < 0 else self._pos + size
+        chunk = self._body[self._pos:end]
+        self._pos += len(chunk)
+        return chunk
+
+    def readline(self, size=-1):
+        end = self._body.find(b"\n", self._pos) + 1 or len(self._body)
+        if size is not None and size >= 0:
+            end = min(end, self._pos + size)
+        chunk = self._body[self._pos:end]
+        self._pos = end
+        return chunk
+
+    def __iter__(self):
+        while True:
+            line = self.readline()
+            if not line:
+                return
+            yield line
+
+def _start(environ):
+    """Call the Flask app (blocking): (status, headers, body iterator, close)."""
+    response = {}
+
+    def start_response(status, headers, exc_info=None):
+        response["status"] = int(status.split(" ", 1)[0])
+        response["headers"] = [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers]
+        return lambda data: response.setdefault("written", []).append(data)
+
+    body = flask_app(environ, start_response)
+    chunks = iter(body)
+    try:
+        first = next(chunks, None)      # streamed views start their queries here
+    except Exception:
+        if hasattr(body, "close"):
+            body.close()
+        raise
+    written = response.pop("written", [])
+    if first is not None:
+        written.append(first)
+    return response["status"], response["headers"], written, chunks, getattr(body, "close", None)
+
+# ------------------------------ single flight --------------------------------
+class Flight:
+    """
+    One execution of a request, relayed to any number of clients. A chunk is
+    dropped once every client has been sent it, and the executor thread waits while
+    ASGI_FLIGHT_BUFFER chunks are held, so a streamed body is never in memory whole.
+    Clients can join until the buffer first fills and a chunk is dropped; once all
+    of them have disconnected the run stops at the next chunk.
+    """
+    def __init__(self, key=None):
+        self.key = key
+        self.status = None
+        self.headers = None
+        self.chunks = []
+        self.base = 0          # position of chunks[0] in the body
+        self.relays = {}       # client token -> chunks sent to it
+        self.space = threading.Semaphore(ASGI_FLIGHT_BUFFER)
+        self.cancelled = False
+        self.done = False
+        self.error = None
+        self.changed = asyncio.Event()
+
+    def joinable(self):
+        return self.base == 0 and not self.cancelled
+
+    def _publish(self):
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+    def _started(self, status, headers):
+        self.status, self.headers = status, headers
+        self._publish()
+
+    def _append(self, chunk):
+        self.chunks.append(chunk)
+        self._publish()
+
+    def _trim(self):
+        """Drop the chunks every client has been sent, making room for the thread."""
+        if not self.relays:
+            return
+        if self.base == 0 and len(self.chunks) < ASGI_FLIGHT_BUFFER and not self.done:
+            return      # a body that fits the buffer stays whole for clients still to join
+        n = min(self.relays.values()) - self.base
+        if n > 0:
+            del self.chunks[:n]
+            self.base += n
+            self.space.release(n)
+
+    def _leave(self, token):
+        if self.relays.pop(token, None) is None:
+            return
+        if self.relays or self.done:
+            self._trim()
+            return
+        # nobody left to send it to: stop the run and let the next request start afresh
+        self.cancelled = True
+        _STATS["abandoned"] += 1
+        if self.key is not None and _FLIGHTS.get(self.key) is self:
+            del _FLIGHTS[self.key]
+        self.space.release(ASGI_FLIGHT_BUFFER)     # wakes a thread waiting for room
+
+    def _pump(self, loop, environ):
+        """
+        Executor side: the whole request, from the view to close(), on one thread;
+        SQLite connections and cursors belong to the thread that opened them.
+        """
+        status, headers, first, chunks, close = _start(environ)
+        try:
+            loop.call_soon_threadsafe(self._started, status, headers)
+            for chunk in itertools.chain(first, chunks):
+                if not chunk:
+                    continue
+                self.space.acquire()
+                if self.cancelled:
+                    break
+                loop.call_soon_threadsafe(self._append, chunk)
+        finally:
+            if close is not None:
+                close()     # releases the connection / records metrics, like a WSGI server would
+
+    async def run(self, environ):
+        loop = asyncio.get_running_loop()
+        try:
+            _STATS["waiting"] += 1
+            try:
+                await _slots().acquire()
+            finally:
+                _STATS["waiting"] -= 1
+            _STATS["running"] += 1
+            try:
+                if not self.cancelled:      # every client left while it queued
+                    await loop.run_in_executor(_executor(), self._pump, loop, environ)
+            finally:
+                _STATS["running"] -= 1
+                _slots().release()
+        except Exception as e:
+            print(f"asgi: {environ['PATH_INFO']} failed: {e!r}", file=sys.stderr)
+            self.error = e
+        finally:
+            # leave _FLIGHTS in the same step as finishing: a request arriving after
+            # this starts its own run rather than replaying a finished one
+            if self.key is not None and _FLIGHTS.get(self.key) is self:
+                del _FLIGHTS[self.key]
+            self.done = True
+            self._publish()
+
+    async def _watch(self, receive, token):
+        """Notice the client going away while its response is still being produced."""
+        while (await receive())["type"] != "http.disconnect":
+            pass
+        self._leave(token)
+        self._publish()
+
+    async def relay(self, send, receive):
+        """Send this flight's response to one client as it is produced."""
+        token = object()
+        self.relays[token] = self.base
+        watch = asyncio.get_running_loop().create_task(self._watch(receive, token))
+        try:
+            while self.status is None and not self.done and token in self.relays:
+                await self.changed.wait()
+            if token not in self.relays:
+                return
+            if self.status is None:
+                await _send_json(send, 500, {"error": "internal error"})
+                return
+            await send({"type": "http.response.start", "status": self.status, "headers": self.headers})
+            while token in self.relays:
+                sent = self.relays[token]
+                if sent < self.base + len(self.chunks):
+                    await send({"type": "http.response.body", "body": self.chunks[sent - self.base],
+                                "more_body": True})
+                    if token in self.relays:
+                        self.relays[token] = sent + 1
+                        self._trim()
+                    continue
+                if self.done:
+                    await send({"type": "http.response.body", "body": b"", "more_body": False})
+                    return
+                await self.changed.wait()
+        finally:
+            watch.cancel()
+            self._leave(token)
+
+def _flight_key(scope):
+    if scope["method"] not in ("GET", "HEAD") or not SINGLE_FLIGHT:
+        return None
+    headers = dict(scope.get("headers", ()))
+    return (scope["method"], scope["path"], scope.get("query_string", b""),
+            tuple(headers.get(h, b"") for h in VARY_HEADERS))
+
+# --------------------------------- the app -----------------------------------
+async def _read_body(receive):
+    parts = []
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return None
+        parts.append(message.get("body", b""))
+        if not message.get("more_body"):
+            return b"".join(parts)
+
+def _cache_hit(environ):
+    """
+    Whether the request can be answered without a database: its data version is
+    known without a round trip and the result cache holds its body. Both are pinned
+    in `environ`, so the run serves exactly what was found here.
+    """
+    try:
+        endpoint, _ = flask_app.url_map.bind_to_environ(environ).match()
+    except HTTPException:
+        return False
+    view = flask_app.view_functions.get(endpoint)
+    if view is None:
+        return False
+    known, version = dashboard.peek_data_version()
+    if not known:         # MySQL version due a re-read: leave that to the executor
+        return False
+    environ[dashboard.PINNED_VERSION] = version
+    req = Request(environ)
+    hit = dashboard.cache_peek(view, req)
+    if hit is None:
+        return False
+    environ[dashboard.PINNED_CACHE] = hit
+    body, mimetype = hit[2]
+    # still no queries, but gzip/brotli of a big body would hold up the loop
+    return not (len(body) > ASGI_INLINE_COMPRESS_MAX
+                and dashboard.would_compress(req, mimetype, len(body)))
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            if _EXECUTOR is not None:
+                _EXECUTOR.shutdown(wait=True)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await _lifespan(receive, send)
+        return
+    if scope["type"] != "http":
+        raise RuntimeError(f"unsupported ASGI scope {scope['type']!r}")
+
+    if scope["path"] == "/api/_asgi":      # this module's counters, next to /api/_pool
+        await _send_json(send, 200, asgi_stats())
+        return
+
+    _STATS["requests"] += 1
+    body = await _read_body(receive)
+    if body is None:
+        return
+    environ = wsgi_environ(scope, body)
+
+    # a cached answer is only a dict lookup plus (small) encoding: no thread needed
+    if scope["method"] == "GET" and _cache_hit(environ):
+        _STATS["inline"] += 1
+        status, headers, first, chunks, close = _start(environ)
+        try:
+            await send({"type": "http.response.start", "status": status, "headers": headers})
+            for chunk in itertools.chain(first, chunks):
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        finally:
+            if close is not None:
+                close()
+        return
+
+    key = _flight_key(scope)
+    flight = _FLIGHTS.get(key) if key is not None else None
+    if flight is not None and flight.joinable():
+        _STATS["shared"] += 1
+    else:
+        _STATS["executed"] += 1
+        flight = Flight(key)
+        if key is not None:
+            _FLIGHTS[key] = flight
+        task = asyncio.get_running_loop().create_task(flight.run(environ))
+        _RUNS.add(task)            # the loop only keeps weak references to tasks
+        task.add_done_callback(_RUNS.discard)
+    await flight.relay(send, receive)
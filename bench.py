@@ -0,0 +1,301 @@
+# bench.py
+# Latency / throughput benchmark of the dashboard API.
+#
+#   python bench.py                               -> every /api route x filter mix, in-process
+#   python bench.py --db synthetic.db             -> ... against another SQLite file (synthdata.py)
+#   python bench.py --url http://127.0.0.1:5000   -> against a running server (gunicorn etc.)
+#   python bench.py --cold                        -> defeat the result cache: every request a miss
+#   python bench.py --repeat 10 --concurrency 8   -> passes over the request list / client threads
+#   python bench.py --routes daily_sales,sales_map
+#   python bench.py --save bench_baseline.json    -> store this run
+#   python bench.py --compare bench_baseline.json [--tolerance 0.2]
+#
+# Per route it reports p50/p95/p99/mean over all of its filter mixes, plus overall
+# requests/s. --compare prints each route's p50/p95 against the stored run and exits
+# 1 when one got slower than the tolerance allows (and by more than 1ms, so noise on
+# sub-millisecond cache hits doesn't count).
+#
+# In-process runs go through Flask's test client with USE_SQLITE=1, so no server or
+# MySQL is needed; --url measures the real stack, network and compression included.
+# The filter values match synthdata.py's naming (and the sample snapshot's), and the
+# request list is fixed, so runs stay comparable.
+import os
+import sys
+import json
+import platform
+import threading
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from time import perf_counter
+
+# filter mixes for the routes that go through parse_filters()
+FILTER_MIXES = [
+    "",
+    "metric=amt",
+    "region=NSW",
+    "salesman=NSW%20BDE%201",
+    "sold_to_group=Group%201",
+    "sold_to=SoldTo%201",
+    "ship_to=200001",
+    "product_group=PCR&pattern=PCR-P1",
+    "category=PCLT",
+    "category=TBR&metric=amt",
+    "category=18PLUS",
+    "category=ISEG",
+    "category=SUV",
+    "category=LOWPROFILE",
+    "category=HM",
+    "region=VIC&category=PCLT&metric=amt",
+]
+
+# route -> (takes the filter mixes, route-specific query strings)
+ROUTES = {
+    "ping":              (False, [""]),
+    "daily_kpi":         (True,  [""]),
+    "kpi_snapshot":      (True,  [""]),
+    "top_customers":     (True,  ["", "limit=50&format=ndjson"]),
+    "daily_sales":       (True,  ["", "top_limit=5"]),
+    "daily_breakdown":   (True,  ["", "group_by=salesman", "group_by=sold_to&top_only=1&top_n=3"]),
+    "daily_target":      (True,  [""]),
+    "monthly_sales":     (True,  ["", "top_limit=5"]),
+    "monthly_breakdown": (True,  ["", "group_by=region", "group_by=pattern&product_group=PCR"]),
+    "monthly_target":    (True,  [""]),
+    "kpi_by_region":     (True,  [""]),
+    "yearly_sales":      (True,  [""]),
+    "yearly_breakdown":  (True,  ["", "group_by=pattern", "group_by=sold_to&top_only=1&top_n=3"]),
+    "profit_monthly":    (True,  [""]),
+    "sales_map":         (True,  ["", "zoom=5", "zoom=10&bbox=150.5,-34.3,151.6,-33.4"]),
+    "dashboard":         (True,  [""]),
+    "sold_to_groups":    (False, [""]),
+    "sold_to_names":     (False, ["", "sold_to_group=Group%201", "top_limit=20", "q=soldto%201&limit=10"]),
+    "ship_to_names":     (False, ["", "sold_to=SoldTo%201", "sold_to_group=Group%201", "q=ship%2012&limit=10"]),
+    "product_group":     (False, [""]),
+    "patterns":          (False, ["", "product_group=PCR"]),
+    "sales_nearby":      (True,  ["lat=-33.87&lng=151.21&km=50", "lat=-37.81&lng=144.96&km=200&limit=20"]),
+    "nearest_customers": (True,  ["lat=-33.87&lng=151.21", "lat=-31.95&lng=115.86&k=100"]),
+    "territory_totals":  (True,  [""]),
+}
+
+# POST bodies
+TERRITORIES = {"territories": [
+    {"name": "Sydney basin", "polygon": [[-33.3, 150.5], [-33.3, 151.5], [-34.3, 151.5], [-34.3, 150.5]]},
+    {"name": "Melbourne", "polygon": [[-37.4, 144.4], [-37.4, 145.5], [-38.3, 145.5], [-38.3, 144.4]]},
+    {"name": "South-east QLD", "polygon": [[-26.5, 152.5], [-26.5, 153.6], [-28.3, 153.6], [-28.3, 152.5]]},
+]}
+POST_BODIES = {"territory_totals": TERRITORIES}
+
+SKIP_ROUTES = {"_pool", "_cache", "_metrics"}    # introspection, not workload
+SLOWER_BY_MS = 1.0                               # ignore regressions smaller than this
+
+def request_list(routes=None):
+    """[(route, path)] for every route x mix; filter mixes go after the route's own args."""
+    out = []
+    for route, (filtered, queries) in ROUTES.items():
+        if routes and route not in routes:
+            continue
+        for q in queries:
+            for mix in (FILTER_MIXES if filtered else [""]):
+                qs = "&".join(p for p in (q, mix) if p)
+                out.append((route, f"/api/{route}" + (f"?{qs}" if qs else "")))
+    return out
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, int(round(p / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[k]
+
+# --------------------------------- clients -----------------------------------
+class InProcessClient:
+    """Flask test client; one per thread (the app keeps SQLite connections per thread)."""
+    def __init__(self, dashboard):
+        self._client = dashboard.app.test_client()
+
+    def request(self, route, path):
+        body = POST_BODIES.get(route)
+        if body is not None:
+            r = self._client.post(path, json=body)
+        else:
+            r = self._client.get(path, headers={"Accept-Encoding": "gzip"})
+        r.get_data()
+        r.close()               # runs the response's close hooks, as a server would
+        return r.status_code
+
+class HTTPClient:
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip("/")
+
+    def request(self, route, path):
+        body = POST_BODIES.get(route)
+        req = urllib.request.Request(
+            self.base_url + path,
+            data=None if body is None else json.dumps(body).encode(),
+            headers={"Accept-Encoding": "gzip", "Content-Type": "application/json"},
+        )
+        try:
+            with urllib.request.urlopen(req, timeout=120) as resp:
+                resp.read()
+                return resp.status
+        except urllib.error.HTTPError as e:
+            e.read()
+            return e.code
+
+def make_client_factory(opts):
+    if opts["url"]:
+        return lambda: HTTPClient(opts["url"])
+    os.environ["USE_SQLITE"] = "1"
+    os.environ.setdefault("SLOW_QUERY_MS", "-1")    # timings are the point; don't log them too
+    if opts["db"]:
+        os.environ["SQLITE_PATH"] = os.path.abspath(opts["db"])
+    import app as dashboard
+    dashboard.app.logger.disabled = True            # failures show up in the err column
+    served = {rule.rule[len("/api/"):] for rule in dashboard.app.url_map.iter_rules()
+              if rule.rule.startswith("/api/")}
+    missing = sorted(served - set(ROUTES) - SKIP_ROUTES)
+    if missing:
+        print(f"warning: not benchmarked (add them to ROUTES): {', '.join(missing)}")
+    return lambda: InProcessClient(dashboard)
+
+# ---------------------------------- run --------------------------------------
+def run(opts):
+    factory = make_client_factory(opts)
+    requests = request_list(opts["routes"])
+    local = threading.local()
+    counter = iter(range(10 ** 12))     # next() on a range iterator is atomic under the GIL
+
+    def one(item):
+        route, path = item
+        client = getattr(local, "client", None)
+        if client is None:
+            client = local.client = factory()
+        if opts["cold"]:
+            # an extra argument is part of the result-cache key, so this always misses
+            path += ("&" if "?" in path else "?") + f"_bench={next(counter)}"
+        started = perf_counter()
+        try:
+            status = client.request(route, path)
+        except Exception as e:     # count it and keep going
+            print(f"  {path}: {e}")
+            status = 0
+        return route, perf_counter() - started, status
+
+    # warm-up: loads the customer/spatial indexes and fills the caches once
+    print(f"{len(requests)} requests per pass, {opts['repeat']} pass(es), concurrency {opts['concurrency']}"
+          f"{', cache bypassed' if opts['cold'] else ''}.")
+    with ThreadPoolExecutor(opts["concurrency"]) as ex:
+        list(ex.map(one, requests))
+        started = perf_counter()
+        results = list(ex.map(one, requests * opts["repeat"]))
+        wall = perf_counter() - started
+
+    by_route = {}
+    for route, seconds, status in results:
+        st = by_route.setdefault(route, {"times": [], "errors": 0})
+        st["times"].append(seconds)
+        st["errors"] += not (200 <= status < 400)
+
+    routes = {}
+    for route, st in by_route.items():
+        times = sorted(st["times"])
+        routes[route] = {
+            "n":       len(times),
+            "errors":  st["errors"],
+            "p50_ms":  percentile(times, 50) * 1000,
+            "p95_ms":  percentile(times, 95) * 1000,
+            "p99_ms":  percentile(times, 99) * 1000,
+            "mean_ms": sum(times) / len(times) * 1000,
+        }
+    all_times = sorted(seconds for _, seconds, _ in results)
+    return {
+        "meta": {
+            "at": datetime.now().isoformat(timespec="seconds"),
+            "target": opts["url"] or (opts["db"] or "snapshot.db"),
+            "cold": opts["cold"],
+            "repeat": opts["repeat"],
+            "concurrency": opts["concurrency"],
+            "python": platform.python_version(),
+        },
+        "total": {
+            "requests": len(results),
+            "errors": sum(r["errors"] for r in routes.values()),
+            "seconds": wall,
+            "rps": len(results) / wall if wall else 0.0,
+            "p50_ms": percentile(all_times, 50) * 1000,
+            "p95_ms": percentile(all_times, 95) * 1000,
+            "p99_ms": percentile(all_times, 99) * 1000,
+        },
+        "routes": routes,
+    }
+
+def report(result):
+    print(f"{'route':20s} {'n':>6s} {'err':>4s} {'p50 ms':>9s} {'p95 ms':>9s} {'p99 ms':>9s} {'mean ms':>9s}")
+    for route, r in sorted(result["routes"].items(), key=lambda kv: -kv[1]["p95_ms"]):
+        print(f"{route:20s} {r['n']:6d} {r['errors']:4d} {r['p50_ms']:9.2f} {r['p95_ms']:9.2f} "
+              f"{r['p99_ms']:9.2f} {r['mean_ms']:9.2f}")
+    t = result["total"]
+    print(f"{t['requests']} requests in {t['seconds']:.2f}s: {t['rps']:.1f} req/s, "
+          f"p50 {t['p50_ms']:.2f}ms, p95 {t['p95_ms']:.2f}ms, p99 {t['p99_ms']:.2f}ms, "
+          f"{t['errors']} error(s).")
+
+def compare(result, baseline, tolerance):
+    """Print each route against the baseline; returns the number of regressions."""
+    print(f"\nvs baseline from {baseline['meta']['at']} ({baseline['meta']['target']}):")
+    regressions = 0
+    for route, r in sorted(result["routes"].items()):
+        b = baseline["routes"].get(route)
+        if b is None:
+            print(f"  {route:20s} new")
+            continue
+        flags = []
+        for key in ("p50_ms", "p95_ms"):
+            if r[key] > b[key] * (1 + tolerance) and r[key] - b[key] > SLOWER_BY_MS:
+                flags.append(key[:3])
+        regressions += bool(flags)
+        change = (r["p95_ms"] / b["p95_ms"] - 1) * 100 if b["p95_ms"] else 0.0
+        print(f"  {route:20s} p50 {b['p50_ms']:8.2f} -> {r['p50_ms']:8.2f}   "
+              f"p95 {b['p95_ms']:8.2f} -> {r['p95_ms']:8.2f} ({change:+.0f}%)"
+              f"{'   SLOWER (' + ', '.join(flags) + ')' if flags else ''}")
+    bt, t = baseline["total"], result["total"]
+    if bt["rps"]:
+        print(f"  throughput {bt['rps']:.1f} -> {t['rps']:.1f} req/s ({(t['rps'] / bt['rps'] - 1) * 100:+.0f}%)")
+    print(f"{regressions} route(s) slower than the baseline allows (tolerance {tolerance:.0%}).")
+    return regressions
+
+def parse_args(argv):
+    opts = {"url": None, "db": None, "cold": False, "repeat": 5, "concurrency": 1,
+            "routes": None, "save": None, "compare": None, "tolerance": 0.2}
+    it = iter(argv)
+    for arg in it:
+        if arg in ("--url", "--db", "--save", "--compare"):
+            opts[arg[2:]] = next(it)
+        elif arg in ("--repeat", "--concurrency"):
+            opts[arg[2:]] = int(next(it))
+        elif arg == "--tolerance":
+            opts["tolerance"] = float(next(it))
+        elif arg == "--routes":
+            opts["routes"] = {r.strip() for r in next(it).split(",") if r.strip()}
+        elif arg == "--cold":
+            opts["cold"] = True
+        else:
+            raise SystemExit(f"unknown argument: {arg}")
+    return opts
+
+def main(argv=None):
+    opts = parse_args(sys.argv[1:] if argv is None else argv)
+    result = run(opts)
+    report(result)
+    if opts["save"]:
+        with open(opts["save"], "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"Saved to {opts['save']}.")
+    if opts["compare"]:
+        with open(opts["compare"]) as f:
+            baseline = json.load(f)
+        return 1 if compare(result, baseline, opts["tolerance"]) else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
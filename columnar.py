@@ -0,0 +1,386 @@
+# columnar.py
+# Optional in-process analytics engine (ANALYTICS_BACKEND=columnar in app.py).
+#
+# The fact tables are loaded once into NumPy column arrays at the rollup grain
+# (see rollups.select_sql), low-cardinality text columns are dictionary-encoded,
+# and the dashboard filters are evaluated as boolean masks with np.bincount
+# group-bys. Needs numpy (pip install numpy); without it app.py stays on SQL.
+#
+#   python columnar.py [--db synthetic.db]   -> parity check of every supported endpoint,
+#                                              SQL vs columnar, on snapshot.db (or --db)
+#
+# tests/test_columnar_parity.py runs the same check under pytest on a synthdata.py file.
+import os
+import sys
+from time import time
+
+try:
+    import numpy as np
+except ImportError:   # optional dependency
+    np = None
+
+from rollups import ROLLUPS, category_joins, rollup_name, select_sql
+
+HAVE_NUMPY = np is not None
+FETCH_ROWS = 50000
+
+# dashboard group_by -> engine column
+GROUP_COLS = {
+    "product_group": "product_group",
+    "region":        "cus_bde_state",
+    "salesman":      "cus_salesman_name",
+    "sold_to_group": "cus_sold_to_group",
+    "sold_to":       "cus_sold_to_name",
+    "pattern":       "pattern",
+}
+
+_CUSTOMER_DIMS = """
+       cus.bde_state                  AS cus_bde_state,
+       cus.salesman_name              AS cus_salesman_name,
+       UPPER(TRIM(cus.salesman_name)) AS cus_salesman_key,
+       cus.sold_to_group              AS cus_sold_to_group,
+       cus.sold_to_name               AS cus_sold_to_name"""
+_CUSTOMER_GROUP = ("cus.bde_state, cus.salesman_name, UPPER(TRIM(cus.salesman_name)), "
+                   "cus.sold_to_group, cus.sold_to_name")
+
+TARGET_SQL = f"""
+SELECT t.month AS month, t.ship_to AS ship_to, t.line AS line, t.special AS special,
+       {_CUSTOMER_DIMS},
+       SUM(t.qty) AS qty, SUM(t.amt) AS amt
+  FROM target2025 t
+  LEFT JOIN customer cus ON cus.ship_to = t.ship_to
+ GROUP BY t.month, t.ship_to, t.line, t.special, {_CUSTOMER_GROUP}
+"""
+
+PROFIT_SQL = f"""
+SELECT CAST(p.Month AS UNSIGNED) AS month, p.ship_to AS ship_to, p.Material AS material,
+       p.line AS line,
+       CASE WHEN CAST(p.inch AS DECIMAL(10,2)) >= 18.0 THEN 1 ELSE 0 END AS inch18,
+       COALESCE(i.n, 0) AS iseg_n, COALESCE(sv.n, 0) AS suv_n,
+       COALESCE(lp.n, 0) AS lowprofile_n, COALESCE(hm.n, 0) AS hm_n,
+       {_CUSTOMER_DIMS},
+       SUM(p.Gross) AS gross, SUM(p.Sales_Deduction) AS sd,
+       SUM(p.COGS) AS cogs, SUM(p.Op_Cost) AS op_cost
+  FROM profit p
+  {category_joins("p")}
+ GROUP BY CAST(p.Month AS UNSIGNED), p.ship_to, p.Material, p.line,
+          CASE WHEN CAST(p.inch AS DECIMAL(10,2)) >= 18.0 THEN 1 ELSE 0 END,
+          COALESCE(i.n, 0), COALESCE(sv.n, 0), COALESCE(lp.n, 0), COALESCE(hm.n, 0),
+          {_CUSTOMER_GROUP}
+"""
+
+CARRYING_SQL = "SELECT M_CODE, Product_Group, Pattern FROM carrying_july"
+
+# category_target_filters(): category -> (line or None, special)
+_TARGET_CATEGORIES = {
+    "ALL":        (None,   ""),
+    "PCLT":       ("PCLT", ""),
+    "TBR":        ("TBR",  ""),
+    "18PLUS":     (None,   "HighInch"),
+    "ISEG":       (None,   "iSeg"),
+    "SUV":        (None,   "SUV"),
+    "LOWPROFILE": (None,   "Low Profile / Strategic TBR"),
+    "HM":         (None,   "HM"),
+}
+
+def _key(v):
+    """Join key normalisation for Material / M_CODE (ints may arrive as floats or text)."""
+    if isinstance(v, float) and v.is_integer():
+        return str(int(v))
+    return str(v).strip() if v is not None else None
+
+# id columns compared as normalised text, whatever type the database hands back
+KEY_COLUMNS = {"ship_to", "sold_to", "material"}
+
+class ColumnTable:
+    """Numeric columns as float64 arrays, text columns as (int32 codes, label->code)."""
+    def __init__(self, names, columns, numeric):
+        self.n = len(columns[0]) if columns else 0
+        self.num = {}
+        self.cat = {}
+        for name, values in zip(names, columns):
+            if name in numeric:
+                self.num[name] = np.array([0.0 if v is None else float(v) for v in values], dtype=np.float64)
+            else:
+                if name in KEY_COLUMNS:
+                    values = [_key(v) for v in values]
+                index = {}
+                codes = np.fromiter((index.setdefault(v, len(index)) for v in values),
+                                    dtype=np.int32, count=len(values))
+                self.cat[name] = (codes, index, list(index))
+
+    def eq(self, col, value):
+        codes, index, _ = self.cat[col]
+        code = index.get(_key(value) if col in KEY_COLUMNS else value)
+        if code is None:
+            return np.zeros(self.n, dtype=bool)
+        return codes == code
+
+    def labels(self, col):
+        return self.cat[col][2]
+
+    def codes(self, col):
+        return self.cat[col][0]
+
+    def int_column(self, col):
+        """Dictionary-encoded period column -> int array (periods are few, decode via labels)."""
+        codes, _, labels = self.cat[col]
+        lut = np.array([int(float(l)) if l is not None else 0 for l in labels], dtype=np.int64)
+        return lut[codes]
+
+def _rows(cur):
+    """Positional rows in FETCH_ROWS batches (raw driver rows, not the dict wrapper)."""
+    while True:
+        rows = cur.fetchmany(FETCH_ROWS)
+        if not rows:
+            return
+        for row in rows:
+            yield tuple(row)
+
+def _load(conn, sql, numeric):
+    cur = conn.cursor()
+    try:
+        cur.execute(sql)
+        names = [d[0].lower() for d in cur.description]
+        columns = [[] for _ in names]
+        for row in _rows(cur):
+            for i, v in enumerate(row):
+                columns[i].append(v)
+    finally:
+        cur.close()
+    return ColumnTable(names, columns, numeric)
+
+class ColumnarEngine:
+    FACT_NUMERIC = {"qty", "amt", "n_rows", "inch18", "iseg_n", "suv_n", "lowprofile_n", "hm_n"}
+
+    def __init__(self):
+        self.tables = {}
+        self.periods = {}
+        self.errors = {}
+        self.carrying = None
+        self.loaded_at = None
+
+    @classmethod
+    def load(cls, connect):
+        """Load every table the engine serves; a table that fails to load stays on SQL."""
+        eng = cls()
+        started = time()
+        jobs = [(fact, select_sql(fact, period), cls.FACT_NUMERIC) for fact, period in ROLLUPS.items()]
+        jobs.append(("target2025", TARGET_SQL, {"qty", "amt"}))
+        jobs.append(("profit", PROFIT_SQL,
+                     {"gross", "sd", "cogs", "op_cost", "inch18", "iseg_n", "suv_n", "lowprofile_n", "hm_n"}))
+        for name, sql, numeric in jobs:
+            conn = connect()
+            try:
+                if name in ROLLUPS:
+                    # the materialised rollup holds exactly these rows, when it exists
+                    try:
+                        table = _load(conn, f"SELECT * FROM {rollup_name(name)}", numeric)
+                    except Exception:
+                        table = _load(conn, sql, numeric)
+                    eng.periods[name] = table.int_column(ROLLUPS[name])
+                else:
+                    table = _load(conn, sql, numeric)
+                    eng.periods[name] = table.int_column("month")
+                eng.tables[name] = table
+            except Exception as e:
+                eng.errors[name] = str(e)
+            finally:
+                conn.close()
+
+        if "profit" in eng.tables:
+            conn = connect()
+            try:
+                cur = conn.cursor()
+                cur.execute(CARRYING_SQL)
+                rows = list(_rows(cur))
+                cur.close()
+                by_pg, by_pt = {}, {}
+                for m_code, pg, pt in rows:
+                    by_pg.setdefault(pg, set()).add(_key(m_code))
+                    by_pt.setdefault(pt, set()).add(_key(m_code))
+                eng.carrying = (by_pg, by_pt)
+            except Exception as e:
+                eng.errors["carrying_july"] = str(e)
+                eng.tables.pop("profit", None)
+            finally:
+                conn.close()
+
+        eng.loaded_at = time()
+        print(f"columnar engine: loaded {sorted(eng.tables)} in {eng.loaded_at - started:.1f}s",
+              f"(failed: {eng.errors})" if eng.errors else "")
+        return eng
+
+    def has(self, name):
+        return name in self.tables
+
+    # ------------------------------------------------------------- filters
+    def _customer_mask(self, t, f):
+        m = np.ones(t.n, dtype=bool)
+        if f["region"] != "ALL":
+            m &= t.eq("cus_bde_state", f["region"])
+        if f["salesman"] != "ALL":
+            m &= t.eq("cus_salesman_key", f["salesman"].strip(" ").upper())
+        if f["sold_to_group"] != "ALL":
+            m &= t.eq("cus_sold_to_group", f["sold_to_group"])
+        if f["sold_to"] != "ALL":
+            sv = f["sold_to"]
+            if sv.isdigit() or sv.upper().startswith("A"):
+                m &= t.eq("ship_to", sv)
+            else:
+                m &= t.eq("cus_sold_to_name", sv)
+        if f["ship_to"] != "ALL":
+            m &= t.eq("ship_to", f["ship_to"])
+        return m
+
+    def _category(self, t, category, m):
+        """category_filters() semantics; returns (mask, weights or None)."""
+        cat = (category or "ALL").upper()
+        if cat == "PCLT":
+            m &= t.eq("line", "PCLT")
+        elif cat == "TBR":
+            m &= t.eq("line", "TBR")
+        elif cat == "18PLUS":
+            m &= t.eq("line", "PCLT") & (t.num["inch18"] == 1)
+        elif cat in ("ISEG", "SUV", "LOWPROFILE", "HM"):
+            weight = t.num[f"{cat.lower()}_n"]
+            return m & (weight > 0), weight
+        return m, None
+
+    def _fact_mask(self, fact, f, value):
+        t = self.tables[fact]
+        m = self._customer_mask(t, f)
+        m, weight = self._category(t, f["category"], m)
+        if f["product_group"] != "ALL":
+            m &= t.eq("product_group", f["product_group"])
+        if f["pattern"] != "ALL":
+            m &= t.eq("pattern", f["pattern"])
+        values = t.num[value] if weight is None else t.num[value] * weight
+        return t, m, values
+
+    # ------------------------------------------------------------- group-bys
+    @staticmethod
+    def _by_period(periods, mask, values):
+        """{period: SUM(values)} over rows in mask (periods with no rows are absent)."""
+        p = periods[mask]
+        if p.size == 0:
+            return {}
+        keys, inv = np.unique(p, return_inverse=True)
+        sums = np.bincount(inv, weights=values[mask], minlength=len(keys))
+        return {int(k): float(v) for k, v in zip(keys, sums)}
+
+    @staticmethod
+    def _top_codes(codes, mask, values, n):
+        sums = np.bincount(codes[mask], weights=values[mask], minlength=int(codes.max(initial=0)) + 1)
+        present = np.bincount(codes[mask], minlength=len(sums)) > 0
+        order = [c for c in np.argsort(-sums, kind="stable") if present[c]]
+        return np.array(order[:n], dtype=np.int32)
+
+    def series(self, fact, f, value, top_limit=0):
+        """daily/monthly/yearly_sales: {period: total}, optionally over the top-N sold_to."""
+        t, m, values = self._fact_mask(fact, f, value)
+        if top_limit > 0:
+            codes = t.codes("sold_to")
+            top = self._top_codes(codes, m, values, top_limit)
+            if top.size == 0:
+                return {}
+            m &= np.isin(codes, top)
+        return self._by_period(self.periods[fact], m, values)
+
+    def breakdown(self, fact, f, value, group_by, top_n=0):
+        """*_breakdown: [(period, group_label, total)] ordered by period."""
+        t, m, values = self._fact_mask(fact, f, value)
+        codes = t.codes(GROUP_COLS[group_by])
+        labels = t.labels(GROUP_COLS[group_by])
+        if top_n > 0:
+            m &= np.isin(codes, self._top_codes(codes, m, values, top_n))
+
+        p = self.periods[fact][m]
+        if p.size == 0:
+            return []
+        keys, inv = np.unique(p, return_inverse=True)
+        nlab = len(labels)
+        combined = inv.astype(np.int64) * nlab + codes[m]
+        size = len(keys) * nlab
+        sums = np.bincount(combined, weights=values[m], minlength=size)
+        present = np.nonzero(np.bincount(combined, minlength=size))[0]
+        return [(int(keys[k // nlab]), labels[k % nlab], float(sums[k])) for k in present]
+
+    def target_series(self, f, value):
+        """daily/monthly_target: {month: total} under category_target_filters()."""
+        t = self.tables["target2025"]
+        m = self._customer_mask(t, f)
+        line, special = _TARGET_CATEGORIES.get((f["category"] or "ALL").upper(), (None, None))
+        if line:
+            m &= t.eq("line", line)
+        if special is not None:
+            m &= t.eq("special", special)
+        return self._by_period(self.periods["target2025"], m, t.num[value])
+
+    def profit_monthly(self, f):
+        """profit_monthly rows: [{month, gross, sd, cogs, op_cost}] for months present."""
+        t = self.tables["profit"]
+        m = self._customer_mask(t, f)
+        m, weight = self._category(t, f["category"], m)
+        by_pg, by_pt = self.carrying
+        materials = t.labels("material")
+        for key, lookup in (("product_group", by_pg), ("pattern", by_pt)):
+            if f[key] != "ALL":
+                allowed = lookup.get(f[key], set())
+                ok = np.array([v in allowed for v in materials], dtype=bool)
+                m &= ok[t.codes("material")]
+        periods = self.periods["profit"]
+        out = {}
+        for col in ("gross", "sd", "cogs", "op_cost"):
+            values = t.num[col] if weight is None else t.num[col] * weight
+            for month, v in self._by_period(periods, m, values).items():
+                out.setdefault(month, {"month": month})[col] = v
+        return [out[k] for k in sorted(out)]
+
+# ------------------------------------------------------------- parity check
+PARITY_URLS = [
+    f"/api/{ep}?{qs}"
+    for ep in ("daily_sales", "monthly_sales", "yearly_sales", "daily_target", "monthly_target",
+               "profit_monthly", "daily_breakdown", "monthly_breakdown", "yearly_breakdown")
+    for qs in ("", "metric=amt", "region=NSW", "salesman=ALL&category=PCLT", "category=18PLUS",
+               "category=ISEG", "category=SUV&metric=amt", "category=LOWPROFILE", "category=HM",
+               "category=TBR", "top_limit=5", "group_by=salesman", "group_by=sold_to&top_only=1&top_n=3",
+               "group_by=pattern&product_group=PCR")
+]
+
+def _normalise(payload):
+    def norm(v):
+        return round(float(v), 4) if isinstance(v, (int, float)) and not isinstance(v, bool) else v
+    if isinstance(payload, list):
+        return sorted(repr(sorted((k, norm(v)) for k, v in d.items())) if isinstance(d, dict) else repr(d)
+                      for d in payload)
+    return payload
+
+def check_parity(urls=PARITY_URLS, extra_queries=()):
+    """Run each URL on the SQL backend and on the engine; print and count mismatches."""
+    import app as dashboard
+    client = dashboard.app.test_client()
+    mismatches = 0
+    for url in list(urls) + list(extra_queries):
+        results = []
+        for backend in ("sql", "columnar"):
+            dashboard.ANALYTICS_BACKEND = backend
+            dashboard._KPI_CACHE.clear()
+            r = client.get(url)
+            results.append((r.status_code, _normalise(r.get_json())))
+        if results[0] != results[1]:
+            mismatches += 1
+            print(f"MISMATCH {url}\n  sql:      {str(results[0])[:300]}\n  columnar: {str(results[1])[:300]}")
+    print(f"{len(urls)} requests compared, {mismatches} mismatch(es).")
+    return mismatches
+
+if __name__ == "__main__":
+    if not HAVE_NUMPY:
+        sys.exit("numpy is not installed")
+    os.environ["USE_SQLITE"] = "1"      # a snapshot file, never the live MySQL
+    args = sys.argv[1:]
+    if args[:1] == ["--db"] and len(args) == 2:
+        os.environ["SQLITE_PATH"] = os.path.abspath(args[1])
+    elif args:
+        sys.exit("usage: python columnar.py [--db PATH]")
+    sys.exit(1 if check_parity() else 0)
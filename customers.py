@@ -0,0 +1,172 @@
+# customers.py
+# In-memory customer dimension (CUSTOMER_RESOLVER=1 in app.py, the default).
+#
+# The customer table is small (~1k ship-tos), so it is loaded once with the filter
+# keys pre-normalised, and region/salesman/sold_to_group/sold_to-name filters are
+# resolved here into the set of matching ship_to ids. Fact queries then filter on
+# their own indexed ship_to column instead of joining customer for every request.
+#
+#   python customers.py   -> parity + timing of the joined vs resolved queries
+import re
+import sys
+from time import perf_counter
+
+from dimensions import collation_key
+
+CUSTOMER_SQL = """
+SELECT ship_to, sold_to, sold_to_name, sold_to_group, bde_state, salesman_name
+  FROM customer
+"""
+
+_ID_CHARS = re.compile(r"[^A-Z0-9]")
+
+def norm_id(v) -> str:
+    """Same key as REGEXP_REPLACE(UPPER(TRIM(v)), '[^A-Z0-9]', '')."""
+    return _ID_CHARS.sub("", str(v).strip(" ").upper())
+
+def _salesman_key(v) -> str:
+    """Same key as UPPER(TRIM(v))."""
+    return str(v).strip(" ").upper()
+
+class CustomerIndex:
+    """
+    ship_to sets per filter value. `fold` makes the lookups case- and
+    accent-insensitive like MySQL's default collations, with the same
+    collation_key() the dropdown lists use (SQLite compares exactly).
+    """
+    def __init__(self, rows, fold=False):
+        self.fold = fold
+        self.ship_tos = set()
+        self.by_region = {}
+        self.by_salesman = {}
+        self.by_group = {}
+        self.by_sold_to_name = {}
+        self.sold_to_ids = {}     # norm_id(sold_to) -> raw sold_to values
+        seen = 0
+        for r in rows:
+            ship_to = r["ship_to"]
+            seen += 1
+            if ship_to is None:
+                continue
+            self.ship_tos.add(ship_to)
+            self._add(self.by_region, self._eq(r["bde_state"]), ship_to)
+            self._add(self.by_group, self._eq(r["sold_to_group"]), ship_to)
+            self._add(self.by_sold_to_name, self._eq(r["sold_to_name"]), ship_to)
+            if r["salesman_name"] is not None:
+                self._add(self.by_salesman, self._salesman(r["salesman_name"]), ship_to)
+            if r["sold_to"] is not None:
+                self.sold_to_ids.setdefault(norm_id(r["sold_to"]), set()).add(r["sold_to"])
+        # a ship_to listed twice multiplies fact rows through the customer join;
+        # only an index of unique ship_tos can stand in for that join
+        self.unique = seen == len(self.ship_tos)
+
+    @staticmethod
+    def _add(index, key, ship_to):
+        if key is not None:
+            index.setdefault(key, set()).add(ship_to)
+
+    def _eq(self, v):
+        if v is None:
+            return None
+        return collation_key(v) if self.fold else v
+
+    def _salesman(self, v):
+        key = _salesman_key(v)
+        return collation_key(key) if self.fold else key
+
+    @classmethod
+    def load(cls, conn, fold=False):
+        cur = conn.cursor(dictionary=True)
+        try:
+            cur.execute(CUSTOMER_SQL)
+            rows = cur.fetchall()
+        finally:
+            cur.close()
+        return cls(rows, fold=fold)
+
+    def resolve(self, f, *, use_sold_to_name=False):
+        """
+        Ship_to set matching the customer-side filters in `f` (parse_filters() dict),
+        or None when none of them is set. A sold_to that looks like an id is a
+        fact-side filter in build_customer_filters and is not resolved here.
+        """
+        sets = []
+        if f["region"] != "ALL":
+            sets.append(self.by_region.get(self._eq(f["region"]), set()))
+        if f["salesman"] != "ALL":
+            sets.append(self.by_salesman.get(self._salesman(f["salesman"]), set()))
+        if f["sold_to_group"] != "ALL":
+            sets.append(self.by_group.get(self._eq(f["sold_to_group"]), set()))
+        sv = f["sold_to"]
+        if sv != "ALL" and (use_sold_to_name or not (sv.isdigit() or sv.upper().startswith("A"))):
+            sets.append(self.by_sold_to_name.get(self._eq(sv), set()))
+        if not sets:
+            return None
+        return set.intersection(*sorted(sets, key=len))
+
+    def sold_to_variants(self, value):
+        """Raw customer.sold_to values that normalise to the same id as `value`."""
+        return self.sold_to_ids.get(norm_id(value), set())
+
+def in_list(column: str, values):
+    """(predicate, params) for `column IN (...)`; an empty set matches nothing."""
+    values = sorted(values)
+    if not values:
+        return "1 = 0", []
+    return f"{column} IN ({','.join(['%s'] * len(values))})", values
+
+# ------------------------------ benchmark ------------------------------------
+def bench_filters(index):
+    """The most common value of each customer dimension, alone and combined."""
+    def top(by):
+        return max(by, key=lambda k: len(by[k])) if by else "ALL"
+    region, group = top(index.by_region), top(index.by_group)
+    return [
+        {"region": region},
+        {"salesman": top(index.by_salesman)},
+        {"sold_to_group": group},
+        {"region": region, "sold_to_group": group},
+        {"sold_to": top(index.by_sold_to_name)},
+    ]
+
+def benchmark(filters=None, facts=("sales2025", "sales2510", "sales2124"), repeat=5):
+    """Time each fact total with the customer join vs the resolved ship_to list."""
+    import app as dashboard
+    base = {"category": "ALL", "metric": "qty", "region": "ALL", "salesman": "ALL",
+            "sold_to_group": "ALL", "sold_to": "ALL", "ship_to": "ALL",
+            "product_group": "ALL", "pattern": "ALL"}
+    mismatches = 0
+    conn = dashboard.get_connection()
+    if filters is None:
+        filters = bench_filters(CustomerIndex.load(conn))
+    try:
+        for fact in facts:
+            for extra in filters:
+                f = dict(base, **extra)
+                timings, totals = {}, {}
+                for mode in ("join", "resolved"):
+                    dashboard.CUSTOMER_RESOLVER = mode == "resolved"
+                    joins, wh, params = dashboard.build_customer_filters("s", f)
+                    where_sql = ("WHERE " + " AND ".join(wh)) if wh else ""
+                    sql = f"SELECT SUM(s.qty) AS v FROM {fact} s {' '.join(joins)} {where_sql}"
+                    cur = conn.cursor(dictionary=True)
+                    started = perf_counter()
+                    for _ in range(repeat):
+                        cur.execute(sql, tuple(params))
+                        row = cur.fetchall()[0]
+                    timings[mode] = (perf_counter() - started) / repeat
+                    totals[mode] = float(row["v"] or 0)
+                    cur.close()
+                ok = abs(totals["join"] - totals["resolved"]) < 1e-6
+                mismatches += not ok
+                print(f"{fact:10s} {str(extra):55s} join {timings['join'] * 1000:7.2f}ms  "
+                      f"resolved {timings['resolved'] * 1000:7.2f}ms  "
+                      f"{'ok' if ok else 'MISMATCH %r' % totals}")
+    finally:
+        conn.close()
+        dashboard.CUSTOMER_RESOLVER = True
+    print(f"{mismatches} mismatch(es).")
+    return mismatches
+
+if __name__ == "__main__":
+    sys.exit(1 if benchmark() else 0)
@@ -0,0 +1,148 @@
+# dimensions.py
+# In-memory lookup lists for the dashboard dropdowns (/api/sold_to_groups,
+# /api/sold_to_names, /api/ship_to_names, /api/product_group, /api/patterns).
+#
+# The lists are small and only change with the snapshot, so app.py loads them once
+# per snapshot: trimmed, deduplicated and sorted, with the parent -> child maps the
+# cascading dropdowns walk (sold_to_group -> sold_to_name -> ship_to_name and
+# product_group -> pattern). Each list answers case-insensitive prefix searches
+# (?q=) by bisection instead of a SELECT DISTINCT TRIM(...) per keystroke.
+#
+# On MySQL (fold=True) the lists are deduplicated and sorted the way its default
+# case- and accent-insensitive collation did it for DISTINCT / ORDER BY: "ACME" and
+# "Acme" are one entry, in folded order. SQLite compares exactly, so there it's a
+# plain codepoint sort.
+import unicodedata
+from bisect import bisect_left
+
+CUSTOMER_NAMES_SQL = """
+SELECT sold_to_group, sold_to_name, ship_to_name
+  FROM customer
+"""
+PRODUCT_GROUPS_SQL = "SELECT DISTINCT Product_Group AS product_group FROM carrying_july"
+# covered by ix_sales2025_product (product_group, pattern, month) on snapshot.db; on
+# MySQL a scan unless the server has a similar index. It runs once per snapshot.
+PATTERNS_SQL = "SELECT DISTINCT product_group, pattern FROM sales2025"
+
+def _trim(v):
+    """Same value as TRIM(v); None for NULL."""
+    return None if v is None else str(v).strip(" ")
+
+def collation_key(v):
+    """Case- and accent-insensitive comparison key, like MySQL's *_ai_ci collations."""
+    v = unicodedata.normalize("NFKD", v.casefold())
+    return "".join(c for c in v if not unicodedata.combining(c))
+
+class SortedNames:
+    """
+    A sorted, deduplicated list of names with case-insensitive prefix search.
+    With `fold`, names equal under collation_key() are one entry (the smallest
+    spelling) in collation_key() order, and searches ignore accents too.
+    """
+    def __init__(self, names, fold=False):
+        self._norm = collation_key if fold else str.casefold
+        if fold:
+            first = {}
+            for n in sorted(set(names)):
+                first.setdefault(self._norm(n), n)
+            self.names = [first[k] for k in sorted(first)]
+        else:
+            self.names = sorted(set(names))
+        # (folded name, position in self.names), for bisecting on a folded prefix
+        self._folded = sorted((self._norm(n), i) for i, n in enumerate(self.names))
+        self._keys = [k for k, _ in self._folded]
+
+    def __len__(self):
+        return len(self.names)
+
+    def search(self, q=None, limit=None):
+        """Names starting with `q` (any case), in list order; at most `limit` of them."""
+        if not q:
+            return self.names[:limit] if limit is not None else list(self.names)
+        q = self._norm(q)
+        hits = []
+        for k in range(bisect_left(self._keys, q), len(self._keys)):
+            if not self._keys[k].startswith(q):
+                break
+            hits.append(self._folded[k][1])
+        hits.sort()
+        if limit is not None:
+            hits = hits[:limit]
+        return [self.names[i] for i in hits]
+
+EMPTY = SortedNames(())
+
+class DimensionIndex:
+    """
+    The dropdown lists, keyed by parent. `fold` makes the parent lookups
+    case-insensitive, like MySQL's default collations (SQLite compares exactly).
+    """
+    def __init__(self, customer_rows, product_groups, pattern_rows, fold=False):
+        self.fold = fold
+        groups, sold_to_names, ship_to_names = set(), set(), set()
+        names_by_group, ship_tos_by_group, ship_tos_by_sold_to = {}, {}, {}
+        for r in customer_rows:
+            group, sold_to, ship_to = (_trim(r["sold_to_group"]), _trim(r["sold_to_name"]),
+                                       _trim(r["ship_to_name"]))
+            if group:
+                groups.add(group)
+            if sold_to:
+                sold_to_names.add(sold_to)
+                if group is not None:
+                    names_by_group.setdefault(self._key(group), set()).add(sold_to)
+            if ship_to:
+                ship_to_names.add(ship_to)
+                if group is not None:
+                    ship_tos_by_group.setdefault(self._key(group), set()).add(ship_to)
+                if sold_to is not None:
+                    ship_tos_by_sold_to.setdefault(self._key(sold_to), set()).add(ship_to)
+
+        patterns, patterns_by_group = set(), {}
+        for r in pattern_rows:
+            pattern = _trim(r["pattern"])
+            if not pattern:
+                continue
+            patterns.add(pattern)
+            if r["product_group"] is not None:
+                patterns_by_group.setdefault(self._key(r["product_group"]), set()).add(pattern)
+
+        self.sold_to_groups = SortedNames(groups, fold=fold)
+        self.sold_to_names = SortedNames(sold_to_names, fold=fold)
+        self.ship_to_names = SortedNames(ship_to_names, fold=fold)
+        self.product_groups = SortedNames((g for g in product_groups if g is not None), fold=fold)
+        self.patterns = SortedNames(patterns, fold=fold)
+        self._names_by_group = {k: SortedNames(v, fold=fold) for k, v in names_by_group.items()}
+        self._ship_tos_by_group = {k: SortedNames(v, fold=fold) for k, v in ship_tos_by_group.items()}
+        self._ship_tos_by_sold_to = {k: SortedNames(v, fold=fold) for k, v in ship_tos_by_sold_to.items()}
+        self._patterns_by_group = {k: SortedNames(v, fold=fold) for k, v in patterns_by_group.items()}
+
+    def _key(self, v):
+        v = _trim(v)
+        return collation_key(v) if self.fold else v
+
+    @classmethod
+    def load(cls, conn, fold=False):
+        cur = conn.cursor(dictionary=True)
+        try:
+            cur.execute(CUSTOMER_NAMES_SQL)
+            customers = cur.fetchall()
+            cur.execute(PRODUCT_GROUPS_SQL)
+            product_groups = [r["product_group"] for r in cur.fetchall()]
+            cur.execute(PATTERNS_SQL)
+            patterns = cur.fetchall()
+        finally:
+            cur.close()
+        return cls(customers, product_groups, patterns, fold=fold)
+
+    # parent -> children; an unknown parent has no children
+    def names_in_group(self, group):
+        return self._names_by_group.get(self._key(group), EMPTY)
+
+    def ship_tos_in_group(self, group):
+        return self._ship_tos_by_group.get(self._key(group), EMPTY)
+
+    def ship_tos_of_sold_to(self, sold_to_name):
+        return self._ship_tos_by_sold_to.get(self._key(sold_to_name), EMPTY)
+
+    def patterns_in_group(self, product_group):
+        return self._patterns_by_group.get(self._key(product_group), EMPTY)
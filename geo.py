@@ -0,0 +1,232 @@
+# geo.py
+# In-process spatial index over the geocoded customers (customer.latitude/longitude,
+# filled by geocode.py). app.py builds it once per snapshot and uses it to cluster
+# /api/sales_map by viewport and zoom instead of shipping every marker, and for the
+# radius / nearest / territory endpoints, all without distance math in SQL.
+import math
+
+CUSTOMER_GEO_SQL = """
+SELECT ship_to, ship_to_name, latitude, longitude, bde_state, salesman_name
+  FROM customer
+ WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+"""
+
+GRID_DEG = 0.5          # bucket size of the lookup grid, in degrees
+EARTH_KM = 6371.0088    # mean earth radius
+TILE_SIZE = 256         # web-mercator tile size in pixels
+MAX_LAT = 85.05112878   # web-mercator latitude limit
+
+def mercator(lat, lng):
+    """(x, y) in 0..1 web-mercator world coordinates."""
+    lat = max(-MAX_LAT, min(MAX_LAT, lat))
+    s = math.sin(math.radians(lat))
+    return (lng + 180.0) / 360.0, 0.5 - math.log((1 + s) / (1 - s)) / (4 * math.pi)
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lng2 - lng1)
+    h = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_KM * math.asin(min(1.0, math.sqrt(h)))
+
+def radius_bbox(lat, lng, km):
+    """Smallest (west, south, east, north) holding every point within `km` of (lat, lng)."""
+    theta = km / EARTH_KM                       # angular radius
+    dlat = math.degrees(theta)
+    south, north = lat - dlat, lat + dlat
+    if north >= 90 or south <= -90 or math.sin(theta) >= math.cos(math.radians(lat)):
+        return -180.0, max(south, -90.0), 180.0, min(north, 90.0)   # circle covers a pole
+    dlng = math.degrees(math.asin(math.sin(theta) / math.cos(math.radians(lat))))
+    return lng - dlng, south, lng + dlng, north
+
+def point_in_polygon(lat, lng, polygon):
+    """Ray casting; polygon is [[lat, lng], ...] (closed or not)."""
+    inside = False
+    j = len(polygon) - 1
+    for i in range(len(polygon)):
+        yi, xi = polygon[i]
+        yj, xj = polygon[j]
+        if (yi > lat) != (yj > lat) and lng < (xj - xi) * (lat - yi) / (yj - yi) + xi:
+            inside = not inside
+        j = i
+    return inside
+
+def parse_bbox(text):
+    """'west,south,east,north' (Leaflet's toBBoxString) -> tuple of floats, or None."""
+    if not text:
+        return None
+    try:
+        west, south, east, north = (float(v) for v in text.split(","))
+    except ValueError:
+        raise ValueError("bbox must be west,south,east,north")
+    if not all(math.isfinite(v) for v in (west, south, east, north)):
+        raise ValueError("bbox must be finite numbers")
+    return west, south, east, north
+
+class SpatialIndex:
+    """
+    Customers with coordinates, bucketed on a GRID_DEG lat/lng grid. Points are
+    kept as parallel lists; queries return point positions into them.
+    """
+    def __init__(self, rows):
+        self.ship_to, self.name, self.lat, self.lng = [], [], [], []
+        self.region, self.bde, self.x, self.y = [], [], [], []
+        self.by_ship_to = {}
+        self.grid = {}
+        for r in rows:
+            try:
+                lat, lng = float(r["latitude"]), float(r["longitude"])
+            except (TypeError, ValueError):
+                continue
+            if r["ship_to"] in self.by_ship_to or not (-90 <= lat <= 90 and -180 <= lng <= 180):
+                continue
+            i = len(self.ship_to)
+            self.by_ship_to[r["ship_to"]] = i
+            self.ship_to.append(r["ship_to"])
+            self.name.append(r["ship_to_name"])
+            self.lat.append(lat)
+            self.lng.append(lng)
+            self.region.append(r["bde_state"])
+            self.bde.append(r["salesman_name"])
+            x, y = mercator(lat, lng)
+            self.x.append(x)
+            self.y.append(y)
+            self.grid.setdefault(self._cell(lat, lng), []).append(i)
+
+    def __len__(self):
+        return len(self.ship_to)
+
+    @staticmethod
+    def _cell(lat, lng):
+        return int(math.floor(lat / GRID_DEG)), int(math.floor(lng / GRID_DEG))
+
+    @classmethod
+    def load(cls, conn):
+        cur = conn.cursor(dictionary=True)
+        try:
+            cur.execute(CUSTOMER_GEO_SQL)
+            rows = cur.fetchall()
+        finally:
+            cur.close()
+        return cls(rows)
+
+    def in_bbox(self, bbox):
+        """Positions of the points inside (west, south, east, north); None = everywhere."""
+        if bbox is None:
+            return range(len(self))
+        west, south, east, north = bbox
+        (c_s, c_w), (c_n, c_e) = self._cell(south, west), self._cell(north, east)
+        # a wide viewport has more cells than points: just scan
+        if (c_n - c_s + 1) * (c_e - c_w + 1) > len(self.grid):
+            cand = range(len(self))
+        else:
+            cand = [i for cy in range(c_s, c_n + 1) for cx in range(c_w, c_e + 1)
+                    for i in self.grid.get((cy, cx), ())]
+        return [i for i in cand
+                if south <= self.lat[i] <= north and west <= self.lng[i] <= east]
+
+    def within(self, lat, lng, km, keep=None):
+        """[(distance_km, position)] of the points within `km`, nearest first."""
+        out = []
+        for i in self.in_bbox(radius_bbox(lat, lng, km)):
+            if keep is not None and self.ship_to[i] not in keep:
+                continue
+            d = haversine_km(lat, lng, self.lat[i], self.lng[i])
+            if d <= km:
+                out.append((d, i))
+        out.sort()
+        return out
+
+    def nearest(self, lat, lng, k, keep=None):
+        """The k nearest points as [(distance_km, position)]; `keep` limits to those ship_tos."""
+        if k <= 0 or not self.grid:
+            return []
+        # widen a ring of grid cells until k candidates turn up; the k-th of those
+        # bounds the answer, which a radius search then makes exact
+        def dist(i):
+            return haversine_km(lat, lng, self.lat[i], self.lng[i])
+
+        c_lat, c_lng = self._cell(lat, lng)
+        found = []
+        for ring in range(int(180 / GRID_DEG) + 1):
+            if (2 * ring + 1) ** 2 > 4 * len(self.grid):
+                # far from everything: a full scan is cheaper than more rings
+                found = [dist(i) for i in range(len(self))
+                         if keep is None or self.ship_to[i] in keep]
+                break
+            for cell in self._ring(c_lat, c_lng, ring):
+                found.extend(dist(i) for i in self.grid.get(cell, ())
+                             if keep is None or self.ship_to[i] in keep)
+            if len(found) >= k:
+                break
+        if not found:
+            return []
+        found.sort()
+        bound = found[min(k, len(found)) - 1]
+        return self.within(lat, lng, bound + 1e-9, keep)[:k]
+
+    @staticmethod
+    def _ring(cy, cx, r):
+        """Grid cells at Chebyshev distance r from (cy, cx)."""
+        if r == 0:
+            yield cy, cx
+            return
+        for x in range(cx - r, cx + r + 1):
+            yield cy - r, x
+            yield cy + r, x
+        for y in range(cy - r + 1, cy + r):
+            yield y, cx - r
+            yield y, cx + r
+
+    def in_polygon(self, polygon):
+        """Positions of the points inside `polygon` ([[lat, lng], ...])."""
+        lats = [p[0] for p in polygon]
+        lngs = [p[1] for p in polygon]
+        bbox = min(lngs), min(lats), max(lngs), max(lats)
+        return [i for i in self.in_bbox(bbox)
+                if point_in_polygon(self.lat[i], self.lng[i], polygon)]
+
+    def cluster(self, points, totals, zoom, cell_px=60):
+        """
+        Bucket `points` on a cell_px pixel grid at `zoom`. `totals` maps ship_to ->
+        value; points without a total are skipped. Each cluster carries its count,
+        summed value, centroid, and the region/BDE holding the largest share of it.
+        """
+        scale = TILE_SIZE * (2 ** zoom) / cell_px
+        buckets = {}
+        for i in points:
+            value = totals.get(self.ship_to[i])
+            if value is None:
+                continue
+            key = (int(self.x[i] * scale), int(self.y[i] * scale))
+            buckets.setdefault(key, []).append((i, value))
+
+        out = []
+        for members in buckets.values():
+            total = sum(v for _, v in members)
+            by_region, by_bde = {}, {}
+            for i, v in members:
+                by_region[self.region[i]] = by_region.get(self.region[i], 0) + v
+                by_bde[self.bde[i]] = by_bde.get(self.bde[i], 0) + v
+            c = {
+                "latitude":    sum(self.lat[i] for i, _ in members) / len(members),
+                "longitude":   sum(self.lng[i] for i, _ in members) / len(members),
+                "count":       len(members),
+                "total_value": total,
+                "region":      max(by_region, key=by_region.get),
+                "bde":         max(by_bde, key=by_bde.get),
+            }
+            if len(members) == 1:
+                i = members[0][0]
+                c.update(ship_to=self.ship_to[i], ship_to_name=self.name[i])
+            out.append(c)
+        out.sort(key=lambda c: -c["total_value"])
+        return out
+
+    def bounds(self, points):
+        """[[south, west], [north, east]] around `points`, or None."""
+        points = list(points)
+        if not points:
+            return None
+        lats = [self.lat[i] for i in points]
+        lngs = [self.lng[i] for i in points]
+        return [[min(lats), min(lngs)], [max(lats), max(lngs)]]
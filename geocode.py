@@ -1,11 +1,49 @@
 import csv
 import time
 import os
+import re
+import sys
+import sqlite3
+import json
+import random
+import hashlib
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
 import requests
+from rollups import MYSQL_CONFIG, db_arg
+from loads import record_load
 
 INPUT_FILE = "addresses_1.csv"             # your exported CSV from Excel
 OUTPUT_FILE = "addresses_1_geocoded.csv"   # final output
-CACHE_FILE = "geocode_1_cache.csv"         # progress cache
+CACHE_FILE = "geocode_cache.db"           # progress cache, keyed by normalised address
+# line_index-keyed CSV caches from earlier runs, imported into CACHE_FILE when it is new
+LEGACY_CACHE_FILES = ("geocode_cache.csv", "geocode_1_cache.csv")
+# postcode / locality centroids for offline geocoding (python geocode.py --build-centroids)
+CENTROID_FILE = "postcode_centroids.csv"
+CENTROID_SOURCES = ("addresses.csv", "addresses_1.csv")
+# postcode: rows with a known postcode/locality resolve offline, the rest go to the network
+# street:   every new street address goes to the network (P.O. boxes still resolve offline)
+# offline:  never call the network
+PRECISION = os.getenv("GEOCODE_PRECISION", "postcode")
+
+# Geocoding service. GEOCODE_URL can point at a local stub (python geocode.py --stub)
+GEOCODE_URL = os.getenv("GEOCODE_URL", "https://maps.googleapis.com/maps/api/geocode/json")
+GEOCODE_KEY = os.getenv("GEOCODE_KEY", "")                 # <-- or put your key here
+WORKERS = int(os.getenv("GEOCODE_WORKERS", "8"))           # concurrent requests
+RATE = float(os.getenv("GEOCODE_RATE", "10"))             # requests/second, all workers together (0 = no limit)
+BURST = int(os.getenv("GEOCODE_BURST", "10"))              # requests allowed back to back
+RETRIES = int(os.getenv("GEOCODE_RETRIES", "4"))           # extra attempts on transient errors
+BACKOFF = float(os.getenv("GEOCODE_BACKOFF", "1.0"))       # first retry delay, doubled each time
+FLUSH_EVERY = 50      # cache rows buffered between commits
+FSYNC_EVERY = 5.0     # max seconds a result waits in the buffer
+UPDATE_BATCH = 500    # customer rows per UPDATE batch (--update-customers)
+WINDOW = 5000         # rows held back while the oldest waits on the network
+
+# Google statuses worth retrying; anything else (ZERO_RESULTS, REQUEST_DENIED, ...) is final
+RETRY_STATUSES = {"OVER_QUERY_LIMIT", "UNKNOWN_ERROR"}
 
 # Column names (as they appear in your CSV header)
 ADDRESS1_COL = "Address 1"
@@ -13,6 +51,7 @@ CITY_COL = "City"
 REGION_COLS = ("Region", "Regio")        # try these, use whichever exists
 POSTCODE_COLS = ("Postal Code", "Postal Cod")
 COUNTRY_COLS = ("Country", "Countr")
+SHIP_TO_COLS = ("Ship To", "Ship-to", "Ship_To", "ship_to")   # only for --update-customers
 
 
 def pick_col(row, candidates):
@@ -27,6 +66,14 @@ def pick_col(row, candidates):
     return ""
 
 
+_PO_BOX = re.compile(r"\b(P\.?\s*O\.?\s*BOX|G\.?P\.?O\.?\s*BOX|LOCKED BAG|PRIVATE BAG)\b")
+
+
+def is_po_box(address):
+    """P.O. boxes have no street position; their postcode centroid is as good as it gets."""
+    return bool(_PO_BOX.search(address.upper()))
+
+
 def build_address(row):
     """Build a full postal address string from the CSV row."""
     street = pick_col(row, ADDRESS1_COL)
@@ -65,21 +112,56 @@ def build_address(row):
     return ", ".join(parts)
 
 
-def geocode(address, session):
-    """
-    Geocode using Google Maps Geocoding API.
-    Returns (lat, lon) as strings, or (None, None) if not found.
-    """
-    if not address:
-        return None, None
+class RateLimiter:
+    """Token bucket shared by the workers: `rate` requests/second, bursts of up to `burst`."""
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+
+
+class RetryableError(Exception):
+    """A transient failure (network, 429/5xx, OVER_QUERY_LIMIT); `delay` is the server's hint."""
 
-    url = "https://maps.googleapis.com/maps/api/geocode/json"
+    def __init__(self, message, delay=None):
+        super().__init__(message)
+        self.delay = delay
+
+
+def _request(address, session, limiter):
+    """One geocoding call -> (lat, lon) strings or (None, None); raises RetryableError."""
+    if limiter is not None:
+        limiter.acquire()
     params = {
         "address": address,
-        "key": "",  # <-- put your key here
+        "key": GEOCODE_KEY,
     }
-
-    resp = session.get(url, params=params, timeout=10)
+    try:
+        resp = session.get(GEOCODE_URL, params=params, timeout=10)
+    except requests.RequestException as e:
+        raise RetryableError(f"{type(e).__name__}: {e}")
+
+    if resp.status_code == 429 or resp.status_code >= 500:
+        retry_after = resp.headers.get("Retry-After", "")
+        raise RetryableError(f"HTTP {resp.status_code}",
+                             float(retry_after) if retry_after.isdigit() else None)
     try:
         resp.raise_for_status()
     except Exception as e:
@@ -88,6 +170,8 @@ def geocode(address, session):
 
     data = resp.json()
     status = data.get("status")
+    if status in RETRY_STATUSES:
+        raise RetryableError(status)
     if status != "OK" or not data.get("results"):
         print(f"No result ({status}) for '{address}'")
         return None, None
@@ -98,127 +182,517 @@ def geocode(address, session):
     return str(lat), str(lng)
 
 
-def load_cache():
+def geocode(address, session, limiter=None, retries=None, backoff=None):
     """
-    Load geocode_cache.csv into a dict keyed by line_index:
-        cache[line_index] = (lat, lon)
+    Geocode using Google Maps Geocoding API (or whatever GEOCODE_URL speaks its format).
+    Transient errors are retried with exponential backoff and jitter.
+    Returns (lat, lon) as strings, or (None, None) if not found.
     """
-    cache = {}
-    if not os.path.exists(CACHE_FILE):
-        return cache
-
-    with open(CACHE_FILE, newline="", encoding="utf-8", errors="replace") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            try:
-                line_index = int(row.get("line_index", "").strip())
-            except (ValueError, TypeError):
-                continue
-            lat = row.get("lat") or None
-            lon = row.get("lon") or None
-            cache[line_index] = (lat, lon)
-    return cache
+    if not address:
+        return None, None
 
+    retries = RETRIES if retries is None else retries
+    backoff = BACKOFF if backoff is None else backoff
+    for attempt in range(retries + 1):
+        try:
+            return _request(address, session, limiter)
+        except RetryableError as e:
+            if attempt == retries:
+                print(f"Giving up on '{address}' after {attempt + 1} attempts: {e}")
+                return None, None
+            delay = e.delay if e.delay is not None else backoff * 2 ** attempt
+            delay *= random.uniform(0.8, 1.2)
+            print(f"{e} for '{address}'. Backing off {delay:.1f}s")
+            time.sleep(delay)
 
-def append_to_cache(line_index, built_address, lat, lon):
-    """
-    Append one result (by line index) to geocode_cache.csv.
-    Creates the file with header if it does not exist yet.
-    """
-    file_exists = os.path.exists(CACHE_FILE)
-    write_header = not file_exists or os.path.getsize(CACHE_FILE) == 0
 
-    # IMPORTANT: mode="a" for append, and keep errors="replace" if you added it
-    with open(CACHE_FILE, "a", newline="", encoding="utf-8", errors="replace") as f:
-        fieldnames = ["line_index", "full_address", "lat", "lon"]
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
+def _geocoder(limiter):
+    """The pool's job function: geocode(address) with one requests.Session per thread."""
+    local = threading.local()
 
-        if write_header:
-            writer.writeheader()
+    def work(address):
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = requests.Session()
+        try:
+            return geocode(address, session, limiter)
+        except Exception as e:
+            print(f"  Error geocoding '{address}': {e}")
+            return None, None
 
-        writer.writerow({
-            "line_index": line_index,
-            "full_address": built_address,
-            "lat": lat,
-            "lon": lon
-        })
+    return work
 
-def write_output(rows, cache):
-    """
-    Write addresses_geocoded.csv using cache keyed by line index.
-    Keeps all original columns and adds lat/lon at the end.
-    """
-    fieldnames = list(rows[0].keys())
-    if "lat" not in fieldnames:
-        fieldnames.append("lat")
-    if "lon" not in fieldnames:
-        fieldnames.append("lon")
 
-    with open(OUTPUT_FILE, "w", newline="", encoding="utf-8") as f_out:
-        writer = csv.DictWriter(f_out, fieldnames=fieldnames)
-        writer.writeheader()
+_NOT_KEY_CHARS = re.compile(r"[^A-Z0-9]+")
 
-        for i, r in enumerate(rows, start=1):
-            lat, lon = cache.get(i, (None, None))
-            r = dict(r)  # copy
-            r["lat"] = lat
-            r["lon"] = lon
-            writer.writerow(r)
 
+def address_key(address):
+    """Cache key: upper case, punctuation and runs of spaces folded to one space."""
+    return " ".join(_NOT_KEY_CHARS.sub(" ", address.upper()).split())
 
-def main():
-    # 1. Load input rows (DictReader so we can use column names)
-    with open(INPUT_FILE, newline="", encoding="utf-8", errors="replace") as f_in:
-        reader = csv.DictReader(f_in)
-        rows = list(reader)
 
-    if not rows:
-        print("No rows found in input file.")
-        return
+class GeocodeCache:
+    """
+    Geocoding results in a small SQLite file, one row per address_key(), so a
+    lookup is a primary-key probe instead of re-parsing a CSV on startup, and the
+    same address is only ever geocoded once whatever line it sits on. Not-found
+    results are kept too (lat/lon NULL), like the CSV cache did.
 
-    # 2. Load existing cache (if any), keyed by line index
-    cache = load_cache()
-    print(f"Loaded {len(cache)} cached rows from {CACHE_FILE}.")
+    New results are buffered and committed every `flush_every` rows or
+    `fsync_every` seconds (and on close), so a crash loses only the last batch.
+    """
 
-    total_rows = len(rows)
-    print(f"Total data rows in input (excluding header): {total_rows}")
+    def __init__(self, path=None, flush_every=FLUSH_EVERY, fsync_every=FSYNC_EVERY):
+        path = path or CACHE_FILE
+        new = not os.path.exists(path) or os.path.getsize(path) == 0
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS geocode (
+                address_key  TEXT PRIMARY KEY,
+                full_address TEXT,
+                lat          TEXT,
+                lon          TEXT,
+                updated_at   REAL
+            ) WITHOUT ROWID
+        """)
+        self.flush_every = flush_every
+        self.fsync_every = fsync_every
+        self.buffer = []
+        self.pending = {}        # address_key -> (lat, lon) not committed yet
+        self.synced_at = time.monotonic()
+        if new:
+            for legacy in LEGACY_CACHE_FILES:
+                n = self.import_csv(legacy)
+                if n:
+                    print(f"Imported {n} addresses from {legacy}.")
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM geocode").fetchone()[0]
+
+    def get(self, address):
+        """(lat, lon) for `address` (either may be None), or None if never geocoded."""
+        key = address_key(address)
+        if key in self.pending:
+            return self.pending[key]
+        return self.conn.execute(
+            "SELECT lat, lon FROM geocode WHERE address_key = ?", (key,)
+        ).fetchone()
+
+    def add(self, built_address, lat, lon):
+        key = address_key(built_address)
+        self.buffer.append((key, built_address, lat, lon, time.time()))
+        self.pending[key] = (lat, lon)
+        if (len(self.buffer) >= self.flush_every
+                or time.monotonic() - self.synced_at >= self.fsync_every):
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            with self.conn:
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO geocode VALUES (?, ?, ?, ?, ?)", self.buffer)
+            self.buffer.clear()
+            self.pending.clear()
+        self.synced_at = time.monotonic()
+
+    def import_csv(self, path):
+        """Load an old line_index-keyed cache CSV (full_address, lat, lon columns)."""
+        if not os.path.exists(path):
+            return 0
+        seen = set()
+        with open(path, newline="", encoding="utf-8", errors="replace") as f:
+            for row in csv.DictReader(f):
+                address = (row.get("full_address") or "").strip()
+                if not address or address_key(address) in seen:
+                    continue
+                seen.add(address_key(address))
+                self.add(address, row.get("lat") or None, row.get("lon") or None)
+        self.flush()
+        return len(seen)
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class CentroidIndex:
+    """
+    Offline coordinates by postcode and locality, loaded from CENTROID_FILE
+    (country, region, postcode, locality, lat, lon, n). A row with both postcode and
+    locality is a suburb centroid, postcode only a postcode centroid, locality only a
+    suburb with no postcode. lookup() tries them from most to least precise.
+    """
 
-    session = requests.Session()
+    FIELDS = ["country", "region", "postcode", "locality", "lat", "lon", "n"]
 
-    try:
-        # 3. Process rows strictly in line order
-        for i, row in enumerate(rows, start=1):
-            if i in cache:
-                # already processed in a previous run
+    def __init__(self, rows=()):
+        self.by_suburb = {}      # (country, postcode, locality) -> (lat, lon)
+        self.by_postcode = {}    # (country, postcode) -> (lat, lon)
+        self.by_locality = {}    # (country, region, locality) -> (lat, lon)
+        for r in rows:
+            try:
+                point = (float(r["lat"]), float(r["lon"]))
+            except (TypeError, ValueError):
+                continue
+            country, region = r["country"].upper(), r["region"].upper()
+            postcode, locality = r["postcode"].strip(), address_key(r["locality"])
+            if postcode and locality:
+                self.by_suburb[(country, postcode, locality)] = point
+            elif postcode:
+                self.by_postcode[(country, postcode)] = point
+            elif locality:
+                self.by_locality[(country, region, locality)] = point
+
+    def __len__(self):
+        return len(self.by_suburb) + len(self.by_postcode) + len(self.by_locality)
+
+    @classmethod
+    def load(cls, path=None):
+        path = path or CENTROID_FILE
+        if not os.path.exists(path):
+            return cls()
+        with open(path, newline="", encoding="utf-8") as f:
+            return cls(csv.DictReader(f))
+
+    @staticmethod
+    def _keys(row):
+        """(country, region, postcode, locality), or None for a row whose columns are shifted."""
+        country, postcode = pick_col(row, COUNTRY_COLS).upper(), pick_col(row, POSTCODE_COLS)
+        if not (len(country) == 2 and country.isalpha()) or (postcode and not postcode.isdigit()):
+            return None
+        return (country, pick_col(row, REGION_COLS).upper(), postcode,
+                address_key(pick_col(row, CITY_COL)))
+
+    def lookup(self, row):
+        """(lat, lon, precision) for an input row, or None."""
+        keys = self._keys(row)
+        if keys is None:
+            return None
+        country, region, postcode, locality = keys
+        if postcode and locality and (country, postcode, locality) in self.by_suburb:
+            return self.by_suburb[(country, postcode, locality)] + ("locality",)
+        if postcode and (country, postcode) in self.by_postcode:
+            return self.by_postcode[(country, postcode)] + ("postcode",)
+        if locality and (country, region, locality) in self.by_locality:
+            return self.by_locality[(country, region, locality)] + ("locality",)
+        return None
+
+    @classmethod
+    def build(cls, sources, cache, path=None):
+        """
+        Median street-level coordinates of the geocoded addresses in `sources`
+        (P.O. boxes left out), per suburb, postcode and suburb-without-postcode.
+        """
+        groups = {}
+        for source in sources:
+            if not os.path.exists(source):
                 continue
+            with open(source, newline="", encoding="utf-8", errors="replace") as f:
+                for row in csv.DictReader(f):
+                    built_address = build_address(row)
+                    hit = cache.get(built_address) if built_address else None
+                    if not hit or hit[0] is None or is_po_box(built_address):
+                        continue
+                    keys = cls._keys(row)
+                    if keys is None:
+                        continue
+                    point = (float(hit[0]), float(hit[1]))
+                    country, region, postcode, locality = keys
+                    if postcode:
+                        groups.setdefault((country, region, postcode, locality), []).append(point)
+                        groups.setdefault((country, "", postcode, ""), []).append(point)
+                    if locality:
+                        groups.setdefault((country, region, "", locality), []).append(point)
+
+        def median(values):
+            values = sorted(values)
+            mid = len(values) // 2
+            return values[mid] if len(values) % 2 else (values[mid - 1] + values[mid]) / 2
+
+        path = path or CENTROID_FILE
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=cls.FIELDS)
+            writer.writeheader()
+            for (country, region, postcode, locality), points in sorted(groups.items()):
+                if not locality and not postcode:
+                    continue
+                writer.writerow({
+                    "country": country, "region": region, "postcode": postcode,
+                    "locality": locality,
+                    "lat": round(median(p[0] for p in points), 6),
+                    "lon": round(median(p[1] for p in points), 6),
+                    "n": len(points),
+                })
+        return len(groups)
+
+
+def resolve(row, cache, centroids, built_address=None):
+    """(lat, lon, precision) for a row: the cached street geocode, else its centroid."""
+    hit = cache.get(built_address if built_address is not None else build_address(row))
+    if hit and hit[0] is not None:
+        return hit[0], hit[1], "street"
+    return centroids.lookup(row) or (None, None, None)
+
+
+def read_rows(path):
+    """Reader stage: input rows, one at a time (DictReader so we can use column names)."""
+    with open(path, newline="", encoding="utf-8", errors="replace") as f_in:
+        yield from csv.DictReader(f_in)
+
+
+def resolve_rows(rows, cache, centroids, precision, limiter=None, workers=None):
+    """
+    Resolver stage: yields (row, lat, lon, geo_precision) in input order.
 
+    Rows the cache (or, unless street precision is asked for, the centroids) can
+    answer pass straight through. The rest are geocoded on the worker pool, one
+    request per distinct address in flight, each result going into the cache as
+    it lands. Only a bounded window of rows is held while the head of it waits
+    on the network, so memory doesn't grow with the input.
+    """
+    workers = workers or WORKERS
+    work = _geocoder(limiter)
+    window = deque()      # (row, address, future or None), in input order
+    inflight = {}         # address_key -> future
+    done = 0
+
+    def finish(row, address, fut):
+        nonlocal done
+        if fut is not None:
+            lat, lon = fut.result()
+            key = address_key(address)
+            if inflight.get(key) is fut:       # first row of that address records it
+                del inflight[key]
+                cache.add(address, lat, lon)
+                done += 1
+                print(f"[{done}] {address} -> lat={lat}, lon={lon}")
+        return (row,) + resolve(row, cache, centroids, address)
+
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        for row in rows:
             built_address = build_address(row)
-            print(f"[{i}/{total_rows}] {built_address}")
-
-            if not built_address:
-                lat, lon = None, None
-            else:
-                try:
-                    lat, lon = geocode(built_address, session)
-                except Exception as e:
-                    print(f"  Error geocoding line {i}: {e}")
-                    lat, lon = None, None
+            fut = None
+            if built_address and cache.get(built_address) is None:
+                key = address_key(built_address)
+                fut = inflight.get(key)
+                offline = (precision != "street" or is_po_box(built_address)) and centroids.lookup(row)
+                if fut is None and not offline and precision != "offline":
+                    fut = inflight[key] = executor.submit(work, built_address)
+            window.append((row, built_address, fut))
+
+            # emit what's ready; block on the head once the window or the pool is full
+            while window:
+                head = window[0][2]
+                if head is None or head.done() or len(window) >= WINDOW:
+                    yield finish(*window.popleft())
+                    continue
+                busy = [f for f in inflight.values() if not f.done()]
+                if len(busy) >= workers * 4:
+                    wait(busy, return_when=FIRST_COMPLETED)
+                    continue
+                break
+        while window:
+            yield finish(*window.popleft())
+    finally:
+        # on Ctrl+C drop whatever hasn't started
+        executor.shutdown(wait=True, cancel_futures=True)
 
-            cache[i] = (lat, lon)
-            append_to_cache(i, built_address, lat, lon)
-            print(f"  -> lat={lat}, lon={lon}")
 
-            # Be polite to Nominatim
-            time.sleep(1)
+def write_output(results, path=None):
+    """
+    Writer stage: streams (row, lat, lon, geo_precision) to OUTPUT_FILE, keeping all
+    original columns and adding lat/lon/geo_precision at the end. Rows go to a
+    .part file that replaces the output only once complete. Returns the row count.
+    """
+    path = path or OUTPUT_FILE
+    tmp = path + ".part"
+    n = 0
+    with open(tmp, "w", newline="", encoding="utf-8") as f_out:
+        writer = None
+        for row, lat, lon, precision in results:
+            if writer is None:
+                fieldnames = [c for c in row if c is not None]
+                for col in ("lat", "lon", "geo_precision"):
+                    if col not in fieldnames:
+                        fieldnames.append(col)
+                # rows with unquoted commas spill into a None key; keep only the named columns
+                writer = csv.DictWriter(f_out, fieldnames=fieldnames, extrasaction="ignore")
+                writer.writeheader()
+            row["lat"] = lat
+            row["lon"] = lon
+            row["geo_precision"] = precision
+            writer.writerow(row)
+            n += 1
+    os.replace(tmp, path)
+    return n
+
+
+def update_customers(conn, path=None, batch=UPDATE_BATCH):
+    """
+    Copy lat/lon from the geocoded output into customer.latitude/longitude, matched on
+    the input's ship_to column, streaming `batch` rows per round trip and transaction.
+    Rows that didn't resolve leave the customer's coordinates alone. The update is
+    logged with record_load(), which moves app.py's data version (and its ETags).
+    """
+    path = path or OUTPUT_FILE
+    with open(path, newline="", encoding="utf-8", errors="replace") as f:
+        header = next(csv.reader(f), [])
+    if not any(c in header for c in SHIP_TO_COLS):
+        print(f"{path} has no ship_to column ({', '.join(SHIP_TO_COLS)}); nothing to update.")
+        return 0
+
+    sqlite = isinstance(conn, sqlite3.Connection)
+    cur = conn.cursor()
+    if not sqlite:
+        # executemany UPDATE is a round trip per row on MySQL: stage and join instead
+        cur.execute("""
+            CREATE TEMPORARY TABLE IF NOT EXISTS geocode_update (
+                ship_to VARCHAR(64) PRIMARY KEY, latitude DOUBLE, longitude DOUBLE)
+        """)
+
+    def apply(rows):
+        if sqlite:
+            cur.executemany(
+                "UPDATE customer SET latitude = ?, longitude = ? WHERE ship_to = ?",
+                [(lat, lon, ship_to) for ship_to, lat, lon in rows])
+        else:
+            cur.execute("DELETE FROM geocode_update")
+            cur.executemany(
+                "REPLACE INTO geocode_update (ship_to, latitude, longitude) VALUES (%s, %s, %s)", rows)
+            cur.execute("""
+                UPDATE customer c JOIN geocode_update u ON u.ship_to = c.ship_to
+                   SET c.latitude = u.latitude, c.longitude = u.longitude
+            """)
+        conn.commit()
+
+    total, rows = 0, []
+    try:
+        for row in read_rows(path):
+            ship_to = pick_col(row, SHIP_TO_COLS)
+            if not ship_to or not row.get("lat") or not row.get("lon"):
+                continue
+            rows.append((ship_to, float(row["lat"]), float(row["lon"])))
+            if len(rows) >= batch:
+                apply(rows)
+                total += len(rows)
+                rows = []
+        if rows:
+            apply(rows)
+            total += len(rows)
+    finally:
+        cur.close()
+    if total:
+        record_load(conn, ["customer"])
+    return total
+
+
+def main(precision=None):
+    # 1. Open the cache and centroids; unless street precision is asked for, rows with a
+    #    known postcode/locality are resolved offline from the centroids
+    precision = precision or PRECISION
+    cache = GeocodeCache(CACHE_FILE)
+    centroids = CentroidIndex.load(CENTROID_FILE)
+    print(f"{len(cache)} addresses cached in {CACHE_FILE}, "
+          f"{len(centroids)} centroids in {CENTROID_FILE}.")
+    print(f"Geocoding {INPUT_FILE} ({precision} precision) with {WORKERS} workers "
+          f"at up to {RATE:g} req/s.")
+    limiter = RateLimiter(RATE, BURST)
 
+    try:
+        # 2. reader -> resolver -> writer, one row at a time; a rerun resumes from the cache
+        n = write_output(resolve_rows(read_rows(INPUT_FILE), cache, centroids, precision, limiter))
+        print(f"Done. Wrote {n} rows to {OUTPUT_FILE}.")
     except KeyboardInterrupt:
         print("\nInterrupted by user (Ctrl+C).")
-        print("Progress so far is saved in geocode_cache.csv.")
+        print(f"Progress so far is saved in {CACHE_FILE}.")
+        # 3. Still write the output with whatever we have so far, without the network
+        cache.flush()
+        n = write_output(resolve_rows(read_rows(INPUT_FILE), cache, centroids, "offline"))
+        print(f"Wrote {n} rows to {OUTPUT_FILE} from cache (partial).")
     finally:
-        # 4. Always regenerate output with whatever we have so far
-        write_output(rows, cache)
-        print(f"Done (partial or full). Wrote {OUTPUT_FILE} from cache.")
+        cache.close()
+
+
+# ------------------------------ stub server ------------------------------------
+# python geocode.py --stub [port]  serves the Google response format on localhost, with
+# made-up coordinates and some injected failures, so a run can be tried end to end:
+#   GEOCODE_URL=http://127.0.0.1:8765/ python geocode.py
+class StubGeocoder(BaseHTTPRequestHandler):
+    fail_every = 7        # every Nth request fails with a 503 or OVER_QUERY_LIMIT
+    latency = 0.05        # seconds per request
+    count = 0
+    lock = threading.Lock()
+
+    def do_GET(self):
+        with self.lock:
+            StubGeocoder.count += 1
+            n = StubGeocoder.count
+        time.sleep(self.latency)
+        address = parse_qs(urlparse(self.path).query).get("address", [""])[0]
+        if self.fail_every and n % self.fail_every == 0:
+            if n % 2:
+                self.send_error(503)
+                return
+            body = {"status": "OVER_QUERY_LIMIT", "results": []}
+        elif "P.O. BOX" in address.upper():
+            body = {"status": "ZERO_RESULTS", "results": []}
+        else:
+            h = hashlib.sha1(address.encode("utf-8")).digest()
+            lat = -44 + 34 * int.from_bytes(h[:4], "big") / 2 ** 32
+            lng = 113 + 41 * int.from_bytes(h[4:8], "big") / 2 ** 32
+            body = {"status": "OK", "results": [{"geometry": {"location": {"lat": lat, "lng": lng}}}]}
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+def stub_server(port=8765):
+    """Start the stub on a daemon thread; returns the server (port 0 picks a free one)."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), StubGeocoder)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
 
 
 if __name__ == "__main__":
-    main()
+    if sys.argv[1:2] == ["--stub"]:
+        server = stub_server(int(sys.argv[2]) if len(sys.argv) > 2 else 8765)
+        print(f"Stub geocoder on http://127.0.0.1:{server.server_port}/ (Ctrl+C to stop)")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            server.shutdown()
+    elif sys.argv[1:2] == ["--build-centroids"]:
+        with GeocodeCache(CACHE_FILE) as cache:
+            n = CentroidIndex.build(CENTROID_SOURCES, cache, CENTROID_FILE)
+        print(f"Wrote {n} centroids to {CENTROID_FILE}.")
+    else:
+        # --street / --offline override GEOCODE_PRECISION for this run
+        flags = [a[2:] for a in sys.argv[1:] if a in ("--street", "--postcode", "--offline")]
+        main(flags[-1] if flags else None)
+        # --update-customers [--mysql | --db PATH]: then copy the coordinates into customer
+        # (snapshot.db, or $SQLITE_PATH, by default)
+        if "--update-customers" in sys.argv[1:]:
+            if "--mysql" in sys.argv[1:]:
+                import mysql.connector
+                conn = mysql.connector.connect(**MYSQL_CONFIG)
+            else:
+                conn = sqlite3.connect(db_arg(sys.argv[1:]))
+            try:
+                print(f"Updated coordinates of {update_customers(conn)} customer rows.")
+            finally:
+                conn.close()
@@ -0,0 +1,429 @@
+# ingest.py
+# Bulk loader for the monthly exports in rawdata/ into the tables the dashboard reads.
+#
+#   python ingest.py                          -> every source below into snapshot.db ($SQLITE_PATH)
+#   python ingest.py --db synthetic.db        -> ... into another SQLite file
+#   python ingest.py --mysql                  -> into the MySQL database (executemany batches)
+#   python ingest.py --mysql --load-data      -> MySQL via LOAD DATA LOCAL INFILE per chunk
+#   python ingest.py --only sales2510,customer
+#   python ingest.py --file sales2510=rawdata/NovSales.csv
+#   python ingest.py --chunk 20000 --max-rejects 0.01
+#
+# Files are streamed (csv module / openpyxl read-only) in chunks of --chunk rows. Each
+# row is validated and coerced to the column types the app queries; rejected rows are
+# counted and sampled, and a load with more than --max-rejects of them is rolled back.
+# A table is replaced as a whole: in one transaction on snapshot.db, and through a
+# staging table swapped in with RENAME TABLE on MySQL, so readers never see half a load.
+# Afterwards the rollups that depend on the loaded tables are rebuilt.
+import os
+import re
+import sys
+import math
+import csv
+import sqlite3
+import tempfile
+from datetime import date, datetime
+from time import time
+
+from rollups import MYSQL_CONFIG, SQLITE_PATH, ROLLUPS, build_rollups
+from loads import record_load
+
+RAWDATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "rawdata")
+CHUNK_ROWS = 10000
+MAX_REJECTS = 0.01      # fraction of rows that may fail validation before a load aborts
+SAMPLE_REJECTS = 5      # rejected rows echoed per table
+
+# table -> candidate source files in rawdata/ (the first that exists is loaded)
+SOURCES = {
+    "sales2510":  ("OctSales.csv", "OctSales.xlsx"),
+    "customer":   ("customer.csv", "customer.xlsx"),
+    "target2025": ("2025Target.xlsx", "2025Target.csv"),
+}
+
+# ---------------------------- coercion -----------------------------------------
+class Reject(ValueError):
+    pass
+
+_NUMBER_JUNK = re.compile(r"[,$\s]")
+
+def _number(v):
+    if isinstance(v, (int, float)):
+        n = v
+    else:
+        s = _NUMBER_JUNK.sub("", str(v))
+        if s.startswith("(") and s.endswith(")"):     # accounting negative
+            s = "-" + s[1:-1]
+        n = float(s)
+    # float() takes "inf", "nan" and "1e400"; one of those in qty/amt poisons every SUM
+    if not math.isfinite(n):
+        raise Reject(f"{v!r} is not a finite number")
+    return n
+
+def to_int(v):
+    n = _number(v)
+    if n != int(n):
+        raise Reject(f"{v!r} is not a whole number")
+    return int(n)
+
+def to_real(v):
+    return float(_number(v))
+
+def to_text(v):
+    # Excel hands ids and sizes back as floats: 200087.0 -> "200087"
+    if isinstance(v, float) and v.is_integer():
+        return str(int(v))
+    if isinstance(v, (datetime, date)):
+        return v.isoformat()
+    return str(v)
+
+def to_id(v):
+    """Join keys (ship_to, sold_to) are compared exactly, so they lose stray spaces."""
+    return to_text(v).strip()
+
+_DATE_FORMATS = ("%Y-%m-%d", "%d/%m/%Y", "%d.%m.%Y", "%Y%m%d", "%d-%b-%Y", "%d %b %Y")
+
+def _as_date(v):
+    if isinstance(v, (datetime, date)):
+        return v
+    for fmt in _DATE_FORMATS:
+        try:
+            return datetime.strptime(str(v).strip().split(" ")[0], fmt)
+        except ValueError:
+            pass
+    return None
+
+def to_day(v):
+    """Day of month: 1..31, or the day of a date."""
+    d = _as_date(v) if not isinstance(v, (int, float)) else None
+    n = d.day if d else to_int(v)
+    if not 1 <= n <= 31:
+        raise Reject(f"day {n} out of range")
+    return n
+
+_MONTHS = {m: i for i, m in enumerate(
+    ("JAN", "FEB", "MAR", "APR", "MAY", "JUN", "JUL", "AUG", "SEP", "OCT", "NOV", "DEC"), 1)}
+
+def to_month(v):
+    """Month: 1..12, a month name, or the month of a date."""
+    if isinstance(v, str) and v.strip()[:3].upper() in _MONTHS:
+        return _MONTHS[v.strip()[:3].upper()]
+    d = _as_date(v) if not isinstance(v, (int, float)) else None
+    n = d.month if d else to_int(v)
+    if not 1 <= n <= 12:
+        raise Reject(f"month {n} out of range")
+    return n
+
+# ---------------------------- table specs --------------------------------------
+# table -> [(column, sqlite type, coerce, required, header aliases)]. Headers are matched
+# after header_key(), so "Ship To", "SHIP-TO" and "ship_to" are the same column.
+_SALES = [
+    ("ship_to",       "TEXT",    to_id,   True,  ("ship_to_party", "shipto")),
+    ("ship_to_name",  "TEXT",    to_text, False, ("ship_to_party_name",)),
+    ("sold_to",       "TEXT",    to_id,   True,  ("sold_to_party", "soldto")),
+    ("sold_to_name",  "TEXT",    to_text, False, ("sold_to_party_name",)),
+    ("sold_to_group", "TEXT",    to_text, False, ("customer_group", "group")),
+    ("material",      "INTEGER", to_int,  False, ("material_number", "material_no")),
+    ("product_group", "TEXT",    to_text, False, ("prod_group",)),
+    ("pattern",       "TEXT",    to_text, False, ()),
+    ("line",          "TEXT",    to_text, False, ("product_line",)),
+    ("inch",          "TEXT",    to_text, False, ("rim", "rim_size", "size_inch")),
+    ("qty",           "REAL",    to_real, True,  ("quantity", "billing_qty")),
+    ("amt",           "REAL",    to_real, True,  ("amount", "net_amount", "net_value")),
+]
+SPECS = {
+    "sales2510": [("day", "INTEGER", to_day, True, ("billing_date", "date", "billing_day"))] + _SALES,
+    "target2025": [
+        ("month",   "INTEGER", to_month, True,  ("period", "target_month")),
+        ("ship_to", "TEXT",    to_id,    True,  ("ship_to_party", "shipto")),
+        ("line",    "TEXT",    to_text,  False, ("product_line",)),
+        ("special", "TEXT",    to_text,  False, ("category", "segment")),
+        ("qty",     "REAL",    to_real,  True,  ("quantity", "target_qty")),
+        ("amt",     "REAL",    to_real,  True,  ("amount", "target_amt", "target_amount")),
+    ],
+    "customer": [
+        ("ship_to",       "TEXT", to_id,   True,  ("ship_to_party", "shipto")),
+        ("ship_to_name",  "TEXT", to_text, False, ("ship_to_party_name",)),
+        ("sold_to",       "TEXT", to_id,   False, ("sold_to_party", "soldto")),
+        ("sold_to_name",  "TEXT", to_text, False, ("sold_to_party_name",)),
+        ("sold_to_group", "TEXT", to_text, False, ("customer_group", "group")),
+        ("bde_state",     "TEXT", to_text, False, ("state", "region")),
+        ("salesman_name", "TEXT", to_text, False, ("salesman", "bde", "sales_rep")),
+        ("latitude",      "REAL", to_real, False, ("lat",)),
+        ("longitude",     "REAL", to_real, False, ("lon", "lng")),
+    ],
+}
+
+_MYSQL_TYPES = {"INTEGER": "BIGINT", "REAL": "DOUBLE", "TEXT": "VARCHAR(255)"}
+
+def header_key(h) -> str:
+    return re.sub(r"[^a-z0-9]+", "_", str(h or "").strip().lower()).strip("_")
+
+def map_columns(table, header):
+    """[(spec, source position)] for the spec columns found in `header`; raises on missing required ones."""
+    positions = {}
+    for i, h in enumerate(header):
+        positions.setdefault(header_key(h), i)
+    mapped, missing = [], []
+    for spec in SPECS[table]:
+        name, _, _, required, aliases = spec
+        pos = next((positions[k] for k in (name,) + aliases if k in positions), None)
+        if pos is None:
+            if required:
+                missing.append(name)
+            continue
+        mapped.append((spec, pos))
+    if missing:
+        raise SystemExit(f"{table}: source has no column for {', '.join(missing)} "
+                         f"(header: {', '.join(str(h) for h in header)})")
+    return mapped
+
+def coerce(mapped, raw):
+    """One source row -> tuple in `mapped` order; raises Reject."""
+    out = []
+    for (name, typ, conv, required, _), pos in mapped:
+        v = raw[pos] if pos < len(raw) else None
+        if v is None or (isinstance(v, str) and not v.strip()):
+            if required:
+                raise Reject(f"{name} is empty")
+            # special = '' is a category of its own, so blank text stays ''
+            out.append("" if typ == "TEXT" else None)
+            continue
+        try:
+            out.append(conv(v))
+        except Reject as e:
+            raise Reject(f"{name}: {e}")
+        except (TypeError, ValueError, ArithmeticError):
+            raise Reject(f"{name}: bad value {v!r}")
+    return tuple(out)
+
+# ---------------------------- readers ------------------------------------------
+def read_source(path):
+    """(header, iterator of raw rows) for a .csv or .xlsx file, streamed."""
+    if path.lower().endswith((".xlsx", ".xlsm")):
+        try:
+            import openpyxl
+        except ImportError:
+            raise SystemExit(f"{path}: reading .xlsx needs openpyxl (pip install openpyxl)")
+        wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+        rows = wb.active.iter_rows(values_only=True)
+        header = next(rows, ())
+
+        def body():
+            try:
+                yield from rows
+            finally:
+                wb.close()
+        return list(header), body()
+
+    f = open(path, newline="", encoding="utf-8-sig", errors="replace")
+    reader = csv.reader(f)
+    header = next(reader, [])
+
+    def body():
+        try:
+            yield from reader
+        finally:
+            f.close()
+    return header, body()
+
+def chunks(mapped, rows, size, stats):
+    """Validated row tuples in lists of `size`; rejects are counted in `stats`."""
+    batch = []
+    for line, raw in enumerate(rows, start=2):
+        if not any(v not in (None, "") for v in raw):
+            continue                                   # blank line / trailing Excel rows
+        stats["read"] += 1
+        try:
+            batch.append(coerce(mapped, raw))
+        except Reject as e:
+            stats["rejected"] += 1
+            if stats["rejected"] <= SAMPLE_REJECTS:
+                print(f"  line {line}: rejected ({e})")
+            continue
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+# ---------------------------- writers ------------------------------------------
+def _is_sqlite(conn) -> bool:
+    return isinstance(conn, sqlite3.Connection)
+
+def _check_rejects(table, stats, max_rejects):
+    if stats["read"] and stats["rejected"] / stats["read"] > max_rejects:
+        raise SystemExit(f"{table}: {stats['rejected']} of {stats['read']} rows rejected "
+                         f"(more than {max_rejects:.1%}); nothing loaded")
+
+def load_sqlite(conn, table, mapped, batches, stats, max_rejects):
+    """Replace `table` in one transaction, inserting batch by batch (and dropping its snapshot fingerprints)."""
+    cols = [spec[0] for spec, _ in mapped]
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()
+    insert = f'INSERT INTO "{table}" ({", ".join(cols)}) VALUES ({", ".join("?" * len(cols))})'
+    conn.execute("BEGIN")
+    try:
+        if exists:
+            conn.execute(f'DELETE FROM "{table}"')
+        else:
+            ddl = ", ".join(f'"{name}" {typ}' for name, typ, *_ in SPECS[table])
+            conn.execute(f'CREATE TABLE "{table}" ({ddl})')
+        for batch in batches:
+            conn.executemany(insert, batch)
+            stats["loaded"] += len(batch)
+        _check_rejects(table, stats, max_rejects)
+        # the table no longer matches make_sqlite_snapshot.py's partition fingerprints:
+        # forget them, so its next run copies the whole table back from MySQL
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' "
+                        "AND name = 'snapshot_partitions'").fetchone():
+            conn.execute("DELETE FROM snapshot_partitions WHERE table_name = ?", (table,))
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+
+def _mysql_literal(v):
+    if v is None:
+        return "\\N"
+    return str(v).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n")
+
+def load_mysql(conn, table, mapped, batches, stats, max_rejects, load_data=False):
+    """Fill <table>_new (LIKE the live table) batch by batch, then swap it in."""
+    cols = [spec[0] for spec, _ in mapped]
+    staging = f"{table}_new"
+    cur = conn.cursor()
+    cur.execute(f"DROP TABLE IF EXISTS {staging}")
+    cur.execute("SHOW TABLES LIKE %s", (table,))
+    if cur.fetchall():
+        cur.execute(f"CREATE TABLE {staging} LIKE {table}")
+    else:
+        ddl = ", ".join(f"`{name}` {_MYSQL_TYPES[typ]}" for name, typ, *_ in SPECS[table])
+        cur.execute(f"CREATE TABLE {staging} ({ddl})")
+    names = ", ".join(f"`{c}`" for c in cols)
+    try:
+        for batch in batches:
+            if load_data:
+                with tempfile.NamedTemporaryFile("w", suffix=".tsv", delete=False,
+                                                 encoding="utf-8", newline="\n") as tmp:
+                    for row in batch:
+                        tmp.write("\t".join(_mysql_literal(v) for v in row) + "\n")
+                try:
+                    cur.execute(f"LOAD DATA LOCAL INFILE '{tmp.name}' INTO TABLE {staging} "
+                                f"CHARACTER SET utf8mb4 ({names})")
+                finally:
+                    os.unlink(tmp.name)
+            else:
+                # mysql-connector rewrites this into multi-row INSERTs
+                cur.executemany(
+                    f"INSERT INTO {staging} ({names}) VALUES ({', '.join(['%s'] * len(cols))})", batch)
+            conn.commit()
+            stats["loaded"] += len(batch)
+        _check_rejects(table, stats, max_rejects)
+        cur.execute(f"CREATE TABLE IF NOT EXISTS {table} LIKE {staging}")
+        cur.execute(f"DROP TABLE IF EXISTS {table}_old")
+        cur.execute(f"RENAME TABLE {table} TO {table}_old, {staging} TO {table}")
+        cur.execute(f"DROP TABLE {table}_old")
+    except BaseException:
+        cur.execute(f"DROP TABLE IF EXISTS {staging}")
+        raise
+    finally:
+        cur.close()
+
+def ingest_table(conn, table, path, *, chunk=CHUNK_ROWS, max_rejects=MAX_REJECTS, load_data=False):
+    """Load one source file into `table`; returns a stats dict."""
+    started = time()
+    header, rows = read_source(path)
+    mapped = map_columns(table, header)
+    stats = {"table": table, "source": path, "read": 0, "rejected": 0, "loaded": 0}
+    batches = chunks(mapped, rows, chunk, stats)
+    if _is_sqlite(conn):
+        load_sqlite(conn, table, mapped, batches, stats, max_rejects)
+    else:
+        load_mysql(conn, table, mapped, batches, stats, max_rejects, load_data)
+    stats["seconds"] = time() - started
+    stats["rows_per_sec"] = stats["loaded"] / stats["seconds"] if stats["seconds"] else 0.0
+    return stats
+
+def refresh_aggregates(conn, tables):
+    """Rebuild the rollups fed by `tables` (the customer dimension feeds all of them), log the load."""
+    facts = list(ROLLUPS) if "customer" in tables else [t for t in ROLLUPS if t in tables]
+    if facts:
+        build_rollups(conn, facts)
+    record_load(conn, tables)
+    if _is_sqlite(conn):
+        from make_sqlite_snapshot import ensure_indexes, analyze
+        print(f"Indexes: {ensure_indexes(conn, tables)} declared indexes in place.")
+        analyze(conn)
+        # app.py reloads its in-memory indexes when snapshot.db's mtime moves, which
+        # in WAL mode only happens at a checkpoint
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+# ---------------------------- command line -------------------------------------
+def find_source(table):
+    for name in SOURCES[table]:
+        path = os.path.join(RAWDATA, name)
+        if os.path.exists(path):
+            return path
+    return None
+
+def parse_args(argv):
+    opts = {"mysql": False, "load_data": False, "tables": list(SOURCES), "files": {},
+            "chunk": CHUNK_ROWS, "max_rejects": MAX_REJECTS, "db": SQLITE_PATH}
+    it = iter(argv)
+    for arg in it:
+        if arg == "--mysql":
+            opts["mysql"] = True
+        elif arg == "--load-data":
+            opts["load_data"] = True
+        elif arg == "--only":
+            opts["tables"] = [t.strip() for t in next(it).split(",") if t.strip()]
+        elif arg == "--file":
+            table, _, path = next(it).partition("=")
+            opts["files"][table] = path
+        elif arg == "--chunk":
+            opts["chunk"] = int(next(it))
+        elif arg == "--max-rejects":
+            opts["max_rejects"] = float(next(it))
+        elif arg == "--db":
+            opts["db"] = os.path.abspath(next(it))
+        else:
+            raise SystemExit(f"unknown argument: {arg}")
+    if opts["files"] and "--only" not in argv:
+        opts["tables"] = list(opts["files"])
+    unknown = [t for t in opts["tables"] if t not in SPECS]
+    if unknown:
+        raise SystemExit(f"no spec for table(s): {', '.join(unknown)} (known: {', '.join(SPECS)})")
+    return opts
+
+def main(argv=None):
+    opts = parse_args(sys.argv[1:] if argv is None else argv)
+    if opts["mysql"]:
+        import mysql.connector
+        conn = mysql.connector.connect(**MYSQL_CONFIG, allow_local_infile=opts["load_data"])
+    else:
+        print(f"Loading into {opts['db']}.")
+        conn = sqlite3.connect(opts["db"], isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+
+    loaded = []
+    try:
+        for table in opts["tables"]:
+            path = opts["files"].get(table) or find_source(table)
+            if not path:
+                print(f"{table}: no source file in {RAWDATA}, skipped.")
+                continue
+            print(f"Loading {path} -> {table}...")
+            st = ingest_table(conn, table, path, chunk=opts["chunk"],
+                              max_rejects=opts["max_rejects"], load_data=opts["load_data"])
+            print(f"  {st['loaded']} rows loaded, {st['rejected']} rejected "
+                  f"in {st['seconds']:.1f}s ({st['rows_per_sec']:.0f} rows/s)")
+            loaded.append(table)
+        if loaded:
+            refresh_aggregates(conn, loaded)
+    finally:
+        conn.close()
+    print("Done. Tables loaded: " + (", ".join(loaded) or "none") + ".")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+# loads.py
+# Bookkeeping of data loads. Every script that changes the data the dashboard serves
+# (ingest.py, geocode.py --update-customers) logs a batch in load_batches once its
+# rows are in. On MySQL, app.py's data version, and so the ETags and result-cache
+# keys it derives from it, follows the latest batch_id; on SQLite the snapshot file
+# itself changes, and the batch is just a record of what was loaded when.
+import sqlite3
+from time import time
+
+def record_load(conn, tables):
+    """Log a load of `tables` in load_batches (created on first use) and commit."""
+    sqlite = isinstance(conn, sqlite3.Connection)
+    mark = "?" if sqlite else "%s"
+    key = "INTEGER PRIMARY KEY AUTOINCREMENT" if sqlite else "BIGINT AUTO_INCREMENT PRIMARY KEY"
+    cur = conn.cursor()
+    try:
+        cur.execute(f"""
+            CREATE TABLE IF NOT EXISTS load_batches (
+                batch_id  {key},
+                tables    VARCHAR(255),
+                loaded_at DOUBLE
+            )
+        """)
+        cur.execute(f"INSERT INTO load_batches (tables, loaded_at) VALUES ({mark}, {mark})",
+                    (",".join(tables), time()))
+        conn.commit()
+    finally:
+        cur.close()
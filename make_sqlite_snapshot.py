@@ -1,8 +1,30 @@
 # make_sqlite_snapshot.py
+#
+#   python make_sqlite_snapshot.py                 -> incremental refresh of snapshot.db
+#   python make_sqlite_snapshot.py --full          -> rebuild every table from scratch
+#   python make_sqlite_snapshot.py --tables a,b    -> only these tables
+#   python make_sqlite_snapshot.py --chunk 20000   -> rows per fetch/insert batch
+#   python make_sqlite_snapshot.py --plans         -> only print query plans for the API SQL
+#   python make_sqlite_snapshot.py --db other.db   -> write another file (default: snapshot.db,
+#                                                     or $SQLITE_PATH like app.py)
+#
+# Rows are streamed from MySQL in chunks (nothing is held in RAM beyond one batch)
+# and written to snapshot.db in WAL mode. Fact tables are split into partitions
+# (month / day / year); each partition is fingerprinted on the MySQL side
+# (row count + sum of row CRCs) and only partitions whose fingerprint changed since
+# the last run are deleted and re-copied.
 import os
-import mysql.connector
+import re
+import sys
 import sqlite3
-import pandas as pd
+from datetime import date, datetime, time as dtime, timedelta
+from decimal import Decimal
+from time import time
+
+import mysql.connector
+from mysql.connector import FieldType
+
+from rollups import ROLLUPS, SQLITE_PATH, build_rollups
 
 # 1) MySQL connection info (same as you use in app.py)
 MYSQL_CONFIG = {
@@ -14,6 +36,8 @@ MYSQL_CONFIG = {
     "autocommit": True,
     }
 
+CHUNK_ROWS = 10000
+
 # 2) Tables your Flask app uses
 TABLES = [
     "sales2025",
@@ -26,22 +50,361 @@ TABLES = [
     "lowprofile",
     "strategic_commercial",
     "suv",
-    "profit"
+    "profit",
+    "carrying_july",   # product_group lookup + profit EXISTS filters
     # add any other tables that appear in your SQL in app.py
 ]
 
-def main():
+# 3) Partition column per table; tables not listed are fingerprinted as one partition
+PARTITIONS = {
+    "sales2025":  "month",
+    "sales2510":  "day",
+    "sales2124":  "year",
+    "target2025": "month",
+    "profit":     "Month",
+}
+
+# 4) Indexes for the predicates app.py actually uses: the customer join on ship_to,
+#    the customer-dimension filters, period GROUP BYs and product/category filters.
+#    (table, name, indexed expression); skipped when the table lacks a column.
+INDEXES = [
+    ("customer",      "ship_to",  "ship_to"),
+    ("customer",      "sold_to",  "sold_to"),
+    ("customer",      "state",    "bde_state"),
+    ("customer",      "salesman", "UPPER(TRIM(salesman_name))"),
+    ("customer",      "group",    "sold_to_group, sold_to_name"),
+    ("customer",      "sold_nm",  "sold_to_name"),
+    ("target2025",    "ship_to",  "ship_to, month"),
+    ("target2025",    "month",    "month, special"),
+    ("profit",        "ship_to",  "ship_to"),
+    ("profit",        "month",    "Month"),
+    ("profit",        "material", "Material"),
+    ("carrying_july", "m_code",   "M_CODE"),
+    ("hm",            "sold_to",  "Sold_To"),
+    ("suv",           "pattern",  "Pattern"),
+]
+for _fact, _period in (("sales2025", "month"), ("sales2510", "day"), ("sales2124", "year")):
+    INDEXES += [
+        (_fact, "ship_to",  f"ship_to, {_period}"),
+        (_fact, "period",   _period),
+        (_fact, "product",  f"product_group, pattern, {_period}"),
+        (_fact, "pattern",  "pattern"),
+        (_fact, "line",     f"line, {_period}"),
+        (_fact, "sold_to",  "sold_to"),
+        (_fact, "material", "material"),
+    ]
+
+_SQL_WORDS = {"UPPER", "TRIM"}
+
+PAGE_SIZE = 8192   # only applies when snapshot.db is created from scratch
+
+_INTEGER_TYPES = {
+    FieldType.TINY, FieldType.SHORT, FieldType.LONG, FieldType.LONGLONG,
+    FieldType.INT24, FieldType.YEAR, FieldType.BIT,
+}
+_REAL_TYPES = {FieldType.DECIMAL, FieldType.NEWDECIMAL, FieldType.FLOAT, FieldType.DOUBLE}
+
+def sqlite_type(type_code):
+    if type_code in _INTEGER_TYPES:
+        return "INTEGER"
+    if type_code in _REAL_TYPES:
+        return "REAL"
+    return "TEXT"
+
+def to_sqlite(v):
+    """MySQL driver values -> something sqlite3 can bind."""
+    if v is None or isinstance(v, (int, float, str)):
+        return v
+    if isinstance(v, Decimal):
+        return float(v)
+    if isinstance(v, (datetime, date, dtime, timedelta)):
+        return str(v)
+    if isinstance(v, (bytes, bytearray)):
+        return bytes(v).decode("utf-8", errors="replace")
+    return str(v)
+
+def source_columns(mysql_conn, table):
+    cur = mysql_conn.cursor()
+    cur.execute(f"SELECT * FROM {table} LIMIT 0")
+    cur.fetchall()
+    cols = [(d[0], sqlite_type(d[1])) for d in cur.description]
+    cur.close()
+    return cols
+
+def source_fingerprints(mysql_conn, table, cols, part):
+    """{partition value: (row_count, checksum)} computed inside MySQL."""
+    concat = ", ".join(f"`{c}`" for c, _ in cols)
+    # a sum, not an XOR: XOR cancels identical rows in pairs, so turning one row into a
+    # copy of another (and a second into a copy of a third) would keep the checksum
+    checksum = f"SUM(CRC32(CONCAT_WS('|', {concat})))"
+    cur = mysql_conn.cursor()
+    if part:
+        cur.execute(f"SELECT `{part}`, COUNT(*), {checksum} FROM {table} GROUP BY `{part}`")
+    else:
+        cur.execute(f"SELECT NULL, COUNT(*), {checksum} FROM {table}")
+    out = {row[0]: (int(row[1]), int(row[2] or 0)) for row in cur.fetchall()}
+    cur.close()
+    return out
+
+def ensure_meta(sqlite_conn):
+    sqlite_conn.execute("""
+        CREATE TABLE IF NOT EXISTS snapshot_partitions (
+            table_name TEXT NOT NULL,
+            part       TEXT NOT NULL,
+            row_count  INTEGER,
+            checksum   INTEGER,
+            columns    TEXT,
+            copied_at  REAL,
+            PRIMARY KEY (table_name, part)
+        )
+    """)
+
+def stored_fingerprints(sqlite_conn, table):
+    rows = sqlite_conn.execute(
+        "SELECT part, row_count, checksum, columns FROM snapshot_partitions WHERE table_name = ?",
+        (table,),
+    ).fetchall()
+    return {r[0]: (r[1], r[2], r[3]) for r in rows}
+
+def create_table(sqlite_conn, table, cols):
+    ddl = ", ".join(f'"{c}" {t}' for c, t in cols)
+    sqlite_conn.execute(f'DROP TABLE IF EXISTS "{table}"')
+    sqlite_conn.execute(f'CREATE TABLE "{table}" ({ddl})')
+    sqlite_conn.execute("DELETE FROM snapshot_partitions WHERE table_name = ?", (table,))
+
+def copy_partition(mysql_conn, sqlite_conn, table, cols, part, value, fingerprint, chunk):
+    """
+    Replace one partition in snapshot.db, streaming chunk rows at a time. The rows and
+    the partition's new fingerprint commit together, so an interrupted run just
+    re-copies that partition next time.
+    """
+    names = ", ".join(f"`{c}`" for c, _ in cols)
+    insert = f'INSERT INTO "{table}" VALUES ({", ".join("?" * len(cols))})'
+
+    cur = mysql_conn.cursor()   # unbuffered: rows arrive as we fetch them
+    if part:
+        cur.execute(f"SELECT {names} FROM {table} WHERE `{part}` <=> %s", (value,))
+    else:
+        cur.execute(f"SELECT {names} FROM {table}")
+
+    copied = 0
+    sqlite_conn.execute("BEGIN")
+    try:
+        if part:
+            sqlite_conn.execute(f'DELETE FROM "{table}" WHERE "{part}" IS ?', (value,))
+        else:
+            sqlite_conn.execute(f'DELETE FROM "{table}"')
+        while True:
+            rows = cur.fetchmany(chunk)
+            if not rows:
+                break
+            sqlite_conn.executemany(insert, [tuple(to_sqlite(v) for v in r) for r in rows])
+            copied += len(rows)
+        sqlite_conn.execute(
+            "INSERT OR REPLACE INTO snapshot_partitions VALUES (?, ?, ?, ?, ?, ?)",
+            (table, str(value), *fingerprint, time()),
+        )
+        sqlite_conn.execute("COMMIT")
+    except Exception:
+        sqlite_conn.execute("ROLLBACK")
+        raise
+    finally:
+        cur.close()
+    return copied
+
+def sync_table(mysql_conn, sqlite_conn, table, *, full=False, chunk=CHUNK_ROWS):
+    """Bring one table up to date; returns a stats dict."""
+    started = time()
+    part = PARTITIONS.get(table)
+    cols = source_columns(mysql_conn, table)
+    col_sig = ",".join(f"{c}:{t}" for c, t in cols)
+
+    stored = stored_fingerprints(sqlite_conn, table)
+    exists = sqlite_conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+    ).fetchone()
+    schema_changed = any(meta[2] != col_sig for meta in stored.values())
+    if full or not exists or schema_changed or not stored:
+        create_table(sqlite_conn, table, cols)
+        stored = {}
+
+    source = source_fingerprints(mysql_conn, table, cols, part)
+    copied = changed = skipped = 0
+    for value, (count, checksum) in source.items():
+        key = str(value)
+        if key in stored and stored[key][:2] == (count, checksum):
+            skipped += 1
+            continue
+        copied += copy_partition(
+            mysql_conn, sqlite_conn, table, cols, part, value, (count, checksum, col_sig), chunk
+        )
+        changed += 1
+
+    # partitions that vanished upstream
+    live = {str(v) for v in source}
+    removed = 0
+    for key in set(stored) - live:
+        if part and key == "None":
+            sqlite_conn.execute(f'DELETE FROM "{table}" WHERE "{part}" IS NULL')
+        elif part:
+            sqlite_conn.execute(f'DELETE FROM "{table}" WHERE CAST("{part}" AS TEXT) = ?', (key,))
+        else:
+            sqlite_conn.execute(f'DELETE FROM "{table}"')
+        sqlite_conn.execute(
+            "DELETE FROM snapshot_partitions WHERE table_name = ? AND part = ?", (table, key)
+        )
+        removed += 1
+    sqlite_conn.commit()
+
+    elapsed = time() - started
+    return {
+        "table": table, "rows": copied, "partitions_copied": changed,
+        "partitions_skipped": skipped, "partitions_removed": removed,
+        "seconds": elapsed, "rows_per_sec": copied / elapsed if elapsed else 0.0,
+    }
+
+def table_columns(sqlite_conn, table):
+    return {r[1].lower() for r in sqlite_conn.execute(f'PRAGMA table_info("{table}")')}
+
+def ensure_indexes(sqlite_conn, tables):
+    """Create any declared index that is missing (tables rebuilt by --full lose theirs)."""
+    created = 0
+    for table, name, expr in INDEXES:
+        if table not in tables:
+            continue
+        cols = table_columns(sqlite_conn, table)
+        needed = {w.lower() for w in re.findall(r"[A-Za-z_]\w*", expr) if w.upper() not in _SQL_WORDS}
+        if not cols or not needed <= cols:
+            continue
+        sqlite_conn.execute(f'CREATE INDEX IF NOT EXISTS "ix_{table}_{name}" ON "{table}" ({expr})')
+        created += 1
+    return created
+
+def analyze(sqlite_conn):
+    sqlite_conn.execute("ANALYZE")
+    sqlite_conn.execute("PRAGMA optimize")
+
+# 5) Representative requests whose SQL gets an EXPLAIN QUERY PLAN check
+PLAN_CHECKS = [
+    "/api/daily_sales?region=NSW",
+    "/api/daily_sales?salesman=ALL&ship_to=200001&metric=amt",
+    "/api/daily_breakdown?group_by=salesman&category=PCLT",
+    "/api/daily_target?region=QLD",
+    "/api/monthly_sales?product_group=PCR&pattern=PCR-P1",
+    "/api/monthly_sales?sold_to_group=Group%201&top_limit=5",
+    "/api/monthly_breakdown?group_by=region&category=SUV",
+    "/api/monthly_target?category=HM",
+    "/api/yearly_sales?category=ISEG",
+    "/api/yearly_breakdown?group_by=pattern&region=VIC",
+    "/api/profit_monthly?product_group=PCR",
+    "/api/sales_map?region=WA",
+    "/api/sold_to_names?sold_to_group=Group%201",
+    "/api/ship_to_names?sold_to=SoldTo%201",
+    "/api/patterns?product_group=PCR",
+]
+
+def check_query_plans(urls=PLAN_CHECKS, path=SQLITE_PATH):
+    """
+    Drive app.py against snapshot.db (or `path`), capture every SQL statement each
+    endpoint runs and print its query plan, flagging full table scans (SCAN without
+    an index).
+    """
+    os.environ["USE_SQLITE"] = "1"
+    os.environ["SQLITE_PATH"] = path
+    import app as dashboard
+
+    captured = []
+    execute = dashboard.SQLiteCursorWrapper.execute
+    def recording_execute(self, sql, params=None):
+        captured.append((sql, params))
+        return execute(self, sql, params)
+    dashboard.SQLiteCursorWrapper.execute = recording_execute
+
+    client = dashboard.app.test_client()
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    full_scans = 0
+    try:
+        for url in urls:
+            captured.clear()
+            status = client.get(url).status_code
+            print(f"{url}  [{status}]")
+            for sql, params in captured:
+                if sql.lstrip().startswith("SELECT 1 FROM"):   # rollup existence probe
+                    continue
+                plan = conn.execute("EXPLAIN QUERY PLAN " + sql.replace("%s", "?"), params or ()).fetchall()
+                scans = [r[3] for r in plan if r[3].startswith("SCAN") and " USING " not in r[3]]
+                full_scans += len(scans)
+                verdict = "FULL SCAN: " + "; ".join(scans) if scans else "ok (index)"
+                print(f"    {verdict}")
+                for r in plan:
+                    print(f"      {r[3]}")
+    finally:
+        dashboard.SQLiteCursorWrapper.execute = execute
+        conn.close()
+    print(f"{full_scans} full scan(s) across {len(urls)} requests.")
+    return full_scans
+
+def parse_args(argv):
+    opts = {"full": False, "tables": TABLES, "chunk": CHUNK_ROWS, "plans": False, "db": SQLITE_PATH}
+    it = iter(argv)
+    for arg in it:
+        if arg == "--full":
+            opts["full"] = True
+        elif arg == "--tables":
+            opts["tables"] = [t.strip() for t in next(it).split(",") if t.strip()]
+        elif arg == "--chunk":
+            opts["chunk"] = int(next(it))
+        elif arg == "--plans":
+            opts["plans"] = True
+        elif arg == "--db":
+            opts["db"] = os.path.abspath(next(it))
+        else:
+            raise SystemExit(f"unknown argument: {arg}")
+    return opts
+
+def main(argv=None):
+    opts = parse_args(sys.argv[1:] if argv is None else argv)
+    if opts["plans"]:
+        check_query_plans(path=opts["db"])
+        return
+
     mysql_conn = mysql.connector.connect(**MYSQL_CONFIG)
-    sqlite_conn = sqlite3.connect("snapshot.db")  # created in project root
+    is_new = not os.path.exists(opts["db"])
+    sqlite_conn = sqlite3.connect(opts["db"], isolation_level=None)  # created in project root by default
+    if is_new:
+        sqlite_conn.execute(f"PRAGMA page_size={PAGE_SIZE}")   # must precede WAL
+    sqlite_conn.execute("PRAGMA journal_mode=WAL")
+    sqlite_conn.execute("PRAGMA synchronous=NORMAL")
+    ensure_meta(sqlite_conn)
+
+    changed_facts = []
+    try:
+        for table in opts["tables"]:
+            print(f"Syncing {table}...")
+            st = sync_table(mysql_conn, sqlite_conn, table, full=opts["full"], chunk=opts["chunk"])
+            print(
+                f"  {st['rows']} rows, {st['partitions_copied']} partitions copied, "
+                f"{st['partitions_skipped']} unchanged, {st['partitions_removed']} removed "
+                f"in {st['seconds']:.1f}s ({st['rows_per_sec']:.0f} rows/s)"
+            )
+            if st["partitions_copied"] or st["partitions_removed"]:
+                changed_facts.append(table)
 
-    for table in TABLES:
-        print(f"Copying {table}...")
-        df = pd.read_sql(f"SELECT * FROM {table}", mysql_conn)
-        df.to_sql(table, sqlite_conn, index=False, if_exists="replace")
+        # 4) Pre-aggregated rollups the dashboard charts read from. Dimension tables
+        #    feed every rollup, so any change there rebuilds them all.
+        facts = [t for t in ROLLUPS if t in changed_facts]
+        if any(t not in PARTITIONS for t in changed_facts):
+            facts = list(ROLLUPS)
+        if facts:
+            build_rollups(sqlite_conn, facts)
 
-    sqlite_conn.close()
-    mysql_conn.close()
-    print("Done. snapshot.db created.")
+        # 5) Indexes + planner statistics
+        print(f"Indexes: {ensure_indexes(sqlite_conn, opts['tables'])} declared indexes in place.")
+        analyze(sqlite_conn)
+    finally:
+        sqlite_conn.close()
+        mysql_conn.close()
+    print(f"Done. {opts['db']} updated.")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,168 @@
+# metrics.py
+# In-process request/query metrics for app.py, rendered in the Prometheus text format
+# at /api/_metrics. Each gunicorn worker keeps its own registry (like the pool and
+# the result cache), so a scrape sees the worker that answered it.
+#
+# Also: SQL fingerprints (literals and IN lists folded, so one endpoint's queries
+# group together whatever the filters) and fully bound SQL for the slow-query log.
+import re
+import threading
+from collections import OrderedDict
+
+# seconds; dashboard requests live between a cache hit and a cold multi-query build
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _escape(v) -> str:
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+def _num(v) -> str:
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.kind}"
+        with self._lock:
+            items = sorted(self._values.items())
+            yield from self._samples(items)
+
+    def _samples(self, items):
+        for key, v in items:
+            yield f"{self.name}{_labels(self.labelnames, key)} {_num(v)}"
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                # per-bucket counts (+Inf last), then sum
+                counts = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[len(self.buckets)] += 1
+            counts[-1] += value
+
+    def _samples(self, items):
+        for key, counts in items:
+            running = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                running += n
+                le = "+Inf" if bound == float("inf") else _num(float(bound))
+                yield f"{self.name}_bucket{_labels(self.labelnames, key, [('le', le)])} {running}"
+            yield f"{self.name}_sum{_labels(self.labelnames, key)} {_num(counts[-1])}"
+            yield f"{self.name}_count{_labels(self.labelnames, key)} {running}"
+
+class Registry:
+    def __init__(self):
+        self._metrics = OrderedDict()
+
+    def _add(self, metric):
+        return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, help, labels=()):
+        return self._add(Counter(name, help, labels))
+
+    def gauge(self, name, help, labels=()):
+        return self._add(Gauge(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, help, labels, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+# ------------------------------- SQL helpers ---------------------------------
+_COMMENT = re.compile(r"--[^\n]*")
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![\w.])\d+(?:\.\d+)?\b")
+_VALUE_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_SPACE = re.compile(r"\s+")
+_FINGERPRINTS = OrderedDict()     # sql -> fingerprint, small LRU (the same SQL repeats)
+_FINGERPRINTS_MAX = 1024
+_FINGERPRINTS_LOCK = threading.Lock()
+
+def fingerprint(sql: str) -> str:
+    """SQL with comments dropped, literals/placeholders as ?, IN lists as (?+), one line."""
+    with _FINGERPRINTS_LOCK:
+        fp = _FINGERPRINTS.get(sql)
+        if fp is not None:
+            _FINGERPRINTS.move_to_end(sql)
+            return fp
+    fp = _COMMENT.sub(" ", sql)
+    fp = _STRING.sub("?", fp)
+    fp = fp.replace("%s", "?")
+    fp = _NUMBER.sub("?", fp)
+    fp = _VALUE_LIST.sub("(?+)", fp)
+    fp = _SPACE.sub(" ", fp).strip()
+    with _FINGERPRINTS_LOCK:
+        _FINGERPRINTS[sql] = fp
+        if len(_FINGERPRINTS) > _FINGERPRINTS_MAX:
+            _FINGERPRINTS.popitem(last=False)
+    return fp
+
+def _literal(v) -> str:
+    if v is None:
+        return "NULL"
+    if isinstance(v, bool):
+        return "1" if v else "0"
+    if isinstance(v, (int, float)):
+        return repr(v)
+    if isinstance(v, bytes):
+        v = v.decode("utf-8", errors="replace")
+    return "'" + str(v).replace("'", "''") + "'"
+
+_PLACEHOLDER = re.compile(r"%s|\?")
+
+def bind_sql(sql: str, params) -> str:
+    """`sql` with its %s / ? placeholders replaced by the quoted params (for logs only)."""
+    if not params:
+        return _SPACE.sub(" ", sql).strip()
+    values = iter(params)
+    bound = _PLACEHOLDER.sub(lambda m: _literal(next(values, None)), sql)
+    return _SPACE.sub(" ", bound).strip()
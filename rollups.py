@@ -0,0 +1,196 @@
+# rollups.py
+# Pre-aggregated copies of the sales fact tables, keyed by the dashboard dimensions.
+#
+#   python rollups.py                 -> (re)build rollups inside snapshot.db (or $SQLITE_PATH)
+#   python rollups.py --db other.db   -> ... inside another SQLite file
+#   python rollups.py --mysql         -> (re)build rollups in the MySQL database
+#
+# make_sqlite_snapshot.py calls build_rollups() after copying the tables, and app.py
+# reads rollup_<fact> instead of <fact> whenever the request's filters allow it.
+import os
+import sys
+import sqlite3
+from time import time
+
+# same connection info as app.py / make_sqlite_snapshot.py
+MYSQL_CONFIG = {
+    "host": os.getenv("DB_HOST", "127.0.0.1"),
+    "port": int(os.getenv("DB_PORT", "3306")),
+    "user": os.getenv("DB_USER", "root"),
+    "password": os.getenv("DB_PASS", ""),
+    "database": os.getenv("DB_NAME", "my_new_database"),
+    "autocommit": True,
+}
+# the file app.py serves with USE_SQLITE=1; the scripts that write it default to it too
+SQLITE_PATH = os.getenv("SQLITE_PATH") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "snapshot.db")
+
+# fact table -> its period column
+ROLLUPS = {
+    "sales2025": "month",
+    "sales2510": "day",
+    "sales2124": "year",
+}
+
+def rollup_name(fact: str) -> str:
+    return f"rollup_{fact}"
+
+# (expression, alias) pairs that make up the rollup grain. The customer columns are
+# prefixed with cus_ so they can't be confused with the denormalised names on the fact.
+def _dimensions(period: str):
+    return [
+        (f"s.{period}",                                                  period),
+        ("s.ship_to",                                                    "ship_to"),
+        ("s.sold_to",                                                    "sold_to"),
+        ("s.product_group",                                              "product_group"),
+        ("s.pattern",                                                    "pattern"),
+        ("s.line",                                                       "line"),
+        ("CASE WHEN CAST(s.inch AS DECIMAL(10,2)) >= 18.0 THEN 1 ELSE 0 END", "inch18"),
+        # category tables are joined (not EXISTS) by the raw queries, so duplicates
+        # multiply rows; keep the match count and weight the sums with it
+        ("COALESCE(i.n, 0)",                                             "iseg_n"),
+        ("COALESCE(sv.n, 0)",                                            "suv_n"),
+        ("COALESCE(lp.n, 0)",                                            "lowprofile_n"),
+        ("COALESCE(hm.n, 0)",                                            "hm_n"),
+        ("cus.bde_state",                                                "cus_bde_state"),
+        ("cus.salesman_name",                                            "cus_salesman_name"),
+        ("UPPER(TRIM(cus.salesman_name))",                               "cus_salesman_key"),
+        ("cus.sold_to_group",                                            "cus_sold_to_group"),
+        ("cus.sold_to_name",                                             "cus_sold_to_name"),
+    ]
+
+def category_joins(alias: str) -> str:
+    """customer + category match-count joins for a fact aliased as `alias`."""
+    return f"""
+  LEFT JOIN customer cus ON cus.ship_to = {alias}.ship_to
+  LEFT JOIN (SELECT CAST(TRIM(Material) AS UNSIGNED) AS k, COUNT(*) AS n
+               FROM iseg GROUP BY CAST(TRIM(Material) AS UNSIGNED)) i ON i.k = {alias}.material
+  LEFT JOIN (SELECT Pattern AS k, COUNT(*) AS n
+               FROM suv GROUP BY Pattern) sv ON sv.k = {alias}.pattern
+  LEFT JOIN (SELECT CAST(TRIM(Material) AS UNSIGNED) AS k, COUNT(*) AS n
+               FROM lowprofile GROUP BY CAST(TRIM(Material) AS UNSIGNED)) lp ON lp.k = {alias}.material
+  LEFT JOIN (SELECT Sold_To AS k, COUNT(*) AS n
+               FROM HM GROUP BY Sold_To) hm ON hm.k = {alias}.sold_to
+"""
+
+_INDEXES = [
+    ("period",  "{period}"),
+    ("region",  "cus_bde_state, {period}"),
+    ("ship_to", "ship_to"),
+    ("group",   "cus_sold_to_group, cus_sold_to_name"),
+    ("product", "product_group, pattern"),
+]
+
+def _is_sqlite(conn) -> bool:
+    return isinstance(conn, sqlite3.Connection)
+
+def select_sql(fact: str, period: str) -> str:
+    """The rollup's defining query (also used by the columnar engine to load facts)."""
+    dims = _dimensions(period)
+    select = ",\n       ".join(f"{expr} AS {alias}" for expr, alias in dims)
+    group = ", ".join(expr for expr, _ in dims)
+    return f"""
+SELECT {select},
+       SUM(s.qty) AS qty,
+       SUM(s.amt) AS amt,
+       COUNT(*)   AS n_rows
+  FROM {fact} s
+  {category_joins("s")}
+ GROUP BY {group}
+"""
+
+def build_sql(fact: str, period: str, target: str) -> str:
+    return f"CREATE TABLE {target} AS {select_sql(fact, period)}"
+
+def _ensure_meta(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS rollup_meta (
+            rollup_table VARCHAR(64) PRIMARY KEY,
+            source_table VARCHAR(64),
+            source_rows  BIGINT,
+            rollup_rows  BIGINT,
+            built_at     DOUBLE
+        )
+    """)
+
+def _create_indexes(cur, table: str, period: str):
+    for suffix, cols in _INDEXES:
+        try:
+            cur.execute(f"CREATE INDEX ix_{table}_{suffix} ON {table} ({cols.format(period=period)})")
+        except Exception as e:
+            # MySQL refuses un-prefixed TEXT keys; the rollup is still much smaller than the fact
+            print(f"  index {suffix} on {table} skipped: {e}")
+
+def build_rollup(conn, fact: str):
+    """Rebuild rollup_<fact> next to the live one, then swap it in."""
+    period = ROLLUPS[fact]
+    name = rollup_name(fact)
+    tmp = f"{name}_new"
+    mark = "?" if _is_sqlite(conn) else "%s"
+    started = time()
+
+    cur = conn.cursor()
+    cur.execute(f"DROP TABLE IF EXISTS {tmp}")
+    cur.execute(build_sql(fact, period, tmp))
+
+    cur.execute(f"SELECT COUNT(*) FROM {fact}")
+    source_rows = cur.fetchone()[0]
+    cur.execute(f"SELECT COUNT(*) FROM {tmp}")
+    rollup_rows = cur.fetchone()[0]
+
+    if _is_sqlite(conn):
+        # index names are database-wide in sqlite, so index after the swap,
+        # inside the same transaction readers are waiting on
+        conn.commit()
+        cur.execute("BEGIN")
+        cur.execute(f"DROP TABLE IF EXISTS {name}")
+        cur.execute(f"ALTER TABLE {tmp} RENAME TO {name}")
+        _create_indexes(cur, name, period)
+    else:
+        _create_indexes(cur, tmp, period)
+        cur.execute(f"DROP TABLE IF EXISTS {name}_old")
+        cur.execute(f"CREATE TABLE IF NOT EXISTS {name} LIKE {tmp}")
+        cur.execute(f"RENAME TABLE {name} TO {name}_old, {tmp} TO {name}")
+        cur.execute(f"DROP TABLE {name}_old")
+
+    _ensure_meta(cur)
+    cur.execute(f"DELETE FROM rollup_meta WHERE rollup_table = {mark}", (name,))
+    cur.execute(
+        f"INSERT INTO rollup_meta (rollup_table, source_table, source_rows, rollup_rows, built_at) "
+        f"VALUES ({mark}, {mark}, {mark}, {mark}, {mark})",
+        (name, fact, source_rows, rollup_rows, time()),
+    )
+    conn.commit()
+    cur.close()
+
+    ratio = source_rows / rollup_rows if rollup_rows else 0
+    print(f"  {name}: {source_rows} -> {rollup_rows} rows ({ratio:.1f}x) in {time() - started:.1f}s")
+    return rollup_rows
+
+def build_rollups(conn, facts=None):
+    for fact in facts or ROLLUPS:
+        print(f"Rolling up {fact}...")
+        build_rollup(conn, fact)
+
+def db_arg(argv, default=SQLITE_PATH):
+    """The SQLite file named by --db PATH in argv, else `default`."""
+    if "--db" not in argv:
+        return default
+    i = argv.index("--db")
+    if i + 1 >= len(argv):
+        raise SystemExit("--db needs a path")
+    return os.path.abspath(argv[i + 1])
+
+def main():
+    if "--mysql" in sys.argv[1:]:
+        import mysql.connector
+        conn = mysql.connector.connect(**MYSQL_CONFIG)
+    else:
+        conn = sqlite3.connect(db_arg(sys.argv[1:]))
+    try:
+        build_rollups(conn)
+    finally:
+        conn.close()
+    print("Done. Rollups rebuilt.")
+
+if __name__ == "__main__":
+    main()
@@ -449,6 +449,37 @@ async function refreshPatterns(){
 
 
 
+/* -------------------------- batched dashboard -------------------------- */
+// One /api/dashboard call per refresh returns every chart panel for the current
+// filters; the fetchXxx() helpers below read from it and only fall back to their
+// own endpoint when the batch is missing, stale or reported an error for that panel.
+const DASH_PANELS = [
+  "daily_sales", "daily_target", "daily_breakdown",
+  "monthly_sales", "monthly_target", "monthly_breakdown",
+  "yearly_sales", "yearly_breakdown", "profit_monthly"
+];
+let DASH = null;   // { key, panels }
+
+function dashKey(){
+  return new URLSearchParams({
+    metric:filters.metric, category:filters.category, region:filters.region, salesman:filters.salesman,
+    sold_to_group:filters.sold_to_group, sold_to:filters.sold_to, ship_to:filters.ship_to,
+    product_group:filters.product_group, pattern:filters.pattern,
+    group_by:filters.group_by, top_limit:filters.top_limit ||0
+  }).toString();
+}
+
+async function loadDashboard(){
+  const key = dashKey();
+  const doc = await fetchJSON(`/api/dashboard?${key}&panels=${DASH_PANELS.join(",")}`);
+  DASH = (doc && doc.panels) ? { key, panels: doc.panels } : null;
+}
+
+function dashPanel(name, url){
+  const rows = DASH && DASH.key === dashKey() ? DASH.panels[name] : null;
+  return rows ? Promise.resolve(rows) : fetchJSON(url);
+}
+
 /* -------------------------- daily (Oct) – same structure as monthly -------------------------- */
 
 async function fetchDailySales(){
@@ -457,7 +488,7 @@ async function fetchDailySales(){
     sold_to_group:filters.sold_to_group, sold_to:filters.sold_to, ship_to:filters.ship_to,
     product_group:filters.product_group, pattern:filters.pattern, top_limit:filters.top_limit ||0
   }).toString();
-  return fetchJSON(`/api/daily_sales?${qs}`);
+  return dashPanel("daily_sales", `/api/daily_sales?${qs}`);
 }
 
 async function fetchDailyKPIActual(region,BDE){
@@ -484,7 +515,7 @@ async function fetchDailyBreakdownWithGroup(groupBy){
     sold_to_group:filters.sold_to_group, sold_to:filters.sold_to, ship_to:filters.ship_to,
     product_group:filters.product_group, pattern:filters.pattern, group_by: groupBy, top_limit:filters.top_limit ||0
   }).toString();
-  return fetchJSON(`/api/daily_breakdown?${qs}`);
+  return dashPanel("daily_breakdown", `/api/daily_breakdown?${qs}`);
 }
 
 
@@ -492,7 +523,7 @@ async function fetchDailyBreakdownWithGroup(groupBy){
 async function drawDailyTotals(){
   const [salesRows,targetRows]=await Promise.all([
     fetchDailySales(),
-    fetchJSON(`/api/daily_target?${new URLSearchParams({
+    dashPanel("daily_target", `/api/daily_target?${new URLSearchParams({
       metric:filters.metric, category:filters.category, region:filters.region, salesman:filters.salesman,
       sold_to_group:filters.sold_to_group, sold_to:filters.sold_to, ship_to:filters.ship_to,
       product_group:filters.product_group, pattern:filters.pattern, top_limit:filters.top_limit ||0
@@ -664,77 +695,32 @@ async function fetchMonthlySales(){
     sold_to_group:filters.sold_to_group, sold_to:filters.sold_to, ship_to:filters.ship_to,
     product_group:filters.product_group, pattern:filters.pattern, top_limit:filters.top_limit ||0
   }).toString();
-  return fetchJSON(`/api/monthly_sales?'${qs}`);
+  return dashPanel("monthly_sales", `/api/monthly_sales?${qs}`);
 }
 
-// helpers
-const quarterOf = m => Math.floor(m/3); // 0..3 for Jan..Dec
-function kpiByQuarter(sales, targets){
-  const s=[0,0,0,0], t=[0,0,0,0];
-  for (let m=0;m<12;m++){ const q=quarterOf(m); s[q]+=+sales[m]||0; t[q]+=+targets[m]||0; }
-  return t.map((tv,i)=> tv>0 ? +(s[i]/tv*100).toFixed(1) : null); // [%]
-}
-
-async function fetchMonthlyKPIActual(region,BDE){
-  const qs=new URLSearchParams({
-    metric:filters.metric, category:filters.category, region:region, salesman:BDE,
-    sold_to_group:filters.sold_to_group, sold_to:filters.sold_to, ship_to:filters.ship_to,
-    product_group:filters.product_group, pattern:filters.pattern, top_limit:filters.top_limit ||0
-  }).toString();
-  return fetchJSON(`/api/monthly_sales?${qs}`);
-}
-async function fetchMonthlyKPITarget(region,BDE){
+// one grouped request for the whole table (All row + every region/BDE)
+async function fetchKPIByRegion(){
   const qs=new URLSearchParams({
-    metric:filters.metric, category:filters.category, region:region, salesman:BDE,
+    metric:filters.metric, category:filters.category,
     sold_to_group:filters.sold_to_group, sold_to:filters.sold_to, ship_to:filters.ship_to,
     product_group:filters.product_group, pattern:filters.pattern, top_limit:filters.top_limit ||0
   }).toString();
-  return fetchJSON(`/api/monthly_target?${qs}`);
+  return fetchJSON(`/api/kpi_by_region?${qs}`);
 }
 
 // build & render table
 async function drawMonthlyKPI(){
-  const rows = [];
-
-  // All row (no region/salesman filter)
-  {
-    const qsSales = new URLSearchParams({
-      metric: filters.metric, category: filters.category, region: "ALL", salesman:"ALL",
-      sold_to_group: filters.sold_to_group, sold_to: filters.sold_to, ship_to: filters.ship_to,
-      product_group: filters.product_group, pattern: filters.pattern, top_limit:filters.top_limit ||0
-    }).toString();
-    const qsTarget = new URLSearchParams({
-      metric: filters.metric,
-      category: filters.category, region: "ALL", salesman:"ALL",
-      sold_to_group: filters.sold_to_group, sold_to: filters.sold_to, ship_to: filters.ship_to,
-      product_group: filters.product_group, pattern: filters.pattern, top_limit:filters.top_limit ||0
-    }).toString();
-
-    const [salesRows, targetRows] = await Promise.all([
-      fetchJSON(`/api/monthly_sales?${qsSales}`),
-      fetchJSON(`/api/monthly_target?${qsTarget}`)
-    ]);
-    const sales   = salesRows.map(r => +r.value || 0);
-    const targets = targetRows.map(r => +r.value || 0);
-    const q = kpiByQuarter(sales, targets);
-    rows.push({ region: "All", Q1: q[0], Q2: q[1], Q3: q[2], Q4: q[3] });
-  }
+  const kpi = await fetchKPIByRegion();
+  const none = { Q1:null, Q2:null, Q3:null, Q4:null };
+  const rows = [{ region: "All", ...(kpi.all || none) }];
 
-  // Region / BDE rows
+  // Region / BDE rows, in REGION_SALESMEN order; BDEs are keyed UPPER(TRIM(name))
   for (const region of ["NSW","QLD","VIC","WA"]) {
-    const bdes = REGION_SALESMEN[region] || []; // e.g. ["BDE2","BDE3"] or ids
-    // fetch each BDE pair in parallel, then append in order
-    const perBDE = await Promise.all(bdes.map(async (bde) => {
-      const [salesRows, targetRows] = await Promise.all([
-        fetchMonthlyKPIActual(region, bde),
-        fetchMonthlyKPITarget(region, bde)
-      ]);
-      const sales   = salesRows.map(r => +r.value || 0);
-      const targets = targetRows.map(r => +r.value || 0);
-      const q = kpiByQuarter(sales, targets);
-      return { region: `${region}` , bde:`${bde}`, Q1: q[0], Q2: q[1], Q3: q[2], Q4: q[3] };
-    }));
-    rows.push(...perBDE);
+    const byBDE = (kpi.regions || {})[region] || {};
+    for (const bde of REGION_SALESMEN[region] || []) {
+      const q = byBDE[String(bde).trim().toUpperCase()] || none;
+      rows.push({ region: `${region}`, bde: `${bde}`, Q1: q.Q1, Q2: q.Q2, Q3: q.Q3, Q4: q.Q4 });
+    }
   }
 
   // render table
@@ -794,13 +780,13 @@ async function fetchMonthlyBreakdownWithGroup(groupBy){
     product_group:filters.product_group, pattern:filters.pattern, group_by: groupBy, top_limit:filters.top_limit ||0
   };
   const qs=new URLSearchParams(params).toString();
-  return fetchJSON(`/api/monthly_breakdown?${qs}`);
+  return dashPanel("monthly_breakdown", `/api/monthly_breakdown?${qs}`);
 }
 
 async function drawMonthlyTotals(){
   const [salesRows,targetRows]=await Promise.all([
     fetchMonthlySales(),
-    fetchJSON(`/api/monthly_target?${new URLSearchParams({
+    dashPanel("monthly_target", `/api/monthly_target?${new URLSearchParams({
       metric:filters.metric, category:filters.category, region:filters.region, salesman:filters.salesman,
       sold_to_group:filters.sold_to_group, sold_to:filters.sold_to, ship_to:filters.ship_to,
       product_group:filters.product_group, pattern:filters.pattern, top_limit:filters.top_limit ||0
@@ -955,7 +941,7 @@ async function fetchYearlySales() {
     pattern:       filters.pattern,
     top_limit:filters.top_limit ||0
   }).toString();
-  return fetchJSON(`/api/yearly_sales?${qs}`);
+  return dashPanel("yearly_sales", `/api/yearly_sales?${qs}`);
 }
 
 async function fetchYearlyBreakdownWithGroup(groupBy) {
@@ -972,7 +958,7 @@ async function fetchYearlyBreakdownWithGroup(groupBy) {
     top_limit:filters.top_limit ||0,
     group_by:      groupBy
   }).toString();
-  return fetchJSON(`/api/yearly_breakdown?${qs}`);
+  return dashPanel("yearly_breakdown", `/api/yearly_breakdown?${qs}`);
 }
 
 
@@ -1311,7 +1297,7 @@ async function loadProfit() {
     top_limit:filters.top_limit ||0
   }).toString();
 
-  const rows = await fetchJSON(`/api/profit_monthly?${qs}`);
+  const rows = await dashPanel("profit_monthly", `/api/profit_monthly?${qs}`);
   renderProfitCombined(Array.isArray(rows) ? rows : []);
 }
 
@@ -1319,6 +1305,7 @@ async function loadProfit() {
 
 
 async function refreshAllWithKpi(){
+  await loadDashboard();
   await drawDailyTotals(),          // now uses October data internally
   await drawDailyStacked(),
   await drawMonthlyKPI();
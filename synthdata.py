@@ -0,0 +1,254 @@
+# synthdata.py
+# Synthetic snapshot.db for benchmarking: the tables app.py reads (same columns and
+# types as make_sqlite_snapshot.py copies from MySQL), filled with deterministic,
+# skewed data, then indexed and rolled up exactly like a real snapshot.
+#
+#   python synthdata.py                          -> synthetic.db with 100k fact rows
+#   python synthdata.py --rows 5000000           -> total rows across the three sales facts
+#   python synthdata.py --customers 2000         -> ship-tos (default scales with --rows)
+#   python synthdata.py --seed 7                 -> another (still reproducible) data set
+#   python synthdata.py --out snapshot.db        -> write somewhere else
+#
+# Rows are generated and inserted in chunks, so memory stays flat from 10k to 50M
+# rows. The file is built as <out>.part and moved into place when complete; app.py
+# picks the new file up on its next request (SQLITE_PATH=<out> when it isn't
+# snapshot.db). bench.py drives the API against it.
+#
+# The shape follows production: a few customers and materials carry most of the
+# volume (Zipf), October days and months are seasonal, TBR is its own line, and
+# the category tables overlap the facts (iSeg / low-profile materials, SUV
+# patterns, HM sold-tos). Dirty values the app has to cope with are kept too:
+# salesman names with trailing blanks, category materials with leading blanks and
+# customers without coordinates.
+import os
+import sys
+import random
+import sqlite3
+from itertools import accumulate
+from time import time
+
+from make_sqlite_snapshot import PAGE_SIZE, ensure_indexes, analyze
+from rollups import build_rollups
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+OUT_FILE = os.path.join(BASE_DIR, "synthetic.db")
+FACT_ROWS = 100000
+CHUNK_ROWS = 50000
+
+# same columns/types as the MySQL-copied snapshot
+SCHEMA = {
+    "customer": "ship_to TEXT, ship_to_name TEXT, sold_to TEXT, sold_to_name TEXT, sold_to_group TEXT, "
+                "bde_state TEXT, salesman_name TEXT, latitude REAL, longitude REAL",
+    "sales2025": "month INTEGER, ship_to TEXT, ship_to_name TEXT, sold_to TEXT, sold_to_name TEXT, "
+                 "sold_to_group TEXT, material INTEGER, product_group TEXT, pattern TEXT, line TEXT, "
+                 "inch TEXT, qty REAL, amt REAL",
+    "sales2510": "day INTEGER, ship_to TEXT, ship_to_name TEXT, sold_to TEXT, sold_to_name TEXT, "
+                 "sold_to_group TEXT, material INTEGER, product_group TEXT, pattern TEXT, line TEXT, "
+                 "inch TEXT, qty REAL, amt REAL",
+    "sales2124": "year INTEGER, ship_to TEXT, ship_to_name TEXT, sold_to TEXT, sold_to_name TEXT, "
+                 "sold_to_group TEXT, material INTEGER, product_group TEXT, pattern TEXT, line TEXT, "
+                 "inch TEXT, qty REAL, amt REAL",
+    "target2025": "month INTEGER, ship_to TEXT, line TEXT, special TEXT, qty REAL, amt REAL",
+    "profit": "Month TEXT, ship_to TEXT, sold_to TEXT, material INTEGER, pattern TEXT, line TEXT, "
+              "inch TEXT, Gross REAL, Sales_Deduction REAL, COGS REAL, Op_Cost REAL",
+    "carrying_july": "M_CODE INTEGER, Product_Group TEXT, Pattern TEXT",
+    "iseg": "Material TEXT",
+    "lowprofile": "Material TEXT",
+    "suv": "Pattern TEXT",
+    "HM": "Sold_To TEXT",
+}
+
+# share of --rows per sales fact, and the period each is partitioned on
+FACTS = {
+    "sales2025": ("month", 0.4, list(range(1, 13))),
+    "sales2510": ("day",   0.2, list(range(1, 32))),
+    "sales2124": ("year",  0.4, [2021, 2022, 2023, 2024]),
+}
+MONTH_WEIGHTS = [0.8, 0.8, 1.0, 1.0, 1.1, 1.0, 0.9, 1.0, 1.1, 1.2, 1.3, 1.4]
+YEAR_WEIGHTS = [0.85, 0.95, 1.0, 1.1]
+
+# state -> (share of customers, salesmen, [(lat, lng) of the towns customers sit around])
+STATES = {
+    "NSW": (0.30, 6, [(-33.87, 151.21), (-32.93, 151.78), (-34.42, 150.89), (-35.28, 149.13)]),
+    "VIC": (0.27, 6, [(-37.81, 144.96), (-38.15, 144.36), (-37.56, 143.85)]),
+    "QLD": (0.23, 6, [(-27.47, 153.03), (-28.02, 153.40), (-19.26, 146.82), (-16.92, 145.77)]),
+    "WA":  (0.20, 5, [(-31.95, 115.86), (-32.05, 115.75), (-20.31, 118.58)]),
+}
+PRODUCT_GROUPS = ["PCR", "SUV", "LTR", "TBR"]
+PATTERNS_PER_GROUP = 5
+INCHES = ["14", "15", "16", "17", "18", "19", "20"]
+SPECIALS = ["", "HM", "HighInch", "SUV", "iSeg"]
+
+def zipf_weights(n, s=0.9):
+    """Cumulative weights where item i is 1/(i+1)^s as likely as the first."""
+    return list(accumulate(1.0 / (i + 1) ** s for i in range(n)))
+
+# ------------------------------ dimensions -----------------------------------
+def make_customers(rng, n):
+    n_sold_to = max(1, n // 3)
+    n_groups = max(5, n_sold_to // 7)
+    states = list(STATES)
+    state_cum = list(accumulate(STATES[s][0] for s in states))
+    rows = []
+    for i in range(n):
+        sold = rng.randrange(n_sold_to) if i >= n_sold_to else i    # every sold-to has a ship-to
+        state = rng.choices(states, cum_weights=state_cum)[0]
+        _, salesmen, towns = STATES[state]
+        salesman = f"{state} BDE {rng.randint(1, salesmen)}"
+        if rng.random() < 0.05:
+            salesman += " "
+        lat = lng = None
+        if rng.random() < 0.9:
+            town_lat, town_lng = rng.choice(towns)
+            lat, lng = rng.gauss(town_lat, 0.4), rng.gauss(town_lng, 0.4)
+        rows.append((str(200000 + i), f"Ship {i}", str(1000 + sold), f"SoldTo {sold}",
+                     f"Group {sold % n_groups}", state, salesman, lat, lng))
+    return rows
+
+def make_materials(rng):
+    """[(material, product_group, pattern, line, inch, unit price)]."""
+    out = []
+    material = 100
+    for pg in PRODUCT_GROUPS:
+        for p in range(PATTERNS_PER_GROUP):
+            for _ in range(rng.randint(2, 5)):
+                price = rng.uniform(250, 900) if pg == "TBR" else rng.uniform(60, 320)
+                out.append((material, pg, f"{pg}-P{p}", "TBR" if pg == "TBR" else "PCLT",
+                            rng.choice(INCHES), price))
+                material += 1
+    rng.shuffle(out)       # popularity (position) independent of product group
+    return out
+
+def category_rows(rng, materials, customers):
+    non_tbr = [m[0] for m in materials if m[3] == "PCLT"]
+    iseg = rng.sample(non_tbr, min(20, len(non_tbr)))
+    lowprofile = rng.sample([m for m in non_tbr if m not in iseg], min(10, len(non_tbr) - len(iseg)))
+    sold_tos = sorted({c[2] for c in customers})
+    return {
+        "carrying_july": [(m[0], m[1], m[2]) for m in sorted(materials)],
+        # the source sheets pad some codes; the app compares CAST(TRIM(Material))
+        "iseg": [(f" {m}" if k % 2 else str(m),) for k, m in enumerate(iseg)],
+        "lowprofile": [(str(m),) for m in lowprofile],
+        "suv": [(f"SUV-P{p}",) for p in range(PATTERNS_PER_GROUP)],
+        "HM": [(s,) for s in rng.sample(sold_tos, min(20, len(sold_tos)))],
+    }
+
+# ---------------------------------- facts ------------------------------------
+def fact_rows(rng, n, periods, period_cum, customers, cust_cum, materials, mat_cum):
+    """n sales rows, generated CHUNK_ROWS at a time."""
+    done = 0
+    while done < n:
+        k = min(CHUNK_ROWS, n - done)
+        cs = rng.choices(customers, cum_weights=cust_cum, k=k)
+        ms = rng.choices(materials, cum_weights=mat_cum, k=k)
+        ps = rng.choices(periods, cum_weights=period_cum, k=k)
+        batch = []
+        for c, m, p in zip(cs, ms, ps):
+            qty = float(rng.choice((1, 1, 2, 2, 4, 4, 4, 5, 8, 10, 12, 20, 40)))
+            batch.append((p, c[0], c[1], c[2], c[3], c[4], m[0], m[1], m[2], m[3], m[4],
+                          qty, round(qty * m[5] * rng.uniform(0.85, 1.1), 2)))
+        yield batch
+        done += k
+
+def target_rows(rng, n, customers, cust_cum):
+    done = 0
+    while done < n:
+        k = min(CHUNK_ROWS, n - done)
+        batch = []
+        for c in rng.choices(customers, cum_weights=cust_cum, k=k):
+            line = "TBR" if rng.random() < 0.3 else "PCLT"
+            special = "" if line == "TBR" else rng.choice(SPECIALS)
+            qty = float(rng.randint(4, 120))
+            batch.append((rng.randint(1, 12), c[0], line, special, qty,
+                          round(qty * rng.uniform(80, 400), 2)))
+        yield batch
+        done += k
+
+def profit_rows(rng, n, customers, cust_cum, materials, mat_cum):
+    done = 0
+    while done < n:
+        k = min(CHUNK_ROWS, n - done)
+        cs = rng.choices(customers, cum_weights=cust_cum, k=k)
+        ms = rng.choices(materials, cum_weights=mat_cum, k=k)
+        batch = []
+        for c, m in zip(cs, ms):
+            gross = round(m[5] * rng.randint(1, 20), 2)
+            batch.append((str(rng.randint(1, 12)), c[0], c[2], m[0], m[2], m[3], m[4], gross,
+                          round(gross * rng.uniform(0.02, 0.08), 2),
+                          round(gross * rng.uniform(0.55, 0.8), 2),
+                          round(gross * rng.uniform(0.03, 0.1), 2)))
+        yield batch
+        done += k
+
+# --------------------------------- build -------------------------------------
+def insert(conn, table, batches):
+    sql = f'INSERT INTO "{table}" VALUES ({", ".join("?" * len(SCHEMA[table].split(",")))})'
+    n = 0
+    for batch in batches:
+        conn.executemany(sql, batch)
+        n += len(batch)
+    return n
+
+def generate(out=OUT_FILE, rows=FACT_ROWS, customers=None, seed=1):
+    started = time()
+    rng = random.Random(seed)
+    if customers is None:
+        customers = min(20000, max(300, rows // 1000))
+    part = out + ".part"
+    for path in (part, part + "-wal", part + "-shm"):
+        if os.path.exists(path):
+            os.remove(path)
+
+    conn = sqlite3.connect(part, isolation_level=None)
+    conn.execute(f"PRAGMA page_size={PAGE_SIZE}")
+    conn.execute("PRAGMA journal_mode=OFF")      # scratch file until it is moved into place
+    conn.execute("PRAGMA synchronous=OFF")
+    try:
+        for table, cols in SCHEMA.items():
+            conn.execute(f'CREATE TABLE "{table}" ({cols})')
+
+        cust = make_customers(rng, customers)
+        mats = make_materials(rng)
+        rng.shuffle(cust)          # big customers spread over states/groups
+        cust_cum, mat_cum = zipf_weights(len(cust)), zipf_weights(len(mats), 1.1)
+
+        conn.execute("BEGIN")
+        insert(conn, "customer", [sorted(cust, key=lambda c: int(c[0]))])
+        for table, values in category_rows(rng, mats, cust).items():
+            insert(conn, table, [values])
+        for fact, (period, share, periods) in FACTS.items():
+            weights = {"month": MONTH_WEIGHTS, "year": YEAR_WEIGHTS}.get(period)
+            if weights is None:    # October days: weekends (4, 5, 11, 12, ...) are quiet
+                weights = [0.35 if d % 7 in (4, 5) else 1.0 for d in periods]
+            n = insert(conn, fact, fact_rows(rng, int(rows * share), periods, list(accumulate(weights)),
+                                             cust, cust_cum, mats, mat_cum))
+            print(f"  {fact}: {n} rows")
+        n_small = max(1000, rows // 16)
+        print(f"  target2025: {insert(conn, 'target2025', target_rows(rng, n_small, cust, cust_cum))} rows")
+        print(f"  profit: {insert(conn, 'profit', profit_rows(rng, n_small, cust, cust_cum, mats, mat_cum))} rows")
+        conn.execute("COMMIT")
+        print(f"  {len(cust)} customers, {len(mats)} materials ({time() - started:.1f}s)")
+
+        print(f"Indexes: {ensure_indexes(conn, list(SCHEMA) + ['hm'])} declared indexes in place.")
+        build_rollups(conn)
+        analyze(conn)
+        conn.execute("PRAGMA journal_mode=WAL")
+    finally:
+        conn.close()
+    os.replace(part, out)
+    print(f"Done. {out} written in {time() - started:.1f}s.")
+
+def parse_args(argv):
+    opts = {"out": OUT_FILE, "rows": FACT_ROWS, "customers": None, "seed": 1}
+    it = iter(argv)
+    for arg in it:
+        if arg == "--out":
+            opts["out"] = os.path.abspath(next(it))
+        elif arg in ("--rows", "--customers", "--seed"):
+            opts[arg[2:]] = int(float(next(it)))    # --rows 5e6 works too
+        else:
+            raise SystemExit(f"unknown argument: {arg}")
+    return opts
+
+if __name__ == "__main__":
+    generate(**parse_args(sys.argv[1:]))
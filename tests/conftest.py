@@ -0,0 +1,34 @@
+# tests/conftest.py
+# Shared fixtures: a small synthdata.py snapshot and app.py served from it.
+#
+#   pip install pytest numpy && python -m pytest -q
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SYNTH_ROWS = 20000
+
+@pytest.fixture(scope="session")
+def synthetic_db(tmp_path_factory):
+    """Path of a synthdata.py snapshot (fixed seed), built once per test session."""
+    import synthdata
+    path = str(tmp_path_factory.mktemp("snapshot") / "synthetic.db")
+    synthdata.generate(out=path, rows=SYNTH_ROWS, seed=1)
+    return path
+
+@pytest.fixture(scope="session")
+def dashboard(synthetic_db):
+    """app.py on SQLite against the synthetic snapshot, with a per-worker memory cache."""
+    os.environ.update({
+        "USE_SQLITE": "1",
+        "SQLITE_PATH": synthetic_db,
+        "CACHE_BACKEND": "memory",
+        "SLOW_QUERY_MS": "-1",
+    })
+    import app
+    assert app.SQLITE_PATH == synthetic_db, "app.py was imported before the fixture set SQLITE_PATH"
+    return app
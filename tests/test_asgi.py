@@ -0,0 +1,114 @@
+# tests/test_asgi.py
+# asgi.py driven directly with ASGI messages: flight buffering, disconnects, and
+# which cache hits are answered on the event loop.
+import asyncio
+import gzip
+
+import pytest
+
+@pytest.fixture
+def asgi(dashboard, monkeypatch):
+    import asgi
+    monkeypatch.setattr(dashboard, "STREAM_CHUNK_ROWS", 1)      # one chunk per row
+    monkeypatch.setattr(asgi, "ASGI_FLIGHT_BUFFER", 4)
+    monkeypatch.setattr(asgi, "_SLOTS", None)                    # made on each test's loop
+    return asgi
+
+@pytest.fixture(scope="module")
+def client(dashboard):
+    return dashboard.app.test_client()
+
+class Client:
+    """One ASGI connection; `gate` paces its body chunks, `gone` disconnects it."""
+    def __init__(self, asgi, path, query=b"", headers=(), paced=False):
+        self.asgi, self.path, self.query, self.headers = asgi, path, query, list(headers)
+        self.gate = asyncio.Semaphore(0) if paced else None
+        self.gone = asyncio.Event()
+        self.messages = []
+        self._requested = False
+
+    async def receive(self):
+        if not self._requested:
+            self._requested = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await self.gone.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(self, message):
+        if message["type"] == "http.response.body" and self.gate is not None:
+            await self.gate.acquire()
+        self.messages.append(message)
+
+    def run(self):
+        scope = {"type": "http", "method": "GET", "path": self.path, "query_string": self.query,
+                 "headers": self.headers, "http_version": "1.1"}
+        return asyncio.get_running_loop().create_task(self.asgi.app(scope, self.receive, self.send))
+
+    @property
+    def headers_sent(self):
+        return dict(self.messages[0]["headers"])
+
+    @property
+    def body(self):
+        return b"".join(m.get("body", b"") for m in self.messages[1:])
+
+def test_slow_client_holds_back_the_thread(asgi):
+    async def scenario():
+        client = Client(asgi, "/api/sales_map", b"format=ndjson&t=slow", paced=True)
+        task = client.run()
+        peak = 0
+        for _ in range(30):
+            await asyncio.sleep(0.02)
+            peak = max([peak] + [len(f.chunks) for f in asgi._FLIGHTS.values()])
+            client.gate.release()
+        assert 0 < peak <= asgi.ASGI_FLIGHT_BUFFER
+        assert asgi.asgi_stats()["running"] == 1
+
+        abandoned = asgi.asgi_stats()["abandoned"]
+        client.gone.set()
+        for _ in range(100):
+            await asyncio.sleep(0.02)
+            if asgi.asgi_stats()["running"] == 0:
+                break
+        assert asgi.asgi_stats()["abandoned"] == abandoned + 1
+        assert asgi.asgi_stats()["running"] == 0 and not asgi._FLIGHTS
+        task.cancel()
+    asyncio.run(scenario())
+
+def test_shared_flight_survives_one_client_leaving(asgi, client):
+    async def scenario():
+        stays = Client(asgi, "/api/sales_map", b"format=ndjson&t=shared")
+        leaves = Client(asgi, "/api/sales_map", b"format=ndjson&t=shared", paced=True)
+        shared = asgi.asgi_stats()["shared"]
+        tasks = [stays.run(), leaves.run()]
+        await asyncio.sleep(0.05)
+        leaves.gone.set()
+        await asyncio.wait_for(tasks[0], 20)
+        assert asgi.asgi_stats()["shared"] == shared + 1
+        tasks[1].cancel()
+        return stays.body
+    body = asyncio.run(scenario())
+    assert body == client.get("/api/sales_map?format=ndjson&t=shared").data
+
+def test_big_compressed_hits_are_encoded_off_the_loop(asgi, client):
+    gzip_ok = [(b"accept-encoding", b"gzip")]
+
+    async def get(path, headers=()):
+        c = Client(asgi, path, headers=headers)
+        before = asgi.asgi_stats()["inline"]
+        await c.run()
+        return c, asgi.asgi_stats()["inline"] - before
+
+    async def scenario():
+        plain = client.get("/api/sales_map").data          # cached now
+        assert len(plain) > asgi.ASGI_INLINE_COMPRESS_MAX
+        big, inline = await get("/api/sales_map", gzip_ok)
+        assert inline == 0 and big.headers_sent[b"content-encoding"] == b"gzip"
+        assert gzip.decompress(big.body) == plain
+        _, inline = await get("/api/sales_map")
+        assert inline == 1                                  # nothing to encode
+
+        client.get("/api/monthly_sales", headers={"Accept-Encoding": "gzip"})
+        _, inline = await get("/api/monthly_sales", gzip_ok)
+        assert inline == 1                                  # small enough for the loop
+    asyncio.run(scenario())
@@ -0,0 +1,102 @@
+# tests/test_cache.py
+# The node-wide SQLiteCache backend, and the data version in every cache key.
+import datetime
+import shutil
+import sqlite3
+from decimal import Decimal
+
+import pytest
+
+class Clock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(dashboard, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(dashboard, "time", clock)
+    return clock
+
+@pytest.fixture
+def cache(dashboard, tmp_path):
+    return dashboard.SQLiteCache(str(tmp_path / "cache.db"), max_entries=100, max_ttl=60)
+
+def test_pickle_round_trip(cache):
+    payload = (b'{"total": 1}\n', "application/json")
+    cache.set("ns", "k", payload)
+    assert cache.get("ns", "k", 60) == payload
+
+    rows = {"rows": [{"amt": Decimal("12.50"), "day": datetime.date(2025, 10, 1)}], "n": None}
+    cache.set("ns", "rows", rows)
+    assert cache.get("ns", "rows", 60) == rows
+    assert cache.get("other", "k", 60) is None
+    assert cache.snapshot()["hits"] == 2 and cache.snapshot()["misses"] == 1
+
+def test_entries_are_shared_across_connections(dashboard, cache):
+    cache.set("ns", "k", (b"x", "application/json"))
+    other = dashboard.SQLiteCache(cache.path, max_entries=100, max_ttl=60)
+    assert other.get("ns", "k", 60) == (b"x", "application/json")
+
+def test_ttl_expiry(cache, clock):
+    cache.set("ns", "k", (b"x", "application/json"))
+    clock.now += 30
+    assert cache.get("ns", "k", 60) is not None
+    assert cache.get("ns", "k", 10) is None       # each namespace reads with its own TTL
+    stats = cache.snapshot()
+    assert stats["expired"] == 1 and stats["entries"] == 0   # dropped on read
+
+def test_sweep_drops_expired_then_oldest(cache, clock):
+    cache.max_entries = 3
+    for i in range(6):
+        cache.set("ns", f"old{i}", i)
+    clock.now += 61                               # past max_ttl
+    for i in range(5):
+        clock.now += 1
+        cache.set("ns", f"new{i}", i)
+    cache.sweep()
+    stats = cache.snapshot()
+    assert stats["entries"] == 3
+    assert stats["expired"] == 6 and stats["evictions"] == 2
+    assert [cache.get("ns", f"new{i}", 3600) for i in range(5)] == [None, None, 2, 3, 4]
+
+def test_set_sweeps_every_n(cache, clock, monkeypatch):
+    monkeypatch.setattr(cache, "SWEEP_EVERY", 4)
+    cache.set("ns", "stale", 0)
+    clock.now += 61
+    for i in range(2):
+        cache.set("ns", f"k{i}", i)
+    assert cache.snapshot()["entries"] == 3
+    cache.set("ns", "k2", 2)                      # 4th set
+    assert cache.snapshot()["entries"] == 3 and cache.snapshot()["expired"] == 1
+
+def test_reload_never_serves_the_old_body(dashboard, synthetic_db, cache, tmp_path, monkeypatch):
+    import rollups
+    db = str(tmp_path / "snapshot.db")
+    shutil.copyfile(synthetic_db, db)
+    monkeypatch.setattr(dashboard, "SQLITE_PATH", db)
+    monkeypatch.setattr(dashboard, "_KPI_CACHE", cache)
+    client = dashboard.app.test_client()
+
+    def values(resp):
+        return [r["value"] for r in resp.get_json()]
+
+    before = client.get("/api/monthly_sales")
+    assert before.status_code == 200 and values(before)[0] > 0
+    assert client.get("/api/monthly_sales").data == before.data
+    assert cache.snapshot()["hits"] == 1
+
+    # a reload: January's rows go, and the rollup is rebuilt from what's left
+    conn = sqlite3.connect(db)
+    conn.execute("DELETE FROM sales2025 WHERE month = 1")
+    conn.commit()
+    rollups.build_rollup(conn, "sales2025")
+    conn.close()
+
+    after = client.get("/api/monthly_sales", headers={"If-None-Match": before.headers["ETag"]})
+    assert after.status_code == 200
+    assert values(after)[0] == 0
+    assert values(after)[1:] == values(before)[1:]
+    assert after.headers["ETag"] != before.headers["ETag"]
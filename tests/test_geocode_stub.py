@@ -0,0 +1,66 @@
+# tests/test_geocode_stub.py
+# resolve_rows() end to end against the stub geocoder (python geocode.py --stub).
+import pytest
+
+pytest.importorskip("requests")
+
+import geocode
+
+STREETS = ["1 King William St", "25 Grenfell St", "70 Pirie St", "12 Flinders St",
+           "9 Waymouth St", "100 Currie St", "3 Gawler Pl"]
+
+def address_row(street, postcode="5000"):
+    return {"Address 1": street, "City": "Adelaide", "Region": "SA",
+            "Postal Code": postcode, "Country": "AU"}
+
+@pytest.fixture
+def stub(monkeypatch):
+    monkeypatch.setattr(geocode.StubGeocoder, "count", 0)
+    monkeypatch.setattr(geocode.StubGeocoder, "latency", 0)
+    monkeypatch.setattr(geocode.StubGeocoder, "fail_every", 3)    # a 503 at 3, OVER_QUERY_LIMIT at 6, ...
+    monkeypatch.setattr(geocode, "BACKOFF", 0.01)
+    monkeypatch.setattr(geocode, "LEGACY_CACHE_FILES", ())
+    server = geocode.stub_server(0)
+    monkeypatch.setattr(geocode, "GEOCODE_URL", f"http://127.0.0.1:{server.server_port}/")
+    yield geocode.StubGeocoder
+    server.shutdown()
+    server.server_close()
+
+def test_resolve_rows_against_stub(stub, tmp_path):
+    rows = [address_row(s) for s in STREETS]
+    # the same addresses again, spelt differently: address_key() folds them together
+    rows += [address_row(s.upper() + ".") for s in STREETS[:4]] + rows[:3]
+    path = str(tmp_path / "geocode_cache.db")
+
+    with geocode.GeocodeCache(path) as cache:
+        out = list(geocode.resolve_rows(iter(rows), cache, geocode.CentroidIndex(), "street", workers=4))
+
+    assert [r[0] for r in out] == rows                           # input order kept
+    assert all(lat is not None and prec == "street" for _, lat, _, prec in out)
+    by_key = {}
+    for row, lat, lon, _ in out:
+        assert by_key.setdefault(geocode.address_key(geocode.build_address(row)), (lat, lon)) == (lat, lon)
+
+    # one successful request per distinct address; every 3rd request was a
+    # failure (503 or OVER_QUERY_LIMIT) that was retried
+    assert stub.count >= 9
+    assert stub.count - stub.count // stub.fail_every == len(STREETS)
+
+    with geocode.GeocodeCache(path) as cache:
+        assert len(cache) == len(STREETS)
+        for row, lat, lon, _ in out:
+            assert cache.get(geocode.build_address(row)) == (lat, lon)
+
+def test_cached_and_offline_rows_skip_the_network(stub, tmp_path):
+    centroids = geocode.CentroidIndex([{"country": "AU", "region": "SA", "postcode": "5000",
+                                        "locality": "", "lat": "-34.93", "lon": "138.6", "n": "3"}])
+    with geocode.GeocodeCache(str(tmp_path / "geocode_cache.db")) as cache:
+        cache.add(geocode.build_address(address_row(STREETS[0])), "-34.92", "138.59")
+        rows = [address_row(STREETS[0]), address_row(STREETS[1]),
+                address_row(STREETS[2], postcode="5001")]
+        out = list(geocode.resolve_rows(iter(rows), cache, centroids, "postcode"))
+
+    assert [tuple(r[1:]) for r in out[:2]] == [("-34.92", "138.59", "street"),
+                                               (-34.93, 138.6, "postcode")]
+    assert out[2][3] == "street"
+    assert stub.count == 1          # only the postcode with no centroid was looked up